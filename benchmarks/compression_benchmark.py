@@ -0,0 +1,60 @@
+"""Measure bytes on the wire and on disk with and without --compress.
+
+A local server serves a page with css and js files, gzip encoded when
+the client accepts it, and counts the body bytes it sends.
+
+    python -m benchmarks.compression_benchmark --assets 50 --size 100000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.site import Site, serve
+from page_loader import download
+
+
+def disk_bytes(directory: str) -> int:
+    """Return size of all files in *directory*."""
+    return sum(
+        path.stat().st_size
+        for path in Path(directory).rglob('*') if path.is_file()
+    )
+
+
+def run(assets_count: int, size: int) -> dict:
+    """Return wire and disk bytes of downloads with and without compress."""
+    site = Site(
+        pages=1,
+        assets=assets_count,
+        asset_size=size,
+        gzip=True,
+        suffixes=('.css', '.js'),
+    )
+    results = {'assets': assets_count, 'asset_size': size}
+    with serve(site) as server:
+        url = server.base_url + site.page_paths()[0]
+        for compress in (False, True):
+            server.reset()
+            with tempfile.TemporaryDirectory() as output_path:
+                start = time.perf_counter()
+                download(url, output_path, workers=8, compress=compress)
+                results['compress' if compress else 'plain'] = {
+                    'wire_bytes': server.bytes_sent,
+                    'disk_bytes': disk_bytes(output_path),
+                    'seconds': round(time.perf_counter() - start, 4),
+                }
+    return results
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--assets', type=int, default=50)
+    parser.add_argument('--size', type=int, default=100000)
+    args = parser.parse_args()
+    print(run(args.assets, args.size))  # noqa: WPS421
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Measure peak RSS of download() of a large page in every rewrite mode.
+
+A local server serves one page padded to --page-size bytes and linking
+--assets files. Every mode runs in its own process, so its peak RSS is
+measured apart from the server and the other modes:
+
+    python -m benchmarks.memory_benchmark --page-size 50000000 --assets 200
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+from benchmarks.site import Site, serve
+from benchmarks.suite import run_child
+
+MODES = {  # noqa: WPS407
+    'prettify': {'rewrite': 'prettify'},
+    'splice': {'rewrite': 'splice'},
+    'low_memory': {'low_memory': True},
+}
+
+
+def measure(url: str, mode: str) -> dict:
+    """Download *url* in *mode* and return its time and page size."""
+    from page_loader import download  # noqa: WPS433
+
+    with tempfile.TemporaryDirectory() as output_path:
+        start = time.perf_counter()
+        download(url, output_path, workers=8, **MODES[mode])
+        return {'seconds': round(time.perf_counter() - start, 4)}
+
+
+def run(page_size: int, assets_count: int) -> dict:
+    """Return seconds and peak RSS of every mode."""
+    site = Site(pages=1, assets=assets_count, page_size=page_size)
+    results = {'page_size': page_size, 'assets': assets_count}
+    with serve(site) as server:
+        url = server.base_url + site.page_paths()[0]
+        for mode in MODES:
+            output, peak_rss = run_child([
+                sys.executable,
+                '-m',
+                'benchmarks.memory_benchmark',
+                '--measure',
+                url,
+                '--mode',
+                mode,
+            ])
+            results[mode] = {**json.loads(output), 'peak_rss_kb': peak_rss}
+    return results
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--page-size', type=int, default=50 * 1000 * 1000)
+    parser.add_argument('--assets', type=int, default=200)
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        results = measure(args.measure, args.mode)
+    else:
+        results = run(args.page_size, args.assets)
+    print(json.dumps(results))  # noqa: WPS421
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Count html parses and wall time spent by download() per page.
+
+Run from the project root:
+
+    python -m benchmarks.parse_benchmark --tags 5000 --repeat 3
+    python -m benchmarks.parse_benchmark --rewrite splice
+"""
+import argparse
+import os
+import tempfile
+import time
+from unittest import mock
+
+import bs4
+import requests_mock
+
+from page_loader import download
+from page_loader.document import DEFAULT_REWRITE, DOCUMENTS
+from page_loader.stats import Stats
+
+PAGE_URL = 'https://example.com/page.html'
+HTML_PHASES = ('parse', 'rewrite', 'serialize')
+
+
+def make_page(tags_count: int) -> str:
+    """Build a synthetic page with *tags_count* tags of each asset kind."""
+    body = []
+    for index in range(tags_count):
+        body.append(f'<img src="/images/{index}.png" alt="image">')
+        body.append(f'<link href="/assets/{index}.css" rel="stylesheet">')
+        body.append(f'<script src="/static/{index}.js"></script>')
+        body.append(f'<p>paragraph {index}</p>')
+    return '<html><head></head><body>{0}</body></html>'.format(
+        '\n'.join(body),
+    )
+
+
+def run(tags_count: int, repeat: int, rewrite: str) -> dict:
+    """Download the synthetic page *repeat* times and return the numbers."""
+    parses = 0
+    parse_seconds = 0.0
+    original_init = bs4.BeautifulSoup.__init__
+
+    def counting_init(self, *args, **kwargs):
+        nonlocal parses, parse_seconds
+        parses += 1
+        start = time.perf_counter()
+        original_init(self, *args, **kwargs)
+        parse_seconds += time.perf_counter() - start
+
+    timings = []
+    html_timings = []
+    page_size = 0
+    with requests_mock.Mocker() as mocker:
+        mocker.get(requests_mock.ANY, content=b'asset')
+        mocker.get(PAGE_URL, text=make_page(tags_count))
+        with mock.patch.object(bs4.BeautifulSoup, '__init__', counting_init):
+            for _ in range(repeat):
+                with tempfile.TemporaryDirectory() as output_path:
+                    stats = Stats()
+                    start = time.perf_counter()
+                    page_path = download(
+                        PAGE_URL, output_path, rewrite=rewrite, stats=stats,
+                    )
+                    timings.append(time.perf_counter() - start)
+                    html_timings.append(sum(
+                        stats.phases[phase] for phase in HTML_PHASES
+                    ))
+                    page_size = os.path.getsize(page_path)
+    return {
+        'tags': tags_count * 3,
+        'parses_per_page': parses / repeat,
+        'parse_seconds_per_page': parse_seconds / repeat,
+        'best_html_seconds': min(html_timings),
+        'best_seconds': min(timings),
+        'page_bytes': page_size,
+    }
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tags', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--rewrite', choices=sorted(DOCUMENTS), default=DEFAULT_REWRITE,
+    )
+    args = parser.parse_args()
+    print(run(args.tags, args.repeat, args.rewrite))  # noqa: WPS421
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Compare html parser backends on a page with thousands of tags.
+
+Every backend parses the page, finds asset links, rewrites them and
+serializes the page. Parsers that are not installed are skipped.
+
+    python -m benchmarks.parser_benchmark --tags 5000 --repeat 3
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.parse_benchmark import PAGE_URL, make_page
+from page_loader.assets import PARSERS, resolve_parser
+from page_loader.document import SourceDocument, document_factory
+
+
+def measure(make_document, content: bytes, repeat: int) -> tuple:
+    """Return best time of processing *content* and the rendered page."""
+    timings = []
+    with tempfile.TemporaryDirectory() as base_dir:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            document = make_document(content, 'utf-8', PAGE_URL)
+            local_paths = {
+                link: f'{base_dir}/files/{index}'
+                for index, (_, _, link) in enumerate(document.asset_links)
+            }
+            document.rewrite(local_paths, base_dir)
+            rendered = document.render()
+            timings.append(time.perf_counter() - start)
+    return min(timings), rendered
+
+
+def run(tags_count: int, repeat: int) -> dict:
+    """Return best seconds per backend and whether outputs are identical."""
+    content = make_page(tags_count).encode()
+    results = {}
+    reference = None
+    for parser in PARSERS:
+        if parser == 'auto' or resolve_parser(parser) != parser:
+            continue
+        seconds, rendered = measure(
+            document_factory('prettify', parser), content, repeat,
+        )
+        reference = reference or rendered
+        results[parser] = {
+            'seconds': round(seconds, 4),
+            'same_output': rendered == reference,
+        }
+    seconds, _ = measure(SourceDocument, content, repeat)
+    results['splice'] = {'seconds': round(seconds, 4)}
+    return {'tags': tags_count * 3, 'backends': results}
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tags', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    print(run(args.tags, args.repeat))  # noqa: WPS421
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Show the phase timeline of download() with and without prefetch.
+
+A local server serves one page linking --assets small files, delaying
+every response by --latency seconds. Without prefetch nothing is
+downloaded before the page is fetched and parsed; with prefetch files
+start downloading while the page is still arriving and being parsed:
+
+    python -m benchmarks.pipeline_benchmark --assets 100 --latency 0.02
+"""
+import argparse
+import json
+import tempfile
+import time
+
+from benchmarks.site import Site, serve
+from page_loader import download
+from page_loader.stats import Stats
+
+
+def timeline(url: str, workers: int, prefetch: bool) -> dict:
+    """Download *url* and return its seconds and phase timeline."""
+    stats = Stats()
+    with tempfile.TemporaryDirectory() as output_path:
+        start = time.perf_counter()
+        download(
+            url, output_path, workers=workers, stats=stats, prefetch=prefetch,
+        )
+        seconds = time.perf_counter() - start
+    events = stats.report()['timeline']
+    files = [event for event in events if event['name'] == 'file']
+    phases = {
+        event['name']: [event['start'], event['end']]
+        for event in events if event['name'] != 'file'
+    }
+    return {
+        'seconds': round(seconds, 4),
+        'phases': phases,
+        'files': {
+            'count': len(files),
+            'first_start': min(event['start'] for event in files),
+            'last_end': max(event['end'] for event in files),
+        },
+    }
+
+
+def run(site: Site, workers: int, rounds: int) -> dict:
+    """Return the best timeline of *rounds* downloads of every mode."""
+    results = {'assets': site.assets, 'latency': site.latency}
+    with serve(site) as server:
+        url = server.base_url + site.page_paths()[0]
+        for prefetch in (False, True):
+            runs = [timeline(url, workers, prefetch) for _ in range(rounds)]
+            results['prefetch' if prefetch else 'sequential'] = min(
+                runs, key=lambda run_numbers: run_numbers['seconds'],
+            )
+    return results
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--assets', type=int, default=100)
+    parser.add_argument('--size', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+    site = Site(
+        pages=1,
+        assets=args.assets,
+        asset_size=args.size,
+        page_size=args.page_size,
+        latency=args.latency,
+    )
+    print(json.dumps(  # noqa: WPS421
+        run(site, args.workers, args.rounds), indent=2,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Measure pages a second of --batch against the number of processes.
+
+A local server serves --pages pages padded to --page-size bytes, so
+parsing and rewriting dominate. page-loader --batch downloads them in a
+child process with --page-workers pages at the same time, parsing in
+threads (0 processes) or in a pool of 1, 2, ... processes:
+
+    python -m benchmarks.scaling_benchmark --pages 40 --processes 0 1 2 4
+
+Pages a second can only grow up to as many processes as there are
+cores, which are reported as cpus, so by default it runs with 0, 1 and
+one process per core.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.site import Site, serve
+from benchmarks.suite import run_child
+
+
+def run_batch(urls_path: str, processes: int, page_workers: int) -> dict:
+    """Download the urls with *processes* and return its numbers."""
+    with tempfile.TemporaryDirectory() as output_path:
+        start = time.perf_counter()
+        output, peak_rss = run_child([
+            sys.executable,
+            '-m',
+            'page_loader.scripts.page_loader',
+            '--batch',
+            urls_path,
+            '--out',
+            output_path,
+            '--workers',
+            '4',
+            '--page-workers',
+            str(page_workers),
+            '--processes',
+            str(processes),
+        ])
+        seconds = time.perf_counter() - start
+    pages = len(output.splitlines())
+    return {
+        'seconds': round(seconds, 4),
+        'pages_per_second': round(pages / seconds, 2),
+        'peak_rss_kb': peak_rss,
+    }
+
+
+def run(site: Site, process_counts: list, page_workers: int) -> dict:
+    """Return numbers of the batch for every number of processes."""
+    results = {
+        'cpus': os.cpu_count(),
+        'pages': site.pages,
+        'page_size': site.page_size,
+        'page_workers': page_workers,
+        'processes': {},
+    }
+    with serve(site) as server:
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as urls_file:
+            urls_file.writelines(
+                f'{server.base_url}{path}\n' for path in site.page_paths()
+            )
+            urls_file.flush()
+            for processes in process_counts:
+                results['processes'][processes] = run_batch(
+                    urls_file.name, processes, page_workers,
+                )
+    return results
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--pages', type=int, default=40)
+    parser.add_argument('--page-size', type=int, default=300000)
+    parser.add_argument('--assets', type=int, default=10)
+    parser.add_argument('--page-workers', type=int, default=8)
+    parser.add_argument(
+        '--processes',
+        type=int,
+        nargs='+',
+        default=sorted({0, 1, os.cpu_count()}),
+    )
+    args = parser.parse_args()
+    site = Site(
+        pages=args.pages,
+        assets=args.assets,
+        asset_size=1000,
+        page_size=args.page_size,
+    )
+    print(json.dumps(  # noqa: WPS421
+        run(site, args.processes, args.page_workers), indent=2,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Local HTTP server of a synthetic site for benchmarks.
+
+Every page links *assets* files of *asset_size* bytes and is padded with
+text up to *page_size* bytes. A *duplicates*
+share of the links of every page points to files shared by all pages.
+Every response is delayed by *latency* seconds. Text files are gzip
+encoded for clients that accept it if *gzip* is True.
+
+    with serve(Site(pages=10, assets=20, latency=0.01)) as server:
+        urls = [server.base_url + path for path in server.site.page_paths()]
+"""
+import gzip
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPES = {  # noqa: WPS407
+    '.html': 'text/html; charset=utf-8',
+    '.png': 'image/png',
+    '.css': 'text/css',
+    '.js': 'text/javascript',
+}
+TEXT_SUFFIXES = ('.html', '.css', '.js')
+TEXT_LINE = b'.rule-%d { margin: 0 auto; color: #333; }\n'
+
+
+@dataclass
+class Site(object):
+    """Shape of the synthetic site."""
+
+    pages: int = 10
+    assets: int = 20
+    asset_size: int = 10000
+    latency: float = 0
+    duplicates: float = 0
+    page_size: int = 0
+    gzip: bool = False
+    suffixes: tuple = ('.png', '.css', '.js')
+    seed: int = 0
+
+    def page_paths(self) -> list:
+        """Return paths of the pages."""
+        return [f'/pages/page{index}.html' for index in range(self.pages)]
+
+    def asset_paths(self, page_index: int) -> list:
+        """Return paths of the files linked from page *page_index*."""
+        shared_count = round(self.assets * self.duplicates)
+        paths = [
+            f'/shared/file{index}{self.suffix(index)}'
+            for index in range(shared_count)
+        ]
+        paths.extend(
+            f'/files/page{page_index}/file{index}{self.suffix(index)}'
+            for index in range(shared_count, self.assets)
+        )
+        return paths
+
+    def suffix(self, index: int) -> str:
+        """Return suffix of the file number *index*."""
+        return self.suffixes[index % len(self.suffixes)]
+
+    def bodies(self) -> dict:
+        """Return dict of path and body of every page and file."""
+        generator = random.Random(self.seed)
+        bodies = {}
+        for page_index, page_path in enumerate(self.page_paths()):
+            asset_paths = self.asset_paths(page_index)
+            bodies[page_path] = make_page(asset_paths, self.page_size)
+            for path in asset_paths:
+                if path not in bodies:
+                    bodies[path] = make_body(path, self.asset_size, generator)
+        return bodies
+
+
+def make_page(asset_paths: list, size: int = 0) -> bytes:
+    """Return html page linking *asset_paths*.
+
+    The links are spread over text padding the page to *size* bytes.
+    """
+    paragraph = '<p>Lorem ipsum dolor sit amet.</p>'
+    repeats = max(1, size // (len(paragraph) + 1) // max(1, len(asset_paths)))
+    paragraphs = '\n'.join([paragraph] * repeats)
+    tags = []
+    for path in asset_paths:
+        if path.endswith('.css'):
+            tags.append(f'<link rel="stylesheet" href="{path}">')
+        elif path.endswith('.js'):
+            tags.append(f'<script src="{path}"></script>')
+        else:
+            tags.append(f'<img src="{path}" alt="">')
+        tags.append(paragraphs)
+    return '<html><head></head><body>\n{0}\n</body></html>'.format(
+        '\n'.join(tags),
+    ).encode()
+
+
+def make_body(path: str, size: int, generator: random.Random) -> bytes:
+    """Return body of *size* bytes, compressible text for text files."""
+    if path.endswith(TEXT_SUFFIXES):
+        lines_count = size // len(TEXT_LINE) + 1
+        lines = (TEXT_LINE % number for number in range(lines_count))
+        return b''.join(lines)[:size]
+    return generator.randbytes(size)
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """Handler serving the bodies of server.site."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # noqa: N802
+        """Send the body of the path after the latency of the site."""
+        time.sleep(self.server.site.latency)
+        body = self.server.bodies.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        suffix = self.path[self.path.rfind('.'):]
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES[suffix])
+        if self.is_gzipped(suffix):
+            body = self.server.compressed(self.path)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(len(body))
+
+    def is_gzipped(self, suffix: str) -> bool:
+        """Return True if the body is sent gzip encoded."""
+        accepts_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        return self.server.site.gzip and accepts_gzip and (
+            suffix in TEXT_SUFFIXES
+        )
+
+    def log_message(self, *args):
+        """Keep the output clean."""
+
+
+class SiteServer(ThreadingHTTPServer):
+    """Server of a Site counting requests and body bytes sent."""
+
+    daemon_threads = True
+
+    def __init__(self, site: Site):
+        """Bind to a free local port."""
+        super().__init__(('127.0.0.1', 0), SiteHandler)
+        self.site = site
+        self.bodies = site.bodies()
+        self.base_url = f'http://127.0.0.1:{self.server_port}'
+        self.requests = 0
+        self.bytes_sent = 0
+        self._compressed = {}
+        self._lock = threading.Lock()
+
+    def compressed(self, path: str) -> bytes:
+        """Return gzipped body of *path*."""
+        with self._lock:
+            if path not in self._compressed:
+                self._compressed[path] = gzip.compress(self.bodies[path])
+            return self._compressed[path]
+
+    def count(self, bytes_sent: int) -> None:
+        """Count one response with *bytes_sent* body bytes."""
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += bytes_sent
+
+    def reset(self) -> None:
+        """Reset the counters."""
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+
+@contextmanager
+def serve(site: Site):
+    """Provide SiteServer of *site* running in a background thread."""
+    server = SiteServer(site)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,277 @@
+"""End to end benchmark of download() and the CLI on a synthetic site.
+
+A local server (see benchmarks.site) serves the pages. Every mode runs
+in its own process, so its peak RSS is measured apart from the server:
+
+- library: download() of every page, one after another;
+- cli: page-loader --batch with all the pages.
+
+The numbers are pages and files a second, p50/p99 latency of pages and
+files, parse time and peak RSS. They are printed as JSON and written to
+--output, so runs on different commits can be compared:
+
+    python -m benchmarks.suite --pages 20 --assets 30 --latency 0.005 \\
+        --duplicates 0.3 --output before.json
+    python -m benchmarks.suite --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess  # noqa: S404
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+from benchmarks.site import Site, serve
+
+MODES = ('library', 'cli')
+PERCENTILES = (50, 99)
+
+
+def measure_library(urls: list, workers: int) -> dict:
+    """Download *urls* with download() and return raw measurements."""
+    from page_loader import download  # noqa: WPS433
+    from page_loader.stats import Stats  # noqa: WPS433
+
+    pages = []
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as output_path:
+        for url in urls:
+            stats = Stats()
+            page_start = time.perf_counter()
+            download(url, output_path, workers=workers, stats=stats)
+            pages.append(page_numbers(
+                time.perf_counter() - page_start, stats.report(),
+            ))
+    return {'seconds': time.perf_counter() - start, 'pages': pages}
+
+
+def page_numbers(seconds: float, report: dict) -> dict:
+    """Return numbers of one page from its stats *report*."""
+    return {
+        'seconds': seconds,
+        'parse': report['phases'].get('parse', 0),
+        'files': [file_stats['seconds'] for file_stats in report['files']],
+    }
+
+
+def run_library(urls_path: str, workers: int) -> tuple:
+    """Run the library mode in a child process.
+
+    Return tuple (raw measurements, peak RSS in kB).
+    """
+    output, peak_rss = run_child([
+        sys.executable,
+        '-m',
+        'benchmarks.suite',
+        '--measure',
+        urls_path,
+        '--workers',
+        str(workers),
+    ])
+    return json.loads(output), peak_rss
+
+
+def run_cli(urls_path: str, workers: int) -> tuple:
+    """Run page-loader --batch on *urls_path* in a child process.
+
+    Return tuple (raw measurements, peak RSS in kB).
+    """
+    with tempfile.TemporaryDirectory() as output_path:
+        start = time.perf_counter()
+        output, peak_rss = run_child([
+            sys.executable,
+            '-m',
+            'page_loader.scripts.page_loader',
+            '--batch',
+            urls_path,
+            '--out',
+            output_path,
+            '--workers',
+            str(workers),
+            '--stats',
+        ])
+        seconds = time.perf_counter() - start
+    pages = [
+        page_numbers(page_result['seconds'], page_result['stats'])
+        for page_result in map(json.loads, output.splitlines())
+    ]
+    return {'seconds': seconds, 'pages': pages}, peak_rss
+
+
+def run_child(command: list) -> tuple:
+    """Run *command* and return tuple (stdout, peak RSS in kB)."""
+    process = subprocess.Popen(  # noqa: S603
+        command, stdout=subprocess.PIPE, text=True,
+    )
+    output = process.stdout.read()
+    process.stdout.close()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    peak_rss = usage.ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024
+    return output, peak_rss
+
+
+def summarize(measurements: dict, peak_rss: int) -> dict:
+    """Return the numbers of a mode from its raw *measurements*."""
+    pages = measurements['pages']
+    seconds = measurements['seconds']
+    file_seconds = [
+        file_time for page in pages for file_time in page['files']
+    ]
+    parse_seconds = [page['parse'] for page in pages]
+    return {
+        'seconds': round(seconds, 4),
+        'pages': len(pages),
+        'files': len(file_seconds),
+        'pages_per_second': round(len(pages) / seconds, 2),
+        'files_per_second': round(len(file_seconds) / seconds, 2),
+        'page_latency': percentiles([page['seconds'] for page in pages]),
+        'file_latency': percentiles(file_seconds),
+        'parse_seconds': {
+            'total': round(sum(parse_seconds), 6),
+            **percentiles(parse_seconds),
+        },
+        'peak_rss_kb': peak_rss,
+    }
+
+
+def percentiles(samples: list) -> dict:
+    """Return nearest-rank p50 and p99 of *samples*.
+
+    >>> percentiles(list(range(1, 101)))
+    {'p50': 50, 'p99': 99}
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {f'p{percent}': None for percent in PERCENTILES}
+    return {
+        f'p{percent}': round(
+            ordered[max(0, -(-len(ordered) * percent // 100) - 1)], 6,
+        )
+        for percent in PERCENTILES
+    }
+
+
+def run(site: Site, workers: int, modes=MODES) -> dict:
+    """Serve *site* and return the numbers of every mode in *modes*."""
+    runners = {'library': run_library, 'cli': run_cli}
+    results = {
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'site': asdict(site),
+        'workers': workers,
+        'modes': {},
+    }
+    with serve(site) as server:
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as urls_file:
+            urls_file.writelines(
+                f'{server.base_url}{path}\n' for path in site.page_paths()
+            )
+            urls_file.flush()
+            for mode in modes:
+                server.reset()
+                measurements, peak_rss = runners[mode](
+                    urls_file.name, workers,
+                )
+                results['modes'][mode] = {
+                    **summarize(measurements, peak_rss),
+                    'requests': server.requests,
+                    'bytes_sent': server.bytes_sent,
+                }
+    return results
+
+
+def current_commit():
+    """Return hash of the checked out commit, None outside of git."""
+    try:
+        return subprocess.run(  # noqa: S603, S607
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: dict, new: dict) -> list:
+    """Return lines comparing numbers of the modes of two results."""
+    lines = []
+    for mode, new_numbers in new['modes'].items():
+        old_numbers = flatten(old['modes'].get(mode, {}))
+        for name, new_value in flatten(new_numbers).items():
+            old_value = old_numbers.get(name)
+            change = ''
+            if old_value and new_value is not None:
+                change = f'{(new_value - old_value) / old_value:+.1%}'
+            lines.append(
+                f'{mode}.{name}: {old_value} -> {new_value} {change}'.strip(),
+            )
+    return lines
+
+
+def flatten(numbers: dict, prefix: str = '') -> dict:
+    """Return nested dict *numbers* as a flat dict of dotted names."""
+    flat = {}
+    for name, number in numbers.items():
+        if isinstance(number, dict):
+            flat.update(flatten(number, f'{prefix}{name}.'))
+        else:
+            flat[f'{prefix}{name}'] = number
+    return flat
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--assets', type=int, default=20)
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--duplicates', type=float, default=0)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--output', help='file to write the results to')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        with open(args.measure) as urls_file:
+            urls = urls_file.read().split()
+        print(json.dumps(measure_library(urls, args.workers)))  # noqa: WPS421
+    elif args.compare:
+        old, new = (load(path) for path in args.compare)
+        print('\n'.join(compare(old, new)))  # noqa: WPS421
+    else:
+        site = Site(
+            pages=args.pages,
+            assets=args.assets,
+            asset_size=args.size,
+            latency=args.latency,
+            duplicates=args.duplicates,
+        )
+        results = json.dumps(run(site, args.workers, args.modes), indent=2)
+        print(results)  # noqa: WPS421
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                output_file.write(results)
+
+
+def load(path: str) -> dict:
+    """Return results stored in the file at *path*."""
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Measure resolving and naming of asset links of a page.
+
+Every link is checked for the domain, resolved to a canonical url and
+named, as it is done for the assets of a page. The memoized UrlResolver
+is compared with the same resolver without cache.
+
+    python -m benchmarks.url_benchmark --links 100000 --unique 5000
+"""
+import argparse
+import time
+
+from page_loader.url import UrlResolver
+
+PAGE_URL = 'https://sub1.example.com/path/to/page.html'
+LINK_TEMPLATES = (
+    '/images/{index}.png',
+    '../styles/{index}.css',
+    './scripts/{index}.js?v=2',
+    'fonts/{index}.woff2',
+    '//cdn.sub1.example.com/lib/{index}.js',
+    'https://sub1.example.com/path/{index}/index.html#top',
+    'https://other.com/{index}.png',
+)
+
+
+def make_links(links_count: int, unique_count: int) -> list:
+    """Return *links_count* links of all kinds with *unique_count* unique."""
+    unique_links = [
+        LINK_TEMPLATES[index % len(LINK_TEMPLATES)].format(index=index)
+        for index in range(unique_count)
+    ]
+    return [
+        unique_links[index % unique_count] for index in range(links_count)
+    ]
+
+
+def measure(resolver: UrlResolver, links: list) -> float:
+    """Return seconds spent resolving *links* with *resolver*."""
+    start = time.perf_counter()
+    for link in links:
+        if resolver.is_same_domain(link):
+            resolver.canonical(link)
+            resolver.name(link)
+    return time.perf_counter() - start
+
+
+def run(links_count: int, unique_count: int, repeat: int) -> dict:
+    """Return best seconds with and without memoization."""
+    links = make_links(links_count, unique_count)
+    uncached = min(
+        measure(UrlResolver(PAGE_URL, cache_size=0), links)
+        for _ in range(repeat)
+    )
+    memoized = min(
+        measure(UrlResolver(PAGE_URL), links) for _ in range(repeat)
+    )
+    return {
+        'links': links_count,
+        'unique': unique_count,
+        'uncached_seconds': round(uncached, 4),
+        'memoized_seconds': round(memoized, 4),
+        'speedup': round(uncached / memoized, 1),
+    }
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--links', type=int, default=100000)
+    parser.add_argument('--unique', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    print(run(args.links, args.unique, args.repeat))  # noqa: WPS421
+
+
+if __name__ == '__main__':
+    main()
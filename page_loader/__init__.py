@@ -1 +1,29 @@
-from page_loader.page_loader import download
+"""Download pages with their resources.
+
+download, download_archive and async_download are imported on first
+use (PEP 562), so importing the package, e.g. to run the CLI, doesn't
+load requests and bs4.
+"""
+import importlib
+
+LAZY_ATTRIBUTES = {  # noqa: WPS407
+    'async_download': 'page_loader.asynchronous',
+    'download': 'page_loader.page_loader',
+    'download_archive': 'page_loader.archive',
+}
+
+__all__ = sorted(LAZY_ATTRIBUTES)  # noqa: WPS410
+
+
+def __getattr__(name: str):
+    """Import the module of *name* on first access."""
+    if name not in LAZY_ATTRIBUTES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    attribute = getattr(importlib.import_module(LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = attribute
+    return attribute
+
+
+def __dir__():
+    """List the lazy attributes too."""
+    return sorted({*globals(), *LAZY_ATTRIBUTES})
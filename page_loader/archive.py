@@ -0,0 +1,611 @@
+import base64
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+from page_loader.assets import DEFAULT_PARSER
+from page_loader.budget import Budget, BudgetClient
+from page_loader.cache import DEFAULT_CACHE_SIZE, HttpCache
+from page_loader.css import scan_css_chunks
+from page_loader.document import DEFAULT_REWRITE, document_factory
+from page_loader.http import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_RETRIES,
+    open_stream,
+)
+from page_loader.page_loader import (
+    DownloadQueue,
+    PageResult,
+    collect_results,
+    page_options,
+    pop_skipped,
+    response_encoding,
+)
+from page_loader.politeness import polite_session_scope
+from page_loader.stats import NULL_STATS
+from page_loader.url import url_to_name
+
+INDEX_SUFFIX = '.idx'
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+BASE64_LINE_BYTES = 57
+WARC_LENGTH_WIDTH = 20
+EMPTY_DIGEST = '0' * 64
+WARC_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+TAR_FORMAT = tarfile.GNU_FORMAT
+SPOOL_SIZE = 1024 * 1024
+COPY_CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class IndexEntry(NamedTuple):
+    """Place of one resource in an archive.
+
+    record_offset - position of the record with the resource headers.
+    offset, length - position and length of the stored body.
+    size, sha256 - size and digest of the body itself.
+    encoding - 'base64' if the body is stored base64 encoded.
+    """
+
+    url: str
+    name: str
+    content_type: str
+    record_offset: int
+    offset: int
+    length: int
+    size: int
+    sha256: str
+    encoding: str = None
+
+
+class Archive(object):
+    """Single file archive written record by record as resources arrive.
+
+    Bodies are spooled to a temporary file as they arrive, in memory up
+    to SPOOL_SIZE bytes, and copied into the archive one resource at a
+    time, so downloads don't wait for each other. Every record is listed
+    in the index file next to the archive as soon as it is written, see
+    read_resource().
+    """
+
+    rewrites_links = False
+    encoding = None
+
+    def __init__(self, path: str, base_dir: str, url: str):
+        """Create archive at *path* of the page from *url*.
+
+        base_dir - the directory members are named relative to.
+        """
+        self.path = Path(path)
+        self.base_dir = Path(base_dir).resolve()
+        self.url = url
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'wb+')  # noqa: WPS515
+        self._index_file = open(index_path(self.path), 'w')  # noqa: WPS515
+        self.write_start()
+
+    def __enter__(self):
+        """Return the archive."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Finish the archive."""
+        self.close()
+
+    def add(
+        self, url: str, content_type: str, chunks: Iterable[bytes], name: str,
+    ) -> IndexEntry:
+        """Write resource from *url* with body *chunks* as member *name*.
+
+        The body is read whole before the archive is locked. A record that
+        fails to be written is removed from the archive.
+        Return IndexEntry of the resource.
+        """
+        content_type = content_type or guess_type(name)
+        with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as body:
+            for chunk in chunks:
+                body.write(chunk)
+            body.seek(0)
+            with self._lock:
+                entry = self.copy_record(
+                    url,
+                    content_type,
+                    iter(lambda: body.read(COPY_CHUNK_SIZE), b''),
+                    name,
+                )
+        return entry
+
+    def copy_record(
+        self, url: str, content_type: str, chunks: Iterable[bytes], name: str,
+    ) -> IndexEntry:
+        """Write record of *chunks* and list it in the index.
+
+        Must be called with the lock held.
+        """
+        record_offset = self._file.tell()
+        try:
+            entry = self.write_record(url, content_type, chunks, name)
+        except BaseException:
+            self._file.seek(record_offset)
+            self._file.truncate()
+            raise
+        self.entries[name] = entry
+        self._index_file.write(f'{json.dumps(entry._asdict())}\n')
+        self._index_file.flush()
+        return entry
+
+    def read(self, name: str) -> bytes:
+        """Return body of member *name* written to the archive."""
+        with self._lock:
+            self._file.flush()
+            return read_entry(self.path, self.entries[name])
+
+    def scan_stylesheet(self, file_path: str) -> list:
+        """Return list of css.Reference of the stylesheet at *file_path*."""
+        return scan_css_chunks([self.read(self.member_name(file_path))])
+
+    def member_name(self, file_path: str) -> str:
+        """Return name of the member of *file_path* relative to base_dir."""
+        return Path(os.path.relpath(file_path, self.base_dir)).as_posix()
+
+    def close(self) -> None:
+        """Write the end of the archive and close it."""
+        with self._lock:
+            if self._file.closed:
+                return
+            self.write_end()
+            self._file.close()
+            self._index_file.close()
+
+    def write_start(self) -> None:
+        """Write the beginning of the archive."""
+
+    def write_end(self) -> None:
+        """Write the end of the archive."""
+
+    def write_record(
+        self, url: str, content_type: str, chunks: Iterable[bytes], name: str,
+    ) -> IndexEntry:
+        """Write one record and return its IndexEntry."""
+        raise NotImplementedError
+
+    def write_body(self, chunks: Iterable[bytes]) -> tuple:
+        """Write *chunks* as they are.
+
+        Return tuple (size, SHA-256 hex digest).
+        """
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in chunks:
+            digest.update(chunk)
+            self._file.write(chunk)
+            size += len(chunk)
+        return size, digest.hexdigest()
+
+    def patch(self, offset: int, header: bytes) -> None:
+        """Overwrite the placeholder at *offset* with *header*."""
+        end = self._file.tell()
+        self._file.seek(offset)
+        self._file.write(header)
+        self._file.seek(end)
+
+
+class TarArchive(Archive):
+    """Uncompressed tar with the page and files laid out as on disk.
+
+    The header of a member is written with a zero size and patched once
+    its body has been streamed.
+    """
+
+    rewrites_links = True
+
+    def write_record(
+        self, url: str, content_type: str, chunks: Iterable[bytes], name: str,
+    ) -> IndexEntry:
+        """Write tar member *name*."""
+        tar_info = tarfile.TarInfo(name)
+        tar_info.mtime = int(time.time())
+        record_offset = self._file.tell()
+        self._file.write(tar_info.tobuf(TAR_FORMAT))
+        offset = self._file.tell()
+        size, sha256 = self.write_body(chunks)
+        self._file.write(tarfile.NUL * (-size % tarfile.BLOCKSIZE))
+        tar_info.size = size
+        self.patch(record_offset, tar_info.tobuf(TAR_FORMAT))
+        return IndexEntry(
+            url, name, content_type, record_offset, offset, size, size, sha256,
+        )
+
+    def write_end(self) -> None:
+        """Write the two zero blocks and pad the last record."""
+        self._file.write(tarfile.NUL * tarfile.BLOCKSIZE * 2)
+        self._file.write(
+            tarfile.NUL * (-self._file.tell() % tarfile.RECORDSIZE),
+        )
+
+
+class WarcArchive(Archive):
+    """WARC 1.1 file of resource records with the original links.
+
+    Content-Length and WARC-Block-Digest are written as fixed width
+    placeholders and patched once the body has been streamed.
+    """
+
+    def write_start(self) -> None:
+        """Write the warcinfo record."""
+        info = b'software: page-loader\r\nformat: WARC File Format 1.1\r\n'
+        self._file.write(warc_header(
+            'warcinfo',
+            'application/warc-fields',
+            len(info),
+            hashlib.sha256(info).hexdigest(),
+        ))
+        self._file.write(info + b'\r\n\r\n')
+
+    def write_record(
+        self, url: str, content_type: str, chunks: Iterable[bytes], name: str,
+    ) -> IndexEntry:
+        """Write resource record of *url*."""
+        record_offset = self._file.tell()
+        header = partial(
+            warc_header, 'resource', content_type, target_uri=url,
+        )
+        self._file.write(header(0, EMPTY_DIGEST))
+        offset = self._file.tell()
+        size, sha256 = self.write_body(chunks)
+        self._file.write(b'\r\n\r\n')
+        self.patch(record_offset, header(size, sha256))
+        return IndexEntry(
+            url, name, content_type, record_offset, offset, size, size, sha256,
+        )
+
+
+class MhtmlArchive(Archive):
+    """MHTML file, multipart/related with base64 encoded parts.
+
+    Parts keep the original links and are found by their
+    Content-Location, so the page is stored first as it came.
+    """
+
+    encoding = 'base64'
+
+    def write_start(self) -> None:
+        """Write the message headers."""
+        self.boundary = f'----MultipartBoundary--{uuid.uuid4().hex}----'
+        self._file.write((
+            'From: <Saved by page-loader>\r\n'
+            f'Snapshot-Content-Location: {self.url}\r\n'
+            f'Date: {datetime.now(timezone.utc):%a, %d %b %Y %H:%M:%S %z}\r\n'
+            'MIME-Version: 1.0\r\n'
+            'Content-Type: multipart/related;\r\n'
+            '\ttype="text/html";\r\n'
+            f'\tboundary="{self.boundary}"\r\n'
+        ).encode())
+
+    def write_record(
+        self, url: str, content_type: str, chunks: Iterable[bytes], name: str,
+    ) -> IndexEntry:
+        """Write MIME part of *url*."""
+        record_offset = self._file.tell()
+        self._file.write((
+            f'\r\n--{self.boundary}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            'Content-Transfer-Encoding: base64\r\n'
+            f'Content-Location: {url}\r\n\r\n'
+        ).encode())
+        offset = self._file.tell()
+        size, sha256 = self.write_body(base64_lines(chunks))
+        return IndexEntry(
+            url,
+            name,
+            content_type,
+            record_offset,
+            offset,
+            self._file.tell() - offset,
+            size,
+            sha256,
+            self.encoding,
+        )
+
+    def write_body(self, chunks: Iterable[bytes]) -> tuple:
+        """Write base64 *chunks*, return size and digest of the decoded."""
+        digest = hashlib.sha256()
+        size = 0
+        for chunk, encoded in chunks:
+            digest.update(chunk)
+            self._file.write(encoded)
+            size += len(chunk)
+        return size, digest.hexdigest()
+
+    def write_end(self) -> None:
+        """Write the closing boundary."""
+        self._file.write(f'\r\n--{self.boundary}--\r\n'.encode())
+
+
+ARCHIVES = {  # noqa: WPS407
+    'warc': WarcArchive,
+    'mhtml': MhtmlArchive,
+    'tar': TarArchive,
+}
+
+
+def base64_lines(chunks: Iterable[bytes]):
+    """Yield tuple (chunk, its base64 lines) of *chunks*.
+
+    Lines are 76 characters long, bytes that don't fill a line wait for
+    the next chunk.
+    """
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        line_bytes = len(pending) - len(pending) % BASE64_LINE_BYTES
+        yield chunk, encode_lines(pending[:line_bytes])
+        pending = pending[line_bytes:]
+    yield b'', encode_lines(pending)
+
+
+def encode_lines(data: bytes) -> bytes:
+    """Return *data* base64 encoded in CRLF terminated lines."""
+    return base64.encodebytes(data).replace(b'\n', b'\r\n')
+
+
+def warc_header(
+    record_type: str,
+    content_type: str,
+    size: int,
+    sha256: str,
+    target_uri: str = None,
+) -> bytes:
+    """Return header of a WARC record of *size* bytes.
+
+    The header length doesn't depend on *size* and *sha256*.
+    """
+    fields = [
+        ('WARC-Type', record_type),
+        ('WARC-Record-ID', f'<urn:uuid:{uuid.uuid4()}>'),
+        ('WARC-Date', f'{datetime.now(timezone.utc):{WARC_DATE_FORMAT}}'),
+    ]
+    if target_uri:
+        fields.append(('WARC-Target-URI', target_uri))
+    fields.extend([
+        ('Content-Type', content_type),
+        ('WARC-Block-Digest', f'sha256:{sha256}'),
+        ('Content-Length', f'{size:<{WARC_LENGTH_WIDTH}}'),
+    ])
+    lines = ''.join(f'{name}: {field}\r\n' for name, field in fields)
+    return f'WARC/1.1\r\n{lines}\r\n'.encode()
+
+
+def guess_type(name: str) -> str:
+    """Return content type of the file *name*."""
+    return mimetypes.guess_type(name)[0] or DEFAULT_CONTENT_TYPE
+
+
+def index_path(archive_path: str) -> Path:
+    """Return path of the index of the archive at *archive_path*."""
+    archive_path = Path(archive_path)
+    return archive_path.with_name(f'{archive_path.name}{INDEX_SUFFIX}')
+
+
+def read_index(archive_path: str) -> dict:
+    """Return dict of url and IndexEntry of the archive at *archive_path*.
+
+    The last record of a url wins.
+    """
+    with open(index_path(archive_path)) as index_file:
+        entries = (IndexEntry(**json.loads(line)) for line in index_file)
+        return {entry.url: entry for entry in entries}
+
+
+def read_entry(archive_path: str, entry: IndexEntry) -> bytes:
+    """Return body of *entry* read from the archive at *archive_path*."""
+    with open(archive_path, 'rb') as archive_file:
+        archive_file.seek(entry.offset)
+        body = archive_file.read(entry.length)
+    if entry.encoding == 'base64':
+        return base64.decodebytes(body)
+    return body
+
+
+def read_resource(archive_path: str, url: str) -> bytes:
+    """Return body of the resource from *url* stored in the archive.
+
+    Only the index and the record itself are read.
+    Raise KeyError if the resource isn't in the archive.
+    """
+    return read_entry(archive_path, read_index(archive_path)[url])
+
+
+def download_archive(  # noqa: WPS211
+    url: str,
+    output_path: str,
+    archive_format: str = 'warc',
+    client=None,
+    workers: int = 1,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    retries: int = DEFAULT_RETRIES,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    cache_dir: str = None,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    stats=None,
+    rewrite: str = DEFAULT_REWRITE,
+    parser: str = DEFAULT_PARSER,
+    limiter=None,
+    asset_classes: Iterable[str] = None,
+    budget: Budget = None,
+) -> str:
+    """Download page from *url* with its files into a single archive.
+
+    *archive_format* is 'warc', 'mhtml' or 'tar', see ARCHIVES. The page
+    and its files are written into *<page>.<format>* in *output_path*
+    without a files directory, and *<page>.<format>.idx* lists where
+    every resource is, see read_resource(). Every body is spooled first,
+    in memory up to SPOOL_SIZE bytes and in a temporary file above it,
+    so a slow download doesn't hold the archive while others wait. WARC
+    and MHTML keep the original links, a tar holds the page with links
+    rewritten and its *_files* directory, as download() saves them.
+    Files referred to by stylesheets are archived, but the stylesheets
+    keep their links.
+    Other arguments are the same as in download().
+    Return full path of the archive.
+    """
+    pool_size = max(pool_size, workers)
+    cache = HttpCache(cache_dir, cache_size) if cache_dir else None
+    archive_path = Path(output_path) / url_to_name(url, f'.{archive_format}')
+    with polite_session_scope(
+        client, pool_size, retries, limiter,
+    ) as session:
+        archive_class = ARCHIVES[archive_format]
+        with archive_class(archive_path, output_path, url) as archive:
+            archive_page(
+                url,
+                archive,
+                session,
+                partial(
+                    archive_file,
+                    archive=archive,
+                    client=session,
+                    chunk_size=chunk_size,
+                    cache=cache,
+                ),
+                workers=workers,
+                stats=stats or NULL_STATS,
+                document_class=document_factory(
+                    rewrite, parser, asset_classes,
+                ),
+                budget=budget,
+            )
+    return str(archive_path.resolve())
+
+
+def archive_page(  # noqa: WPS211
+    url: str,
+    archive: Archive,
+    client,
+    fetch_file,
+    workers: int = 1,
+    stats=NULL_STATS,
+    document_class=None,
+    budget: Budget = None,
+) -> PageResult:
+    """Download page from *url* with its files into *archive*.
+
+    fetch_file - function (file_url, files_dir) adding one file to the
+        archive, see archive_file().
+    document_class - callable (content, encoding, url) creating the page
+        document, see document.document_factory().
+    Return PageResult.
+    """
+    start = time.perf_counter()
+    page_result = PageResult(url, path=str(archive.path.resolve()))
+    page_budget = budget.start() if budget else None
+    if page_budget is not None:
+        fetch_file = partial(fetch_file, page_budget=page_budget)
+    with stats.phase('fetch_page'):
+        response = client.get(url, **page_options(page_budget))
+        response.raise_for_status()
+    with stats.phase('parse'):
+        document = (document_class or document_factory())(
+            response.content, response_encoding(response), url,
+        )
+    content_type = response.headers.get('Content-Type')
+    if not archive.rewrites_links:
+        archive.add(url, content_type, [response.content], url_to_name(url))
+    with stats.phase('download_files'):
+        page_result.file_paths, page_result.errors = archive_files(
+            url, archive, document.asset_links, fetch_file, workers, stats,
+        )
+    page_result.skipped = pop_skipped(page_result.errors)
+    if archive.rewrites_links:
+        with stats.phase('rewrite'):
+            document.rewrite(page_result.file_paths, archive.base_dir)
+        archive.add(url, content_type, [document.render()], url_to_name(url))
+    page_result.seconds = time.perf_counter() - start
+    return page_result
+
+
+def archive_files(  # noqa: WPS211
+    url: str,
+    archive: Archive,
+    asset_links: list,
+    fetch_file,
+    workers: int,
+    stats=NULL_STATS,
+) -> tuple:
+    """Download files from *asset_links* of the page into *archive*.
+
+    Return tuple (file_paths, errors), see collect_results(). File paths
+    are where the files would be on disk, as the tar names them.
+    """
+    files_dir = archive.base_dir / url_to_name(url, '_files')
+    if stats is not NULL_STATS:
+        fetch_file = partial(fetch_file, stats=stats)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        queue = DownloadQueue(
+            executor,
+            str(files_dir),
+            fetch_file,
+            scan=archive.scan_stylesheet,
+            rewrite_links=False,
+        )
+        file_paths, errors = collect_results(queue.submit(url, asset_links))
+    for link, error in errors.items():
+        logger.warning('Failed to download %s: %s', link, error)
+    return file_paths, errors
+
+
+def archive_file(  # noqa: WPS211
+    url: str,
+    files_dir: str,
+    archive: Archive,
+    client,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    cache=None,
+    stats=NULL_STATS,
+    page_budget=None,
+) -> str:
+    """Download file from *url* into *archive*.
+
+    The file is named as download_file() would save it to *files_dir*.
+    Other arguments are the same as in download_file().
+    Return the path the file would have on disk.
+    """
+    if page_budget is not None:
+        client = BudgetClient(client, page_budget)
+    stream = partial(
+        cache.open_stream, page_budget=page_budget,
+    ) if cache else open_stream
+    start = time.perf_counter()
+    with stream(url, client, chunk_size) as file_stream:
+        chunks = file_stream.chunks
+        if page_budget is not None:
+            chunks = page_budget.limit(chunks)
+        file_path = Path(files_dir) / url_to_name(file_stream.url)
+        entry = archive.add(
+            file_stream.url,
+            file_stream.content_type,
+            chunks,
+            archive.member_name(file_path),
+        )
+    stats.record_file(
+        url=url,
+        bytes=entry.size,
+        seconds=round(time.perf_counter() - start, 6),
+        retries=file_stream.retries,
+        cached=file_stream.cached,
+    )
+    return str(file_path)
@@ -0,0 +1,181 @@
+import logging
+import os
+import urllib
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Iterable
+
+import bs4
+
+from page_loader.defaults import (  # noqa: F401
+    DEFAULT_PARSER,
+    FALLBACK_PARSER,
+    PARSERS,
+)
+from page_loader.extractors import (
+    TEXT,
+    AssetSelector,
+    find_extractor,
+    replace_links,
+)
+from page_loader.storage import servable_path
+from page_loader.url import url_resolver
+
+PAGE_SCHEMES = ('', 'http', 'https')
+AUTO_PARSERS = ('lxml', FALLBACK_PARSER)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_html(html: str, parser: str = DEFAULT_PARSER) -> bs4.BeautifulSoup:
+    """Parse *html* text into a soup with *parser* backend."""
+    return bs4.BeautifulSoup(html, features=resolve_parser(parser))
+
+
+@lru_cache()
+def resolve_parser(parser: str) -> str:
+    """Return *parser* if it is installed, html.parser otherwise.
+
+    'auto' is the fastest installed parser.
+    """
+    candidates = AUTO_PARSERS if parser == 'auto' else (parser,)
+    for candidate in candidates:
+        if bs4.builder.builder_registry.lookup(candidate) is not None:
+            return candidate
+    logger.warning(
+        'Parser %s is not installed, %s is used', parser, FALLBACK_PARSER,
+    )
+    return FALLBACK_PARSER
+
+
+def find_asset_links(
+    soup: bs4.BeautifulSoup, url: str, asset_classes: Iterable[str] = None,
+) -> list:
+    """Collect links to the same domain or subdomain files in one walk.
+
+    soup - parsed page.
+    url - url from which the page was downloaded.
+    asset_classes - names of the asset classes to collect, see
+        page_loader.extractors. All of them by default.
+    Links are found by the extractors of page_loader.extractors. Links in
+    the text of a tag, such as url() in <style>, have TEXT as the
+    attribute name.
+    Return list of tuple (tag, link_attribute_name, link) in document order.
+    """
+    resolver = url_resolver(url)
+    selector = AssetSelector(asset_classes)
+    asset_links = []
+    for tag in soup.find_all(partial(has_asset_links, selector)):
+        asset_links.extend(
+            (tag, link_attribute_name, link)
+            for link_attribute_name, link in tag_links(tag, selector)
+            if link and resolver.is_same_domain(link)
+        )
+    return asset_links
+
+
+def has_asset_links(selector: AssetSelector, tag: bs4.Tag) -> bool:
+    """Return True if *tag* may have links of *selector*."""
+    return selector.has_links(tag.name, tag.attrs)
+
+
+def tag_links(tag: bs4.Tag, selector: AssetSelector) -> list:
+    """Return list of tuple (link_attribute_name, link) of *tag*."""
+    container = tag.parent.name if tag.parent else None
+    links = []
+    extractors = selector.select(tag.name, tag_attributes(tag), container)
+    for extractor in extractors:
+        attribute_value = tag_value(tag, extractor.attribute)
+        links.extend(
+            (extractor.attribute, attribute_value[start:end])
+            for start, end in extractor.parse(attribute_value or '')
+        )
+    return links
+
+
+def tag_attributes(tag: bs4.Tag) -> dict:
+    """Return attributes of *tag* with multi-valued ones joined by spaces."""
+    return {
+        name: ' '.join(values) if isinstance(values, list) else values
+        for name, values in tag.attrs.items()
+    }
+
+
+def tag_value(tag: bs4.Tag, attribute: str) -> str:
+    """Return value of *attribute* of *tag*, or its text for TEXT."""
+    if attribute == TEXT:
+        return tag.string
+    return tag.get(attribute)
+
+
+def replace_asset_links(
+    asset_links: list, local_paths: dict, base_dir: str,
+) -> None:
+    """Rewrite tags from *asset_links* in place to point to local files.
+
+    asset_links - list of tuple (tag, link_attribute_name, link).
+    local_paths - dict. Key is link, value is absolute file path.
+    base_dir - the directory where the page is stored. New links are
+        relative to it.
+    Only the link is replaced in attributes holding several links, such
+    as srcset and style.
+    """
+    base_dir = Path(base_dir).resolve()
+    for tag, link_attribute_name, link in asset_links:
+        if link not in local_paths:
+            continue
+        extractor = find_extractor(tag.name, link_attribute_name)
+        new_value = replace_links(
+            tag_value(tag, link_attribute_name),
+            extractor.parse,
+            {link: local_link(local_paths[link], base_dir)},
+        )
+        if link_attribute_name == TEXT:
+            tag.string.replace_with(type(tag.string)(new_value))
+        else:
+            tag[link_attribute_name] = new_value
+
+
+def local_link(file_path: str, base_dir: Path) -> str:
+    """Return link to *file_path* relative to resolved *base_dir*.
+
+    Compressed files are linked by their servable path.
+    """
+    return Path(
+        os.path.relpath(servable_path(file_path), base_dir),
+    ).as_posix()
+
+
+def find_page_links(soup: bs4.BeautifulSoup, url: str) -> list:
+    """Collect links to the same domain or subdomain pages.
+
+    soup - parsed page.
+    url - url from which the page was downloaded.
+    Return list of tuple (tag, page_url, fragment) in document order, where
+    page_url is canonical absolute url of the linked page.
+    """
+    resolver = url_resolver(url)
+    page_links = []
+    for tag in soup.find_all('a', href=True):
+        link = tag['href']
+        parsed_link = urllib.parse.urlsplit(link)
+        if link.startswith('#') or parsed_link.scheme not in PAGE_SCHEMES:
+            continue
+        if resolver.is_same_domain(link):
+            page_url = resolver.canonical(link)
+            page_links.append((tag, page_url, parsed_link.fragment))
+    return page_links
+
+
+def replace_page_links(page_links: list, page_names: dict) -> None:
+    """Rewrite tags from *page_links* in place to point to saved pages.
+
+    page_links - list of tuple (tag, page_url, fragment).
+    page_names - dict. Key is canonical page url, value is the name of the
+        saved page file relative to the page directory.
+    """
+    for tag, page_url, fragment in page_links:
+        if page_url not in page_names:
+            continue
+        page_name = page_names[page_url]
+        tag['href'] = f'{page_name}#{fragment}' if fragment else page_name
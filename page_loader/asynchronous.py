@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import logging
+import os
+import urllib
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Iterable
+
+from page_loader.assets import (
+    DEFAULT_PARSER,
+    find_asset_links,
+    parse_html,
+    replace_asset_links,
+)
+from page_loader.http import DEFAULT_CHUNK_SIZE
+from page_loader.storage import create_temp_file, move_to_store
+from page_loader.url import url_resolver, url_to_name
+
+DEFAULT_WORKERS = 10
+DEFAULT_PER_HOST = 6
+
+logger = logging.getLogger(__name__)
+
+
+async def async_download(  # noqa: WPS211
+    url: str,
+    output_path: str,
+    client=None,
+    workers: int = DEFAULT_WORKERS,
+    per_host: int = DEFAULT_PER_HOST,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    store_dir: str = None,
+    parser: str = DEFAULT_PARSER,
+    asset_classes: Iterable[str] = None,
+) -> str:
+    """Download data from *url* and save to *output_path* asynchronously.
+
+    Coroutine counterpart of download(). Files are fetched through the
+    httpx.AsyncClient *client*, no more than *workers* at the same time and
+    no more than *per_host* from one host. If *client* is not given, one is
+    created for this call and closed afterwards. Parsing, rewriting,
+    rendering and disk writes run in the default executor, so the event
+    loop isn't blocked.
+    Other arguments are the same as in download().
+    """
+    async with client_scope(client, workers) as async_client:
+        response = await async_client.get(url)
+        response.raise_for_status()
+        loop = asyncio.get_running_loop()
+        soup, asset_links = await loop.run_in_executor(
+            None, scan_page, response, url, parser, asset_classes,
+        )
+        files_dir = Path(
+            store_dir or Path(output_path) / url_to_name(url, '_files'),
+        )
+        if asset_links:
+            files_dir.mkdir(parents=True, exist_ok=True)
+        downloader = AsyncDownloader(
+            async_client, workers, per_host, chunk_size, store_dir is not None,
+        )
+        local_paths = await downloader.download_all(
+            url, files_dir, asset_links,
+        )
+    file_path = Path(output_path) / url_to_name(url)
+    await loop.run_in_executor(
+        None, save_page, soup, asset_links, local_paths, file_path,
+    )
+    return str(file_path.resolve())
+
+
+def scan_page(
+    response, url: str, parser: str, asset_classes: Iterable[str] = None,
+) -> tuple:
+    """Parse page *response* from *url* and find its asset links.
+
+    Return tuple (soup, asset links), see find_asset_links().
+    """
+    soup = parse_html(response.text, parser)
+    return soup, find_asset_links(soup, url, asset_classes)
+
+
+def save_page(
+    soup, asset_links: list, local_paths: dict, file_path: Path,
+) -> None:
+    """Point *asset_links* of *soup* to *local_paths*, write to *file_path*."""
+    replace_asset_links(asset_links, local_paths, file_path.parent)
+    file_path.write_text(soup.prettify())
+
+
+@asynccontextmanager
+async def client_scope(client, workers: int):
+    """Provide *client*, or a new httpx.AsyncClient closed on exit."""
+    if client is not None:
+        yield client
+        return
+    import httpx  # noqa: WPS433
+
+    limits = httpx.Limits(max_connections=workers)
+    async with httpx.AsyncClient(
+        limits=limits, follow_redirects=True,
+    ) as async_client:
+        yield async_client
+
+
+class AsyncDownloader(object):
+    """Downloads files limiting concurrency in total and per host.
+
+    A file waits for its host before taking one of the *workers*, so
+    files of a busy host don't keep files of other hosts waiting.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        client,
+        workers: int,
+        per_host: int,
+        chunk_size: int,
+        content_addressed: bool,
+    ):
+        """Create downloader using httpx.AsyncClient *client*."""
+        self.client = client
+        self.per_host = per_host
+        self.chunk_size = chunk_size
+        self.content_addressed = content_addressed
+        self.semaphore = asyncio.Semaphore(workers)
+        self.host_semaphores = {}
+
+    async def download_all(
+        self, url: str, files_dir: Path, asset_links: list,
+    ) -> dict:
+        """Download each url of *asset_links* once.
+
+        Return dict. Key is file link, value is absolute file path. Links
+        of files that failed to download are left out.
+        """
+        resolver = url_resolver(url)
+        url_tasks = {}
+        link_tasks = {}
+        for _, _, file_url in asset_links:
+            absolute_file_url = resolver.canonical(file_url)
+            if absolute_file_url not in url_tasks:
+                url_tasks[absolute_file_url] = asyncio.ensure_future(
+                    self.download_file(absolute_file_url, files_dir),
+                )
+            link_tasks[file_url] = url_tasks[absolute_file_url]
+        await asyncio.gather(*url_tasks.values(), return_exceptions=True)
+        local_paths = {}
+        for file_url, task in link_tasks.items():
+            if task.exception() is None:
+                local_paths[file_url] = task.result()
+            else:
+                logger.warning(
+                    'Failed to download %s: %s', file_url, task.exception(),
+                )
+        return local_paths
+
+    async def download_file(self, url: str, files_dir: Path) -> str:
+        """Download file from *url* to *files_dir*. Return full file path."""
+        host = urllib.parse.urlsplit(url).netloc
+        host_semaphore = self.host_semaphores.setdefault(
+            host, asyncio.Semaphore(self.per_host),
+        )
+        async with host_semaphore, self.semaphore:
+            async with self.client.stream('GET', url) as response:
+                response.raise_for_status()
+                file_name = url_to_name(str(response.url))
+                temp_name, digest = await write_temp_file(
+                    response.aiter_bytes(self.chunk_size),
+                    files_dir,
+                    file_name,
+                )
+        loop = asyncio.get_running_loop()
+        if self.content_addressed:
+            file_path = files_dir / f'{digest}{Path(file_name).suffix}'
+            await loop.run_in_executor(
+                None, move_to_store, temp_name, file_path,
+            )
+        else:
+            file_path = files_dir / file_name
+            await loop.run_in_executor(None, os.replace, temp_name, file_path)
+        return str(file_path.resolve())
+
+
+async def write_temp_file(chunks, directory: Path, name: str) -> tuple:
+    """Write async iterable of *chunks* to a temporary file in *directory*.
+
+    The file is created by storage.create_temp_file(), so it gets the same
+    mode as the files of download().
+    Return tuple (temporary file name, SHA-256 hex digest of the content).
+    The file is removed if writing fails.
+    """
+    loop = asyncio.get_running_loop()
+    descriptor, temp_name = await loop.run_in_executor(
+        None, create_temp_file, directory, name,
+    )
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(descriptor, 'wb') as temp_file:
+            async for chunk in chunks:
+                digest.update(chunk)
+                await loop.run_in_executor(None, temp_file.write, chunk)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+    return temp_name, digest.hexdigest()
@@ -0,0 +1,150 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from typing import Iterable, Iterator
+
+import requests
+
+from page_loader.assets import DEFAULT_PARSER
+from page_loader.cache import DEFAULT_CACHE_SIZE, HttpCache
+from page_loader.document import DEFAULT_REWRITE
+from page_loader.http import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_RETRIES,
+)
+from page_loader.page_loader import (
+    PageResult,
+    download_page,
+    file_fetcher,
+    stream_page,
+)
+from page_loader.politeness import polite_session_scope
+from page_loader.pool import create_pool
+from page_loader.stats import NULL_STATS, Stats
+
+logger = logging.getLogger(__name__)
+
+
+def download_batch(  # noqa: WPS211
+    urls: Iterable[str],
+    output_path: str,
+    page_workers: int = 1,
+    client=None,
+    workers: int = 1,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    retries: int = DEFAULT_RETRIES,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    store_dir: str = None,
+    cache_dir: str = None,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    stats: bool = False,
+    hooks: Iterable = (),
+    rewrite: str = DEFAULT_REWRITE,
+    parser: str = DEFAULT_PARSER,
+    resume: bool = False,
+    limiter=None,
+    compress: bool = False,
+    asset_classes: Iterable[str] = None,
+    budget=None,
+    low_memory: bool = False,
+    processes: int = 0,
+) -> Iterator[PageResult]:
+    """Download pages from *urls* and save them to *output_path*.
+
+    All pages share one session, one cache and one *limiter*. Up to
+    *page_workers* pages are downloaded at the same time, each with up to
+    *workers* files at the same time. *urls* are read lazily and results
+    are yielded in the same order. A page that failed to download gives a
+    result with the error instead of stopping the batch. Every page gets
+    its own *budget*, see page_loader.budget.Budget. If *stats* is
+    True, every result has a stats report and measurements are passed to
+    *hooks*.
+
+    If *processes* is not 0, pages are parsed and rendered in a pool of
+    that many processes, so pages downloaded at the same time use more
+    than one core, see pool.PooledDocument. Files are then not prefetched
+    while the page arrives, as scanning for them would hold the GIL of
+    this process. Streamed *low_memory* pages don't use the pool.
+    Other arguments are the same as in download().
+    """
+    cache = HttpCache(cache_dir, cache_size) if cache_dir else None
+    pool_size = max(pool_size, workers * page_workers)
+    page_options = {'rewrite': rewrite, 'parser': parser}
+    pool_scope = nullcontext()
+    if low_memory:
+        page_options = {
+            'download_function': partial(stream_page, chunk_size=chunk_size),
+        }
+    elif processes:
+        pool_scope = create_pool(processes)
+    with polite_session_scope(
+        client, pool_size, retries, limiter,
+    ) as session, pool_scope as document_pool:
+        if document_pool is not None:
+            page_options.update(document_pool=document_pool, prefetch=False)
+        load = partial(
+            load_page,
+            output_path=output_path,
+            client=session,
+            fetch_file=file_fetcher(
+                session, chunk_size, store_dir, cache, compress,
+            ),
+            workers=workers,
+            files_dir=store_dir,
+            hooks=hooks if stats else None,
+            resume=resume,
+            asset_classes=asset_classes,
+            budget=budget,
+            **page_options,
+        )
+        with ThreadPoolExecutor(max_workers=page_workers) as executor:
+            yield from map_ordered(executor, load, urls, page_workers)
+
+
+def load_page(
+    url: str,
+    output_path: str,
+    hooks=None,
+    download_function=download_page,
+    **kwargs,
+) -> PageResult:
+    """Download page like download_page() but return errors in result.
+
+    Network, disk and decoding errors of the page end up in the result,
+    so the rest of the batch goes on. If *hooks* is not None, the page
+    gets its own Stats notifying them.
+    download_function - download_page() or stream_page().
+    """
+    stats = NULL_STATS if hooks is None else Stats(hooks)
+    try:
+        return download_function(url, output_path, stats=stats, **kwargs)
+    except (
+        requests.RequestException, OSError, LookupError, UnicodeError,
+    ) as error:
+        logger.warning('Failed to download %s: %s', url, error)
+        return PageResult(url, errors={url: error})
+
+
+def map_ordered(executor, function, items: Iterable, window: int) -> Iterator:
+    """Yield results of *function* for *items* in order.
+
+    No more than *window* items are read ahead of the yielded result.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) > window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def read_urls(lines: Iterable[str]) -> Iterator[str]:
+    """Yield urls from *lines*, skipping blank lines and # comments."""
+    for line in lines:
+        url = line.strip()
+        if url and not url.startswith('#'):
+            yield url
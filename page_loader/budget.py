@@ -0,0 +1,210 @@
+import threading
+import time
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import Iterable, Iterator, Tuple
+
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+NOT_MODIFIED = 304
+
+
+class BudgetExceeded(Exception):
+    """File is not downloaded because it is over a budget of the page."""
+
+
+@dataclass(frozen=True)
+class Budget(object):
+    """Limits of time, size and type of the files of every page.
+
+    connect_timeout, read_timeout - seconds to connect and to wait for
+        the next bytes of a response.
+    max_file_bytes - size of one file, checked against Content-Length
+        before the body is read and enforced while it is streamed.
+    max_page_bytes - total size of the files of a page.
+    deadline - seconds from the start of the page after which no file is
+        requested and files being downloaded are abandoned.
+    allow_types, deny_types - patterns of MIME types such as 'image/*'.
+        A file is downloaded if its type matches an allowed pattern, or
+        there are none, and no denied one.
+    Limits that are None or empty aren't applied.
+    """
+
+    connect_timeout: float = None
+    read_timeout: float = None
+    max_file_bytes: int = None
+    max_page_bytes: int = None
+    deadline: float = None
+    allow_types: Tuple[str, ...] = ()
+    deny_types: Tuple[str, ...] = ()
+
+    def start(self) -> 'PageBudget':
+        """Return budget of a page starting now."""
+        return PageBudget(self)
+
+
+class PageBudget(object):
+    """Time and bytes spent by the downloads of one page.
+
+    It is shared between the threads downloading files of the page.
+    """
+
+    def __init__(self, budget: Budget):
+        """Start counting *budget* of a page."""
+        self.budget = budget
+        self.started = time.monotonic()
+        self.bytes_used = 0
+        self._lock = threading.Lock()
+
+    def timeout(self):
+        """Return timeout of the next request, see requests.request().
+
+        Read timeout is cut to the time left before the deadline.
+        Raise BudgetExceeded if the deadline has passed.
+        """
+        read_timeout = self.budget.read_timeout
+        time_left = self.time_left()
+        if time_left is not None:
+            read_timeout = min(read_timeout or time_left, time_left)
+        if self.budget.connect_timeout is None and read_timeout is None:
+            return None
+        return (self.budget.connect_timeout, read_timeout)
+
+    def time_left(self):
+        """Return seconds left before the deadline, None if there is none.
+
+        Raise BudgetExceeded if the deadline has passed.
+        """
+        if self.budget.deadline is None:
+            return None
+        time_left = self.budget.deadline - (time.monotonic() - self.started)
+        if time_left <= 0:
+            raise BudgetExceeded(
+                f'deadline of {self.budget.deadline} seconds has passed',
+            )
+        return time_left
+
+    def check_response(self, response) -> None:
+        """Check type and Content-Length of *response* of a file.
+
+        Raise BudgetExceeded if the file is over the budget.
+        """
+        if not response.ok or response.status_code == NOT_MODIFIED:
+            return
+        self.check_type(response.headers.get('Content-Type'))
+        content_length = response.headers.get('Content-Length', '')
+        if content_length.isdigit():
+            self.check_size(int(content_length))
+
+    def check_type(self, content_type: str) -> None:
+        """Raise BudgetExceeded if *content_type* isn't allowed."""
+        mime_type = (content_type or DEFAULT_CONTENT_TYPE).split(';')[0]
+        mime_type = mime_type.strip().lower()
+        allowed = not self.budget.allow_types or matches(
+            mime_type, self.budget.allow_types,
+        )
+        if not allowed or matches(mime_type, self.budget.deny_types):
+            raise BudgetExceeded(f'type {mime_type} is not allowed')
+
+    def check_size(self, size: int, file_bytes: int = None) -> None:
+        """Raise BudgetExceeded if a file of *size* bytes doesn't fit.
+
+        file_bytes - bytes of the file already counted to the page.
+        """
+        self.check_file_size(size)
+        max_page_bytes = self.budget.max_page_bytes
+        page_bytes = self.bytes_used + size - (file_bytes or 0)
+        if max_page_bytes is not None and page_bytes > max_page_bytes:
+            raise BudgetExceeded(
+                f'files of the page are larger than {max_page_bytes} bytes',
+            )
+
+    def check_file_size(self, size: int) -> None:
+        """Raise BudgetExceeded if one file of *size* bytes is too large."""
+        max_file_bytes = self.budget.max_file_bytes
+        if max_file_bytes is not None and size > max_file_bytes:
+            raise BudgetExceeded(
+                f'file is larger than {max_file_bytes} bytes',
+            )
+
+    def check_stored(self, content_type: str, size: int) -> None:
+        """Check type and size of a file that is already stored.
+
+        Raise BudgetExceeded if the file is over the budget.
+        """
+        self.check_type(content_type)
+        self.check_size(size)
+
+    def cap(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Yield *chunks* of a file while it is within the file size.
+
+        Unlike limit(), bytes aren't counted to the page, so a file can be
+        checked while it is stored in a cache and counted when it is used.
+        Raise BudgetExceeded when the file gets too large.
+        """
+        file_bytes = 0
+        for chunk in chunks:
+            self.time_left()
+            file_bytes += len(chunk)
+            self.check_file_size(file_bytes)
+            yield chunk
+
+    def limit(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Yield *chunks* of a file while they are within the budget.
+
+        Bytes are counted to the page as they are yielded and given back
+        if the file is abandoned for any reason: over the budget, a
+        network or disk error, or its reader stopping.
+        Raise BudgetExceeded when the file gets over the budget.
+        """
+        file_bytes = 0
+        try:
+            for chunk in chunks:
+                self.time_left()
+                with self._lock:
+                    self.check_size(file_bytes + len(chunk), file_bytes)
+                    self.bytes_used += len(chunk)
+                file_bytes += len(chunk)
+                yield chunk
+        except BaseException:
+            with self._lock:
+                self.bytes_used -= file_bytes
+            raise
+
+
+class BudgetClient(object):
+    """Client requesting files within a PageBudget.
+
+    Requests get the timeouts of the budget, and responses of files over
+    the budget are closed and raise BudgetExceeded.
+    """
+
+    def __init__(self, client, page_budget: PageBudget):
+        """Wrap requests module or session *client*."""
+        self.client = client
+        self.page_budget = page_budget
+
+    def get(self, url: str, **kwargs):
+        """Send GET request to *url* and check the response headers."""
+        kwargs.setdefault('timeout', self.page_budget.timeout())
+        response = self.client.get(url, **kwargs)
+        try:
+            self.page_budget.check_response(response)
+        except BudgetExceeded:
+            response.close()
+            raise
+        return response
+
+    def __getattr__(self, name: str):
+        """Delegate everything else to the wrapped client."""
+        return getattr(self.client, name)
+
+
+def matches(mime_type: str, patterns: Iterable[str]) -> bool:
+    """Return True if *mime_type* matches any of *patterns*.
+
+    >>> matches('image/png', ['text/*', 'image/*'])
+    True
+    >>> matches('video/mp4', ['image/*'])
+    False
+    """
+    return any(fnmatchcase(mime_type, pattern.lower()) for pattern in patterns)
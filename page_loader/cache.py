@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+
+from page_loader.defaults import DEFAULT_CACHE_SIZE
+from page_loader.http import DEFAULT_CHUNK_SIZE, FileStream, retries_count
+from page_loader.storage import write_chunks
+from page_loader.url import canonical_url
+
+NOT_MODIFIED = 304
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+NO_CACHE_DIRECTIVES = ('no-cache', 'no-store')
+
+
+class HttpCache(object):
+    """Persistent cache of downloaded files with conditional requests.
+
+    Each url is stored as a body file and a metadata file named after the
+    hash of its canonical url. Metadata keeps ETag, Last-Modified and
+    Cache-Control of the response, so later downloads send
+    If-None-Match/If-Modified-Since and reuse the body on 304 or while it
+    is still fresh. When the bodies exceed *max_size* bytes, least recently
+    used entries are evicted, except the ones being served.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = DEFAULT_CACHE_SIZE):
+        """Open cache in *cache_dir*, creating the directory if needed."""
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._serving = Counter()
+        self._size = sum(
+            body_path.stat().st_size
+            for body_path in self.cache_dir.glob('*.body')
+        )
+
+    @contextmanager
+    def open_stream(
+        self,
+        url: str,
+        client=requests,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        page_budget=None,
+    ):
+        """Provide FileStream of *url*.
+
+        The body comes from the cache if it is fresh or the server answers
+        304 Not Modified, otherwise it is downloaded and cached first.
+        If *page_budget* is given, a body over its file size isn't cached,
+        and the type and size of a cached body are checked before it is
+        used, see page_loader.budget.PageBudget.
+        """
+        key = self.key(url)
+        with self.serving(key):
+            metadata = self.read_metadata(key)
+            cached, retries = True, 0
+            if metadata is None or not is_fresh(metadata):
+                metadata, cached, retries = self.revalidate(
+                    url, key, metadata, client, chunk_size, page_budget,
+                )
+            if page_budget is not None:
+                page_budget.check_stored(
+                    metadata.get('content_type'),
+                    self.body_path(key).stat().st_size,
+                )
+            self.count(cached)
+            self.touch(key)
+            with open(self.body_path(key), 'rb') as body:
+                yield FileStream(
+                    metadata['url'],
+                    iter(lambda: body.read(chunk_size), b''),
+                    retries,
+                    cached,
+                    content_type=metadata.get('content_type'),
+                )
+
+    @contextmanager
+    def serving(self, key: str):
+        """Keep entry *key* from being evicted while it is in use."""
+        with self._lock:
+            self._serving[key] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._serving[key] -= 1
+                if not self._serving[key]:
+                    del self._serving[key]
+
+    def revalidate(  # noqa: WPS211
+        self,
+        url: str,
+        key: str,
+        metadata,
+        client,
+        chunk_size: int,
+        page_budget=None,
+    ) -> dict:
+        """Send a conditional request for *url* and update the entry.
+
+        A new body is stored only while it is within the file size of
+        *page_budget*.
+        Return tuple (up to date metadata of the entry, True if the cached
+        body is still valid, number of retries made).
+        """
+        headers = validators(metadata) if metadata else {}
+        with client.get(url, stream=True, headers=headers) as response:
+            retries = retries_count(response)
+            if metadata and response.status_code == NOT_MODIFIED:
+                metadata.update({
+                    name: header_value
+                    for name, header_value in response_metadata(
+                        response, metadata['url'],
+                    ).items()
+                    if header_value
+                })
+                self.write_metadata(key, metadata)
+                return metadata, True, retries
+            response.raise_for_status()
+            body_path = self.body_path(key)
+            old_size = body_path.stat().st_size if body_path.exists() else 0
+            chunks = response.iter_content(chunk_size)
+            if page_budget is not None:
+                chunks = page_budget.cap(chunks)
+            write_chunks(chunks, body_path)
+            metadata = response_metadata(response, response.url)
+        self.write_metadata(key, metadata)
+        with self._lock:
+            self._size += body_path.stat().st_size - old_size
+        self.evict()
+        return metadata, False, retries
+
+    def count(self, cached: bool) -> None:
+        """Count a cache hit if *cached* is True, otherwise a miss."""
+        with self._lock:
+            if cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits.
+
+        Entries being served are kept, so an entry larger than the whole
+        cache is still served, and evicted by a later download.
+        """
+        with self._lock:
+            if self._size <= self.max_size:
+                return
+            entries = sorted(
+                (
+                    metadata_path
+                    for metadata_path in self.cache_dir.glob('*.json')
+                    if metadata_path.stem not in self._serving
+                ),
+                key=lambda metadata_path: metadata_path.stat().st_mtime,
+            )
+            for metadata_path in entries:
+                if self._size <= self.max_size:
+                    break
+                self._size -= self.remove(metadata_path.stem)
+
+    def remove(self, key: str) -> int:
+        """Remove entry *key* and return the size of its body."""
+        body_path = self.body_path(key)
+        size = body_path.stat().st_size if body_path.exists() else 0
+        for path in (body_path, self.metadata_path(key)):
+            if path.exists():
+                path.unlink()
+        return size
+
+    def touch(self, key: str) -> None:
+        """Mark entry *key* as recently used."""
+        os.utime(self.metadata_path(key))
+
+    def read_metadata(self, key: str):
+        """Return metadata of entry *key* or None if it isn't cached."""
+        metadata_path = self.metadata_path(key)
+        if not metadata_path.exists() or not self.body_path(key).exists():
+            return None
+        return json.loads(metadata_path.read_text())
+
+    def write_metadata(self, key: str, metadata: dict) -> None:
+        """Save *metadata* of entry *key*."""
+        write_chunks(
+            [json.dumps(metadata).encode()], self.metadata_path(key),
+        )
+
+    def key(self, url: str) -> str:
+        """Return cache key of *url*."""
+        return hashlib.sha256(canonical_url(url).encode()).hexdigest()
+
+    def body_path(self, key: str) -> Path:
+        """Return path of the body of entry *key*."""
+        return self.cache_dir / f'{key}.body'
+
+    def metadata_path(self, key: str) -> Path:
+        """Return path of the metadata of entry *key*."""
+        return self.cache_dir / f'{key}.json'
+
+
+def response_metadata(response, url: str) -> dict:
+    """Return cache metadata of *response* received from *url*."""
+    return {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'cache_control': response.headers.get('Cache-Control', ''),
+        'content_type': response.headers.get('Content-Type'),
+        'stored_at': time.time(),
+    }
+
+
+def validators(metadata: dict) -> dict:
+    """Return conditional request headers for cached *metadata*."""
+    headers = {}
+    if metadata.get('etag'):
+        headers['If-None-Match'] = metadata['etag']
+    if metadata.get('last_modified'):
+        headers['If-Modified-Since'] = metadata['last_modified']
+    return headers
+
+
+def is_fresh(metadata: dict) -> bool:
+    """Return True if the cached body may be used without revalidation."""
+    cache_control = metadata.get('cache_control', '').lower()
+    if any(
+        directive in cache_control for directive in NO_CACHE_DIRECTIVES
+    ):
+        return False
+    max_age = MAX_AGE_PATTERN.search(cache_control)
+    if not max_age:
+        return False
+    return time.time() - metadata['stored_at'] < int(max_age.group(1))
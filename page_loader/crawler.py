@@ -0,0 +1,243 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+import requests
+
+from page_loader.assets import (
+    DEFAULT_PARSER,
+    find_asset_links,
+    find_page_links,
+    parse_html,
+    replace_asset_links,
+    replace_page_links,
+)
+from page_loader.cache import DEFAULT_CACHE_SIZE, HttpCache
+from page_loader.defaults import DEFAULT_MAX_PAGES
+from page_loader.http import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_RETRIES,
+)
+from page_loader.page_loader import (
+    DownloadQueue,
+    collect_results,
+    file_fetcher,
+)
+from page_loader.politeness import polite_session_scope
+from page_loader.url import canonical_url, url_to_name
+
+HTML_TYPES = ('text/html', 'application/xhtml+xml')
+
+logger = logging.getLogger(__name__)
+
+
+class NotHtmlPage(Exception):
+    """Linked page is not saved because its response isn't html."""
+
+
+def crawl(  # noqa: WPS211
+    url: str,
+    output_path: str,
+    depth: int = 1,
+    max_pages: int = DEFAULT_MAX_PAGES,
+    client=None,
+    workers: int = 1,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    retries: int = DEFAULT_RETRIES,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    store_dir: str = None,
+    cache_dir: str = None,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    parser: str = DEFAULT_PARSER,
+    limiter=None,
+    compress: bool = False,
+    asset_classes: Iterable[str] = None,
+) -> list:
+    """Download the page at *url* and same domain pages it links to.
+
+    Pages are visited breadth first up to *depth* links away from *url*,
+    but no more than *max_pages* pages. Pages of one level are fetched
+    concurrently. Only html responses are saved as pages. Links between
+    saved pages are rewritten to the local copies, links to pages that
+    failed to download or aren't html are kept. Files of all pages are
+    stored once in a common directory.
+    Other arguments are the same as in download().
+    Return list of full paths of saved pages, the page at *url* first.
+    Raise the error of the page at *url*, requests.RequestException or
+    NotHtmlPage, if it isn't saved.
+    """
+    cache = HttpCache(cache_dir, cache_size) if cache_dir else None
+    files_dir = store_dir or str(
+        Path(output_path) / url_to_name(url, '_files'),
+    )
+    pool_size = max(pool_size, workers)
+    with polite_session_scope(
+        client, pool_size, retries, limiter,
+    ) as session:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            crawler = Crawler(
+                executor,
+                session,
+                output_path,
+                files_dir,
+                file_fetcher(
+                    session, chunk_size, store_dir, cache, compress,
+                ),
+                parser,
+                asset_classes,
+            )
+            return crawler.run(url, depth, max_pages)
+
+
+class Crawler(object):
+    """Breadth first crawler sharing one executor between all downloads."""
+
+    def __init__(  # noqa: WPS211
+        self,
+        executor,
+        client,
+        output_path: str,
+        files_dir: str,
+        fetch_file,
+        parser: str = DEFAULT_PARSER,
+        asset_classes: Iterable[str] = None,
+    ):
+        """Create crawler saving pages to *output_path*."""
+        self.executor = executor
+        self.client = client
+        self.output_path = output_path
+        self.files_dir = files_dir
+        self.parser = parser
+        self.asset_classes = asset_classes
+        self.page_names = {}
+        self.used_names = set()
+        self.visited = set()
+        self.errors = {}
+        self.queue = DownloadQueue(executor, files_dir, fetch_file)
+
+    def run(self, url: str, depth: int, max_pages: int) -> list:
+        """Crawl from *url* and return full paths of saved pages.
+
+        Pages of a level are saved once the next level is fetched, so
+        their links only point to pages that were saved.
+        """
+        start_url = canonical_url(url)
+        self.name_page(start_url)
+        self.visited = {start_url}
+        pages = self.fetch_level([start_url])
+        if not pages:
+            raise self.errors[start_url]
+        saved_paths = []
+        for _ in range(depth):
+            next_pages = self.fetch_level(self.schedule(pages, max_pages))
+            saved_paths.extend(self.save(*page) for page in pages)
+            pages = next_pages
+        saved_paths.extend(self.save(*page) for page in pages)
+        return saved_paths
+
+    def fetch_level(self, frontier: list) -> list:
+        """Fetch pages of *frontier* concurrently and start their downloads.
+
+        Pages that failed to download or aren't html are forgotten, so no
+        saved page links to them, and their errors are kept in errors.
+        Return list of tuple (page_url, soup, asset_links, page_links,
+        futures) for html pages fetched successfully.
+        """
+        responses = [
+            (
+                page_url,
+                self.executor.submit(self.client.get, page_url, stream=True),
+            )
+            for page_url in frontier
+        ]
+        pages = []
+        for page_url, future in responses:
+            try:
+                text = read_page(future.result())
+            except (requests.RequestException, NotHtmlPage) as error:
+                logger.warning('Failed to download %s: %s', page_url, error)
+                self.errors[page_url] = error
+                del self.page_names[page_url]
+                continue
+            soup = parse_html(text, self.parser)
+            asset_links = find_asset_links(
+                soup, page_url, self.asset_classes,
+            )
+            if asset_links:
+                Path(self.files_dir).mkdir(parents=True, exist_ok=True)
+            futures = self.queue.submit(page_url, asset_links)
+            page_links = find_page_links(soup, page_url)
+            pages.append((page_url, soup, asset_links, page_links, futures))
+        return pages
+
+    def schedule(self, pages: list, max_pages: int) -> list:
+        """Return not visited pages linked from *pages*, in link order."""
+        frontier = []
+        for _, _, _, page_links, _ in pages:
+            for _, page_url, _ in page_links:
+                if len(self.visited) >= max_pages:
+                    return frontier
+                if page_url not in self.visited:
+                    self.visited.add(page_url)
+                    self.name_page(page_url)
+                    frontier.append(page_url)
+        return frontier
+
+    def name_page(self, page_url: str) -> None:
+        """Give the page at *page_url* a file name no other page has.
+
+        Names come from the host and path only, so pages that differ in
+        their query, or whose paths map to the same name, get a counter.
+        """
+        name = url_to_name(page_url)
+        stem, suffix = os.path.splitext(name)
+        index = 1
+        while name in self.used_names:
+            index += 1
+            name = f'{stem}-{index}{suffix}'
+        self.used_names.add(name)
+        self.page_names[page_url] = name
+
+    def save(  # noqa: WPS211
+        self, page_url: str, soup, asset_links, page_links, futures,
+    ) -> str:
+        """Wait for files of the page, rewrite its links and save it."""
+        local_paths, errors = collect_results(futures)
+        for link, error in errors.items():
+            logger.warning('Failed to download %s: %s', link, error)
+        replace_asset_links(asset_links, local_paths, self.output_path)
+        replace_page_links(page_links, self.page_names)
+        file_path = Path(self.output_path) / self.page_names[page_url]
+        file_path.write_text(soup.prettify())
+        return str(file_path.resolve())
+
+
+def read_page(response) -> str:
+    """Return text of the html page in *response*.
+
+    A response without Content-Type is taken for html. The body of other
+    responses isn't read.
+    Raise NotHtmlPage if the page isn't html.
+    """
+    with response:
+        response.raise_for_status()
+        content_type = response.headers.get('Content-Type')
+        if not is_html(content_type):
+            raise NotHtmlPage(f'{content_type} is not html')
+        return response.text
+
+
+def is_html(content_type: str) -> bool:
+    """Return True if *content_type* is html or unknown.
+
+    >>> is_html('text/html; charset=utf-8')
+    True
+    >>> is_html('application/pdf')
+    False
+    """
+    if not content_type:
+        return True
+    return content_type.split(';')[0].strip().lower() in HTML_TYPES
@@ -0,0 +1,227 @@
+import re
+from collections import deque
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from page_loader.defaults import DEFAULT_CHUNK_SIZE
+from page_loader.storage import (
+    encode_stored,
+    read_stored,
+    write_chunks,
+    write_chunks_by_hash,
+)
+
+TOKEN_START_PATTERN = re.compile(r"""/\*|["']|url\(|@import""", re.I)
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<comment>/\*.*?\*/)
+    | "(?P<double_string>(?:[^"\\\n]|\\.)*)["\n]
+    | '(?P<single_string>(?:[^'\\\n]|\\.)*)['\n]
+    | url\(\s*(?:
+        "(?P<double_url>[^"\n]*)"
+        | '(?P<single_url>[^'\n]*)'
+        | (?P<bare_url>[^)"'\s]*)
+    )\s*\)
+    | (?P<bad_url>url\([^)]*\))
+    | (?P<import>@import)
+    """,
+    re.I | re.S | re.X,
+)
+URL_GROUPS = {  # noqa: WPS407
+    'double_url': True,
+    'single_url': True,
+    'bare_url': False,
+}
+STRING_GROUPS = ('double_string', 'single_string')
+KEYWORD_TAIL = len('@import') - 1
+CONTENT_ADDRESSED_PATTERN = re.compile('[0-9a-f]{64}[.]')
+
+
+class Reference(NamedTuple):
+    """Link of url() or @import and its position in the CSS text."""
+
+    start: int
+    end: int
+    quoted: bool
+    link: str
+
+
+class CssScanner(object):
+    """Streaming tokenizer finding links of url() and @import in CSS.
+
+    Text is fed in chunks of any size. Only comments, strings, url() and
+    @import are tokenized, the text between them is skipped by a regex
+    search, so scanning is linear and only an unfinished token is kept
+    between chunks. Positions are counted from the start of the text.
+    """
+
+    def __init__(self):
+        """Create scanner at the start of the text."""
+        self.references = []
+        self.buffer = ''
+        self.offset = 0
+        self.importing = False
+
+    def scan(self, chunks: Iterable[str]) -> list:
+        """Scan the whole text given in *chunks*. Return list of Reference."""
+        for chunk in chunks:
+            self.feed(chunk)
+        return self.close()
+
+    def feed(self, chunk: str) -> None:
+        """Scan the next *chunk* of the text."""
+        self.buffer += chunk
+        self.scan_buffer(final=False)
+
+    def close(self) -> list:
+        """Scan the rest of the text. Return list of Reference."""
+        self.scan_buffer(final=True)
+        return self.references
+
+    def scan_buffer(self, final: bool) -> None:
+        """Tokenize the buffer up to the first unfinished token."""
+        position = 0
+        while True:
+            token_start = TOKEN_START_PATTERN.search(self.buffer, position)
+            if token_start is None:
+                if not final:
+                    position = max(position, len(self.buffer) - KEYWORD_TAIL)
+                break
+            token = TOKEN_PATTERN.match(self.buffer, token_start.start())
+            if token is None and not final:
+                position = token_start.start()
+                break
+            position = token.end() if token else token_start.end()
+            if token:
+                self.handle_token(token)
+        self.offset += position
+        self.buffer = self.buffer[position:]
+
+    def handle_token(self, token) -> None:
+        """Record the link of a url() token or a string after @import."""
+        name = token.lastgroup
+        if name == 'comment':
+            return
+        importing, self.importing = self.importing, name == 'import'
+        if name in URL_GROUPS:
+            self.add_reference(token, name, URL_GROUPS[name])
+        elif importing and name in STRING_GROUPS:
+            self.add_reference(token, name, True)
+
+    def add_reference(self, token, name: str, quoted: bool) -> None:
+        """Record the link in group *name* of *token* if it isn't empty."""
+        if token.group(name).strip():
+            self.references.append(Reference(
+                self.offset + token.start(name),
+                self.offset + token.end(name),
+                quoted,
+                token.group(name).strip(),
+            ))
+
+
+def replace_css_links(css_text: str, new_links: dict) -> str:
+    """Replace links of url() and @import in *css_text*.
+
+    new_links - dict. Key is original link, value is the new one.
+    """
+    pieces = []
+    position = 0
+    for reference in CssScanner().scan([css_text]):
+        if reference.link in new_links:
+            pieces.append(css_text[position:reference.start])
+            pieces.append(new_links[reference.link])
+            position = reference.end
+    pieces.append(css_text[position:])
+    return ''.join(pieces)
+
+
+def scan_stylesheet(
+    file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> list:
+    """Return list of Reference of the stylesheet at *file_path*.
+
+    The file is read in chunks and decompressed if it is stored
+    compressed. Bytes are decoded as latin-1, so positions are byte
+    offsets, and links are then decoded as UTF-8.
+    """
+    return scan_css_chunks(read_stored(file_path, chunk_size))
+
+
+def scan_css_chunks(chunks: Iterable[bytes]) -> list:
+    """Return list of Reference of the stylesheet given in byte *chunks*.
+
+    See scan_stylesheet().
+    """
+    references = CssScanner().scan(chunk.decode('latin-1') for chunk in chunks)
+    return [
+        reference._replace(
+            link=reference.link.encode('latin-1').decode('utf-8', 'replace'),
+        )
+        for reference in references
+    ]
+
+
+def rewrite_stylesheet(
+    file_path: str, references: list, new_links: dict,
+) -> Path:
+    """Replace links of *references* found in *new_links* in the file.
+
+    The file is streamed through and replaced atomically, compressed the
+    same way as before. A file of the content-addressed store is saved
+    under the hash of its new content instead.
+    Return path of the rewritten file.
+    """
+    file_path = Path(file_path)
+    replacements = [
+        (reference.start, reference.end, new_links[reference.link].encode())
+        for reference in references if reference.link in new_links
+    ]
+    if not replacements:
+        return file_path
+    chunks = encode_stored(
+        splice_chunks(read_stored(file_path), replacements), file_path,
+    )
+    if CONTENT_ADDRESSED_PATTERN.match(file_path.name):
+        suffix = file_path.name[file_path.name.index('.'):]
+        return write_chunks_by_hash(chunks, file_path.parent, suffix)
+    write_chunks(chunks, file_path)
+    return file_path
+
+
+def splice_chunks(
+    chunks: Iterable[bytes], replacements: list,
+) -> Iterator[bytes]:
+    """Yield *chunks* with byte ranges replaced.
+
+    replacements - list of tuple (start, end, new bytes), in order.
+    """
+    reader = ChunkReader(chunks)
+    for start, end, new_bytes in replacements:
+        yield from reader.read_until(start)
+        deque(reader.read_until(end), maxlen=0)
+        yield new_bytes
+    yield from reader.read_until()
+
+
+class ChunkReader(object):
+    """Reader of a stream of chunks up to given offsets."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        """Start reading *chunks* at offset 0."""
+        self.chunks = iter(chunks)
+        self.buffer = b''
+        self.position = 0
+
+    def read_until(self, offset: int = None) -> Iterator[bytes]:
+        """Yield pieces of the stream up to *offset* or to its end."""
+        while offset is None or self.position < offset:
+            if not self.buffer:
+                self.buffer = next(self.chunks, b'')
+                if not self.buffer:
+                    return
+            size = len(self.buffer)
+            if offset is not None:
+                size = min(size, offset - self.position)
+            piece, self.buffer = self.buffer[:size], self.buffer[size:]
+            self.position += size
+            yield piece
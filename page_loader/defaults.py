@@ -0,0 +1,18 @@
+"""Default settings and choices shared by the library and the CLI.
+
+This module imports nothing, so the command line can be parsed before
+requests, bs4 and the rest of the package are loaded.
+"""
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 3
+DEFAULT_BURST = 1
+DEFAULT_CACHE_SIZE = 1024 ** 3
+DEFAULT_MAX_PAGES = 100
+FALLBACK_PARSER = 'html.parser'
+DEFAULT_PARSER = FALLBACK_PARSER
+PARSERS = ('auto', 'html.parser', 'lxml', 'html5lib')
+DEFAULT_REWRITE = 'prettify'
+REWRITES = ('prettify', 'splice')
+ASSET_CLASSES = ('image', 'style', 'script', 'font', 'video', 'audio', 'other')
+ARCHIVE_FORMATS = ('warc', 'mhtml', 'tar')
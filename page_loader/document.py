@@ -0,0 +1,131 @@
+import codecs
+from functools import partial
+from typing import Iterable
+
+from page_loader.assets import (
+    find_asset_links,
+    parse_html,
+    replace_asset_links,
+)
+from page_loader.defaults import DEFAULT_PARSER, DEFAULT_REWRITE
+from page_loader.splice import AssetScanner, splice_links
+
+DEFAULT_ENCODING = 'utf-8'
+
+
+class SoupDocument(object):
+    """Page parsed into a soup and saved with prettify()."""
+
+    def __init__(
+        self,
+        content: bytes,
+        encoding: str,
+        url: str,
+        parser: str = DEFAULT_PARSER,
+        asset_classes: Iterable[str] = None,
+    ):
+        """Parse page *content* downloaded from *url* with *parser*.
+
+        A page in an unknown *encoding* is decoded as UTF-8, replacing the
+        bytes that aren't UTF-8. Links of *asset_classes* are collected,
+        see find_asset_links().
+        """
+        self.soup = parse_html(
+            str(
+                content,
+                known_encoding(encoding) or DEFAULT_ENCODING,
+                errors='replace',
+            ),
+            parser,
+        )
+        self.asset_links = find_asset_links(self.soup, url, asset_classes)
+
+    def rewrite(self, local_paths: dict, base_dir: str) -> None:
+        """Point asset links to local files, see replace_asset_links()."""
+        replace_asset_links(self.asset_links, local_paths, base_dir)
+
+    def render(self) -> bytes:
+        """Return the page re-indented and encoded in UTF-8."""
+        return self.soup.prettify().encode(DEFAULT_ENCODING)
+
+
+class SourceDocument(object):
+    """Page saved byte for byte except for the replaced links.
+
+    Positions of asset links are recorded while scanning, so rewriting
+    costs time proportional to the number of links, and the original
+    encoding and whitespace are kept.
+    """
+
+    def __init__(
+        self,
+        content: bytes,
+        encoding: str,
+        url: str,
+        asset_classes: Iterable[str] = None,
+        asset_links: list = None,
+    ):
+        """Scan page *content* downloaded from *url* for *asset_classes*.
+
+        A page in an unknown *encoding* is read as UTF-8, the bytes that
+        aren't UTF-8 are still written back as they were.
+        asset_links - links of an earlier scan of the same content, the
+            page isn't scanned again if they are given.
+        """
+        self.encoding = known_encoding(encoding) or DEFAULT_ENCODING
+        self.source = content.decode(self.encoding, 'surrogateescape')
+        if asset_links is None:
+            asset_links = AssetScanner(url, asset_classes).scan(self.source)
+        self.asset_links = asset_links
+
+    def rewrite(self, local_paths: dict, base_dir: str) -> None:
+        """Point asset links to local files, see splice_links()."""
+        self.source = splice_links(
+            self.source, self.asset_links, local_paths, base_dir,
+        )
+        self.asset_links = []
+
+    def render(self) -> bytes:
+        """Return the page in its original encoding."""
+        return self.source.encode(self.encoding, 'surrogateescape')
+
+
+def known_encoding(encoding: str):
+    """Return *encoding* if it has a codec, otherwise None.
+
+    >>> known_encoding('windows-1251')
+    'windows-1251'
+
+    >>> known_encoding('x-unknown') is None
+    True
+    """
+    if not encoding:
+        return None
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return None
+    return encoding
+
+
+DOCUMENTS = {  # noqa: WPS407
+    'prettify': SoupDocument,
+    'splice': SourceDocument,
+}
+
+
+def document_factory(
+    rewrite: str = DEFAULT_REWRITE,
+    parser: str = DEFAULT_PARSER,
+    asset_classes: Iterable[str] = None,
+):
+    """Return callable (content, encoding, url) creating page documents.
+
+    *parser* is the soup backend, the splice mode uses its own scanner.
+    Documents collect links of *asset_classes*, all of them by default.
+    """
+    if DOCUMENTS[rewrite] is SoupDocument:
+        return partial(
+            SoupDocument, parser=parser, asset_classes=asset_classes,
+        )
+    return partial(DOCUMENTS[rewrite], asset_classes=asset_classes)
@@ -0,0 +1,224 @@
+import re
+from typing import Callable, Iterable, NamedTuple, Union
+
+from page_loader.css import CssScanner
+from page_loader.defaults import ASSET_CLASSES  # noqa: F401
+
+TEXT = '#text'
+ANY_TAG = '*'
+CONTAINERS = ('picture', 'video', 'audio')
+PRELOAD_CLASSES = {  # noqa: WPS407
+    'image': 'image',
+    'style': 'style',
+    'script': 'script',
+    'font': 'font',
+    'video': 'video',
+    'audio': 'audio',
+}
+SRCSET_URL_PATTERN = re.compile(r'[\s,]*(\S+)')
+SRCSET_DESCRIPTORS_PATTERN = re.compile(r'(?:[^,(]|\([^)]*\)?)*,?')
+CSS_LINK_PATTERN = re.compile('url\\(|@import', re.I)
+
+
+def whole_value(value: str) -> list:
+    """Return span of the link that is the whole *value*."""
+    return [(0, len(value))] if value else []
+
+
+def srcset_links(value: str) -> list:
+    """Return spans of the image urls of a srcset *value*.
+
+    Candidates are split the way browsers do it: a url is a run of
+    non-space characters, commas inside it are kept unless they end it,
+    and descriptors run up to the next comma outside parentheses.
+
+    >>> value = 'a.png 1x, b,c.png 2x,d.png'
+    >>> [value[start:end] for start, end in srcset_links(value)]
+    ['a.png', 'b,c.png', 'd.png']
+    """
+    spans = []
+    position = 0
+    while True:
+        url = SRCSET_URL_PATTERN.match(value, position)
+        if url is None:
+            return spans
+        start, position = url.span(1)
+        link = url.group(1).rstrip(',')
+        if link:
+            spans.append((start, start + len(link)))
+        if link == url.group(1):
+            position = SRCSET_DESCRIPTORS_PATTERN.match(value, position).end()
+
+
+def css_links(value: str) -> list:
+    """Return spans of the links of url() and @import in CSS *value*."""
+    if not CSS_LINK_PATTERN.search(value):
+        return []
+    return [
+        (reference.start, reference.end)
+        for reference in CssScanner().scan([value])
+    ]
+
+
+def link_class(attributes: dict, container: str) -> str:
+    """Return asset class of <link> by its rel and as attributes."""
+    rel = (attributes.get('rel') or '').lower().split()
+    if 'stylesheet' in rel:
+        return 'style'
+    if 'modulepreload' in rel:
+        return 'script'
+    if 'preload' in rel:
+        return PRELOAD_CLASSES.get(attributes.get('as'), 'other')
+    if any(name.endswith('icon') for name in rel):
+        return 'image'
+    return 'other'
+
+
+def source_class(attributes: dict, container: str) -> str:
+    """Return asset class of <source src> by its parent element."""
+    return container if container in {'video', 'audio'} else 'image'
+
+
+class Extractor(NamedTuple):
+    """Declaration of asset links in an attribute of a tag.
+
+    tag - tag name, ANY_TAG for every tag.
+    attribute - attribute name, TEXT for the text of raw text elements
+        such as <style>.
+    asset_class - name of the class, or function (attributes, container)
+        returning it, where container is the name of the enclosing
+        picture, video or audio element.
+    parse - function returning list of (start, end) spans of the links
+        in the attribute value.
+    """
+
+    tag: str
+    attribute: str
+    asset_class: Union[str, Callable]
+    parse: Callable = whole_value
+
+    def classify(self, attributes: dict, container: str = None) -> str:
+        """Return asset class of the links of a tag with *attributes*."""
+        if callable(self.asset_class):
+            return self.asset_class(attributes, container)
+        return self.asset_class
+
+
+EXTRACTORS = [
+    Extractor('img', 'src', 'image'),
+    Extractor('img', 'srcset', 'image', srcset_links),
+    Extractor('source', 'src', source_class),
+    Extractor('source', 'srcset', 'image', srcset_links),
+    Extractor('video', 'src', 'video'),
+    Extractor('video', 'poster', 'image'),
+    Extractor('audio', 'src', 'audio'),
+    Extractor('link', 'href', link_class),
+    Extractor('link', 'imagesrcset', 'image', srcset_links),
+    Extractor('script', 'src', 'script'),
+    Extractor('style', TEXT, 'style', css_links),
+    Extractor(ANY_TAG, 'style', 'style', css_links),
+]
+
+
+def register_extractor(extractor: Extractor) -> None:
+    """Add *extractor* to the extractors used by default."""
+    EXTRACTORS.append(extractor)
+
+
+class AssetSelector(object):
+    """Extractors of the chosen asset classes indexed by tag name.
+
+    Both the soup walk and the splice scanner ask the selector which
+    attributes of a tag hold links, so every page is parsed once whatever
+    the number of extractors.
+    """
+
+    def __init__(
+        self, asset_classes: Iterable[str] = None, extractors=None,
+    ):
+        """Select *extractors* of *asset_classes*, all of them by default.
+
+        extractors - list of Extractor, EXTRACTORS by default.
+        """
+        self.asset_classes = None
+        if asset_classes is not None:
+            self.asset_classes = frozenset(asset_classes)
+        self.any_tag = []
+        self.by_tag = {}
+        if extractors is None:
+            extractors = EXTRACTORS
+        for extractor in extractors:
+            if callable(extractor.asset_class) or self.accepts(
+                extractor.asset_class,
+            ):
+                self.add(extractor)
+
+    def add(self, extractor: Extractor) -> None:
+        """Index *extractor* by its tag."""
+        if extractor.tag == ANY_TAG:
+            self.any_tag.append(extractor)
+            for tag_extractors in self.by_tag.values():
+                tag_extractors.append(extractor)
+        else:
+            self.by_tag.setdefault(
+                extractor.tag, list(self.any_tag),
+            ).append(extractor)
+
+    def accepts(self, asset_class: str) -> bool:
+        """Return True if files of *asset_class* are downloaded."""
+        return self.asset_classes is None or asset_class in self.asset_classes
+
+    def has_links(self, tag: str, attributes: dict) -> bool:
+        """Return True if *tag* may have links, without classifying them."""
+        return tag in self.by_tag or any(
+            extractor.attribute in attributes for extractor in self.any_tag
+        )
+
+    def select(
+        self, tag: str, attributes: dict, container: str = None,
+    ) -> list:
+        """Return extractors of links *tag* with *attributes* has.
+
+        Extractors of attributes the tag doesn't have are left out.
+        TEXT extractors are always returned for their tags.
+        """
+        return [
+            extractor
+            for extractor in self.by_tag.get(tag, self.any_tag)
+            if (
+                extractor.attribute == TEXT
+                or attributes.get(extractor.attribute)
+            ) and self.accepts(extractor.classify(attributes, container))
+        ]
+
+
+def replace_links(value: str, parse: Callable, new_links: dict) -> str:
+    """Replace links of *value* found by *parse* with *new_links*.
+
+    new_links - dict. Key is original link, value is the new one.
+    """
+    pieces = []
+    position = 0
+    for start, end in parse(value):
+        if value[start:end] in new_links:
+            pieces.append(value[position:start])
+            pieces.append(new_links[value[start:end]])
+            position = end
+    pieces.append(value[position:])
+    return ''.join(pieces)
+
+
+def find_extractor(tag: str, attribute: str, extractors=None) -> Extractor:
+    """Return extractor of *attribute* of *tag*.
+
+    A tag specific extractor takes precedence over an ANY_TAG one.
+    """
+    if extractors is None:
+        extractors = EXTRACTORS
+    candidates = [
+        extractor for extractor in extractors
+        if extractor.attribute == attribute
+        and extractor.tag in {tag, ANY_TAG}
+    ]
+    candidates.sort(key=lambda extractor: extractor.tag == ANY_TAG)
+    return candidates[0] if candidates else Extractor(tag, attribute, 'other')
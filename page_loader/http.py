@@ -0,0 +1,116 @@
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+from page_loader.defaults import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_RETRIES,
+)
+from page_loader.storage import ENCODING_SUFFIXES, is_text_file
+from page_loader.url import url_to_name
+
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_STATUSES = (500, 502, 504)
+STORED_ENCODINGS = ', '.join(
+    encoding for encoding in ENCODING_SUFFIXES
+    if encoding in ACCEPT_ENCODING
+)
+
+
+class FileStream(NamedTuple):
+    """Body of a downloaded file."""
+
+    url: str
+    chunks: Iterator[bytes]
+    retries: int = 0
+    cached: bool = None
+    encoding: str = None
+    content_type: str = None
+
+
+def create_session(
+    pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES,
+) -> requests.Session:
+    """Create a session that keeps up to *pool_size* connections per host.
+
+    Connections are reused between requests to the same host. Failed
+    connections and 5xx responses are retried up to *retries* times.
+    Retry-After isn't honoured here: 429 and 503 responses are left to
+    politeness.HostLimiter, which pauses the whole host.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+@contextmanager
+def session_scope(
+    client=None,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    retries: int = DEFAULT_RETRIES,
+):
+    """Provide *client*, or a new session closed on exit if it is None."""
+    if client is not None:
+        yield client
+        return
+    with create_session(pool_size, retries) as session:
+        yield session
+
+
+@contextmanager
+def open_stream(
+    url: str,
+    client=requests,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    compressed: bool = False,
+):
+    """Request *url* and provide FileStream of the response body.
+
+    If *compressed* is True, gzip (and brotli if it is installed) is
+    negotiated and a compressed body of a text file is provided as it came
+    off the wire, with its content encoding set in the FileStream.
+    """
+    headers = {'Accept-Encoding': STORED_ENCODINGS} if compressed else {}
+    with client.get(url, stream=True, headers=headers) as response:
+        response.raise_for_status()
+        encoding = response.headers.get('Content-Encoding', '').lower()
+        if compressed and keeps_encoding(response.url, encoding):
+            chunks = response.raw.stream(chunk_size, decode_content=False)
+        else:
+            chunks, encoding = response.iter_content(chunk_size), None
+        yield FileStream(
+            response.url,
+            chunks,
+            retries_count(response),
+            encoding=encoding,
+            content_type=response.headers.get('Content-Type'),
+        )
+
+
+def keeps_encoding(url: str, encoding: str) -> bool:
+    """Return True if the body of *url* is stored in its *encoding*."""
+    return encoding in ENCODING_SUFFIXES and is_text_file(url_to_name(url))
+
+
+def retries_count(response) -> int:
+    """Return number of retries made to get *response*."""
+    retry = getattr(response.raw, 'retries', None)
+    return len(getattr(retry, 'history', ()))
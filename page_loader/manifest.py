@@ -0,0 +1,244 @@
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import requests
+
+from page_loader.http import DEFAULT_CHUNK_SIZE, FileStream, retries_count
+from page_loader.storage import file_digest, write_chunks
+from page_loader.url import url_to_name
+
+MANIFEST_SUFFIX = '_manifest.jsonl'
+PARTIAL_CONTENT = 206
+RANGE_NOT_SATISFIABLE = 416
+COMPLETE = 'complete'
+PARTIAL = 'partial'
+FAILED = 'failed'
+PART_SUFFIX = '.part'
+IDENTITY = {'Accept-Encoding': 'identity'}  # noqa: WPS407
+CONTENT_RANGE_PATTERN = re.compile(r'bytes\s+(\d+)-')
+WEAK_ETAG_PREFIX = 'W/'
+
+
+class Manifest(object):
+    """Record of the files of a page: url, local path, size, hash, status.
+
+    The manifest is a journal of JSON lines, the first one with the page
+    url and then one per change, appended as it happens. Recording a file
+    costs the same however many files the page has, and the journal
+    survives interrupted runs. When a manifest is opened, the entries of
+    the previous run are loaded, the last line of every url wins, and
+    they are written back compacted, so files that are complete and
+    verified aren't downloaded again.
+    """
+
+    def __init__(self, path: str, url: str):
+        """Open manifest at *path* of the page downloaded from *url*."""
+        self.path = Path(path)
+        self.url = url
+        self.entries = read_journal(self.path) if self.path.exists() else {}
+        self._lock = threading.Lock()
+        write_chunks(
+            (
+                journal_line(entry)
+                for entry in ({'url': url}, *self.entries.values())
+            ),
+            self.path,
+        )
+
+    def verified_path(self, url: str):
+        """Return path of the complete file of *url* if it is intact.
+
+        Return None if the file is missing, incomplete or changed on disk.
+        """
+        entry = self.entries.get(url)
+        if not entry or entry['status'] != COMPLETE:
+            return None
+        file_path = self.path.parent / entry['path']
+        is_intact = (
+            file_path.exists()
+            and file_path.stat().st_size == entry['size']
+            and file_digest(file_path) == entry['sha256']
+        )
+        return str(file_path.resolve()) if is_intact else None
+
+    def validator(self, url: str):
+        """Return ETag or Last-Modified of the partial file of *url*."""
+        return self.entries.get(url, {}).get('validator')
+
+    def record(  # noqa: WPS211
+        self,
+        url: str,
+        status: str,
+        file_path: Path = None,
+        sha256: str = None,
+        validator: str = None,
+    ) -> None:
+        """Append the state of the file of *url* to the journal.
+
+        validator - ETag or Last-Modified of a partial file, see
+            open_resumable_stream().
+        """
+        entry = {'url': url, 'status': status}
+        if file_path is not None:
+            entry['path'] = Path(
+                os.path.relpath(file_path, self.path.parent),
+            ).as_posix()
+            entry['size'] = Path(file_path).stat().st_size
+            entry['sha256'] = sha256
+        if validator is not None:
+            entry['validator'] = validator
+        with self._lock:
+            self.entries[url] = entry
+            with open(self.path, 'ab') as journal:
+                journal.write(journal_line(entry))
+
+    @contextmanager
+    def recording(self, url: str, file_part: Path = None):
+        """Record the outcome of downloading *url* in the block.
+
+        The block fills the provided dict with file_path and sha256. If it
+        fails leaving *file_part*, the file is recorded as partial.
+        """
+        outcome = {}
+        try:
+            yield outcome
+        except BaseException:
+            if file_part is not None and file_part.exists():
+                self.record(
+                    url, PARTIAL, file_part, validator=self.validator(url),
+                )
+            else:
+                self.record(url, FAILED)
+            raise
+        self.record(url, COMPLETE, outcome['file_path'], outcome['sha256'])
+
+
+def read_journal(path: Path) -> dict:
+    """Return entries of the manifest journal at *path* keyed by url.
+
+    A line cut short by an interrupted run is skipped.
+    """
+    entries = {}
+    with open(path, 'rb') as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if 'status' in entry:
+                entries[entry['url']] = entry
+    return entries
+
+
+def journal_line(entry: dict) -> bytes:
+    """Return *entry* as a line of the manifest journal."""
+    return f'{json.dumps(entry)}\n'.encode()
+
+
+def manifest_path(url: str, output_path: str) -> Path:
+    """Return path of the manifest of the page from *url*."""
+    return Path(output_path) / url_to_name(url, MANIFEST_SUFFIX)
+
+
+def part_path(url: str, output_path: str) -> Path:
+    """Return path of the partial file of *url* downloaded to *output_path*.
+
+    The name doesn't change between runs, so a later run finds the part.
+    """
+    return Path(output_path) / f'{url_to_name(url)}{PART_SUFFIX}'
+
+
+@contextmanager
+def open_resumable_stream(
+    url: str,
+    client=requests,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    manifest: Manifest = None,
+    output_path: str = '.',
+):
+    """Provide FileStream of *url* continuing the part of an earlier run.
+
+    The body is appended to the part file in *output_path* while it is
+    read, so an interrupted download can be continued. A part is continued
+    with a Range request only if *manifest* has its ETag or Last-Modified,
+    which is sent in If-Range, and the server answers with the matching
+    Content-Range; otherwise the file is downloaded from the start. The
+    chunks give the whole file, the part first. The part is removed once
+    the block has finished.
+    """
+    file_part = part_path(url, output_path)
+    response, offset = request_part(
+        url, client, file_part, manifest.validator(url),
+    )
+    with response:
+        response.raise_for_status()
+        manifest.record(url, PARTIAL, validator=response_validator(response))
+        yield FileStream(
+            response.url,
+            part_chunks(response, file_part, offset, chunk_size),
+            retries_count(response),
+            content_type=response.headers.get('Content-Type'),
+        )
+    if file_part.exists():
+        file_part.unlink()
+
+
+def request_part(url: str, client, file_part: Path, validator) -> tuple:
+    """Request *url*, continuing *file_part* if *validator* still holds.
+
+    Return tuple (streamed response, offset of its body in the file).
+    """
+    offset = file_part.stat().st_size if (
+        validator and file_part.exists()
+    ) else 0
+    if offset:
+        response = client.get(url, stream=True, headers={
+            **IDENTITY, 'Range': f'bytes={offset}-', 'If-Range': validator,
+        })
+        if response.status_code != PARTIAL_CONTENT:
+            if response.status_code != RANGE_NOT_SATISFIABLE:
+                return response, 0
+        elif content_range_start(response) == offset:
+            return response, offset
+        response.close()
+    return client.get(url, stream=True, headers=IDENTITY), 0
+
+
+def part_chunks(
+    response, file_part: Path, offset: int, chunk_size: int,
+) -> Iterator[bytes]:
+    """Yield the first *offset* bytes of *file_part*, then the body.
+
+    The body of *response* is appended to the part as it is read.
+    """
+    if offset:
+        with open(file_part, 'rb') as part_file:
+            yield from iter(lambda: part_file.read(chunk_size), b'')
+    with open(file_part, 'ab' if offset else 'wb') as part_file:
+        for chunk in response.iter_content(chunk_size):
+            part_file.write(chunk)
+            yield chunk
+
+
+def content_range_start(response):
+    """Return the first byte of the Content-Range of *response*.
+
+    Return None if the header is missing or malformed.
+    """
+    match = CONTENT_RANGE_PATTERN.match(
+        response.headers.get('Content-Range', ''),
+    )
+    return int(match.group(1)) if match else None
+
+
+def response_validator(response):
+    """Return strong ETag or Last-Modified of *response* for If-Range."""
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith(WEAK_ETAG_PREFIX):
+        return etag
+    return response.headers.get('Last-Modified')
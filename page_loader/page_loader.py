@@ -1,104 +1,843 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
+from typing import Iterable
 
-import bs4
 import requests
+from requests.compat import chardet
 
-from page_loader.url import (
-    is_same_domain_or_subdomain,
-    relative_url_to_absolute,
-    url_to_name,
+from page_loader.assets import DEFAULT_PARSER, local_link
+from page_loader.budget import (
+    Budget,
+    BudgetClient,
+    BudgetExceeded,
+    PageBudget,
 )
+from page_loader.cache import DEFAULT_CACHE_SIZE, HttpCache
+from page_loader.css import rewrite_stylesheet, scan_stylesheet
+from page_loader.document import (
+    DEFAULT_ENCODING,
+    DEFAULT_REWRITE,
+    SourceDocument,
+    document_factory,
+    known_encoding,
+)
+from page_loader.http import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_RETRIES,
+    open_stream,
+)
+from page_loader.manifest import (
+    Manifest,
+    manifest_path,
+    open_resumable_stream,
+    part_path,
+)
+from page_loader.politeness import polite_session_scope
+from page_loader.pool import PooledDocument
+from page_loader.stats import NULL_STATS
+from page_loader.storage import (
+    ENCODING_SUFFIXES,
+    gzip_chunks,
+    is_text_file,
+    write_chunks,
+    write_chunks_by_hash,
+)
+from page_loader.streaming import PageStream, prefetch_links
+from page_loader.url import url_resolver, url_to_name
+
+PAGE_CHUNK_SIZE = 16 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PageResult(object):
+    """Result of downloading one page."""
+
+    url: str
+    path: str = None
+    file_paths: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    skipped: dict = field(default_factory=dict)
+    bytes_downloaded: int = 0
+    seconds: float = 0
+    stats: dict = None
+
+    def to_dict(self) -> dict:
+        """Return JSON serializable representation of the result."""
+        page_result = {
+            'url': self.url,
+            'path': self.path,
+            'assets': len(self.file_paths),
+            'bytes': self.bytes_downloaded,
+            'seconds': round(self.seconds, 6),
+            'errors': {
+                link: str(error) for link, error in self.errors.items()
+            },
+            'skipped': {
+                link: str(reason) for link, reason in self.skipped.items()
+            },
+        }
+        if self.stats is not None:
+            page_result['stats'] = self.stats
+        return page_result
+
+
+def download(  # noqa: WPS211
+    url: str,
+    output_path: str,
+    client=None,
+    workers: int = 1,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    retries: int = DEFAULT_RETRIES,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    store_dir: str = None,
+    cache_dir: str = None,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    stats=None,
+    rewrite: str = DEFAULT_REWRITE,
+    parser: str = DEFAULT_PARSER,
+    resume: bool = False,
+    limiter=None,
+    compress: bool = False,
+    asset_classes: Iterable[str] = None,
+    budget: Budget = None,
+    low_memory: bool = False,
+    prefetch: bool = False,
+) -> str:
+    """Download data from *url* and save to *output_path*.
+
+    The page is parsed once: asset links are collected in a single walk
+    and the same tags are rewritten after the files have been downloaded.
+    Links spelled differently but pointing to the same url are downloaded
+    once. Up to *workers* files are downloaded at the same time. Files that
+    failed to download keep their original links.
+
+    The page and all its files are fetched through *client*. If it is not
+    given, a session with a pool of *pool_size* connections per host and
+    *retries* retries is created for this call and closed afterwards.
+    Requests are sent within the per-host limits of *limiter*, see
+    page_loader.politeness.HostLimiter. Its report() gives the throughput
+    of every host. If *compress* is True, text files are stored gzip or
+    brotli compressed, see download_file(), and the page links to them by
+    their name without the .gz or .br suffix, the way servers with static
+    compression serve them.
+    Files are streamed to disk in chunks of *chunk_size* bytes.
+
+    If *store_dir* is given, files are saved there under the hash of their
+    content instead of the page's *_files* directory, so identical files
+    are kept once across pages.
+
+    If *cache_dir* is given, downloaded files are cached there and reused
+    by later calls while fresh or not modified on the server. The cache
+    keeps at most *cache_size* bytes.
+
+    If *stats* is given, time of every phase and numbers of every file are
+    recorded to it, see page_loader.stats.Stats.
+
+    *rewrite* is the way the page is saved: 'prettify' re-indents the whole
+    document, 'splice' keeps the original bytes and only replaces links.
+    *parser* is the html parser backend used by 'prettify': 'html.parser',
+    'lxml', 'html5lib' or 'auto' for the fastest installed one. Parsers
+    that are not installed fall back to 'html.parser'.
+
+    If *resume* is True, url, path, size, hash and status of every file
+    are written to the page's *_manifest.jsonl* as they are downloaded.
+    Files that the manifest of a previous run lists as complete and that
+    are intact on disk are not downloaded again, and partial files are
+    continued. Only runs with *resume* keep partial files, a run without
+    it writes files through temporary names that are removed when it is
+    interrupted.
+
+    If *prefetch* is True, the page is scanned as it arrives and its files
+    start downloading at once, while the rest of the page is fetched and
+    parsed. It pays off when the page is slow to arrive, otherwise the
+    extra scan costs more than it saves. With 'splice' the links found
+    while the page arrives are reused, so the page is scanned once.
+
+    Links are found by the extractors of page_loader.extractors. Only
+    files of *asset_classes*, such as 'image' or 'video', are downloaded,
+    all of them by default. Files referred to by downloaded stylesheets
+    are downloaded with them.
+
+    Files are downloaded within the timeouts, sizes, deadline and MIME
+    types of *budget*, see page_loader.budget.Budget. Files over budget
+    keep their original links.
+
+    If *low_memory* is True, the page is streamed instead of being read
+    whole: downloads start as links arrive and the page is written as it
+    is scanned, see stream_page(). The page is kept byte for byte except
+    for the links, as with 'splice', and *rewrite* and *parser* are not
+    used.
+    """
+    pool_size = max(pool_size, workers)
+    cache = HttpCache(cache_dir, cache_size) if cache_dir else None
+    with polite_session_scope(
+        client, pool_size, retries, limiter,
+    ) as session:
+        fetch_file = file_fetcher(
+            session, chunk_size, store_dir, cache, compress,
+        )
+        options = {
+            'workers': workers,
+            'files_dir': store_dir,
+            'stats': stats or NULL_STATS,
+            'resume': resume,
+            'asset_classes': asset_classes,
+            'budget': budget,
+        }
+        if low_memory:
+            page_result = stream_page(
+                url, output_path, session, fetch_file, chunk_size, **options,
+            )
+        else:
+            page_result = download_page(
+                url,
+                output_path,
+                session,
+                fetch_file,
+                rewrite=rewrite,
+                parser=parser,
+                prefetch=prefetch,
+                **options,
+            )
+    return page_result.path
+
 
+def download_page(  # noqa: WPS211
+    url: str,
+    output_path: str,
+    client,
+    fetch_file,
+    workers: int = 1,
+    files_dir: str = None,
+    stats=NULL_STATS,
+    rewrite: str = DEFAULT_REWRITE,
+    parser: str = DEFAULT_PARSER,
+    resume: bool = False,
+    asset_classes: Iterable[str] = None,
+    budget: Budget = None,
+    prefetch: bool = False,
+    document_pool=None,
+) -> PageResult:
+    """Download page from *url* with its files and save to *output_path*.
 
-def download(url: str, output_path: str, client=requests) -> str:
-    """Download data from *url* and save to *output_path*."""
-    response = client.get(url)
+    client - requests module or session used to download the page.
+    fetch_file - function (file_url, files_dir) that downloads one file.
+    files_dir - the directory where the files are stored, the page's
+        *_files* directory by default.
+    stats - Stats to record the download to.
+    rewrite - the way the page is saved, a key of DOCUMENTS.
+    parser - html parser backend.
+    resume - continue the download recorded in the page's manifest.
+    asset_classes - names of the asset classes to download.
+    budget - Budget of the page. Files over it are listed in the skipped
+        dict of the result with the reason instead of the errors.
+    prefetch - start downloading files while the page is still arriving,
+        see fetch_page(). Parsing and the downloads then overlap.
+        SourceDocument reuses the links found, other documents scan the
+        page again.
+    document_pool - process pool in which the page is parsed and rendered,
+        see pool.PooledDocument. Network I/O stays in threads.
+    Return PageResult.
+    """
+    start = time.perf_counter()
+    page_result = PageResult(url)
     file_path = Path(output_path) / url_to_name(url)
-    files_dir = str(Path(output_path) / url_to_name(url, '_files'))
-    link_tags = (('img', 'src'), ('link', 'href'), ('script', 'src'))
-    new_links = []
-    for tag_name, link_attribute_name in link_tags:
-        local_links = download_additional_files(
-            url, files_dir, response.text, tag_name, link_attribute_name,
+    files_dir = files_dir or str(
+        Path(output_path) / url_to_name(url, '_files'),
+    )
+    fetch_file, page_budget = page_fetcher(
+        fetch_file, url, output_path, stats, resume, budget,
+    )
+    document_class = document_factory(rewrite, parser, asset_classes)
+    if document_pool is not None:
+        document_class = partial(
+            PooledDocument, document_pool, document_class,
         )
-        new_links.append((tag_name, link_attribute_name, local_links))
-    file_path.write_text(replace_links(response.text, new_links, files_dir))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        queue = DownloadQueue(executor, files_dir, fetch_file)
+        submit = partial(submit_link, queue, url_resolver(url))
+        with stats.phase('fetch_page'):
+            content, encoding, asset_links = fetch_page(
+                url,
+                client,
+                submit if prefetch else None,
+                asset_classes,
+                **page_options(page_budget),
+            )
+        with stats.phase('parse'):
+            document = create_document(
+                document_class, content, encoding, url, asset_links,
+            )
+        with stats.phase('download_files'):
+            page_result.file_paths, page_result.errors = collect_results({
+                link: submit(link) for _, _, link in document.asset_links
+            })
+    with stats.phase('rewrite'):
+        document.rewrite(page_result.file_paths, output_path)
+    with stats.phase('serialize'):
+        html = document.render()
+    with stats.phase('write'):
+        file_path.write_bytes(html)
+    return finish_result(page_result, file_path, len(content), start, stats)
 
-    return str(file_path.resolve())
 
+def fetch_page(
+    url: str,
+    client,
+    submit=None,
+    asset_classes: Iterable[str] = None,
+    **options,
+) -> tuple:
+    """Download page from *url* with *client*.
 
-def replace_links(html: str, new_links: list, files_dir: str) -> str:
+    If *submit* is given, the page is streamed and submit(link) is called
+    for links of *asset_classes* as soon as they arrive, see
+    streaming.prefetch_links().
+    options - keyword arguments of the request.
+    Return tuple (content, encoding, asset links). Encoding is None if it
+    is unknown. Asset links are the ones found while the page arrived, as
+    SourceDocument takes them, or None if the page wasn't scanned in the
+    encoding it is read with.
     """
-    Replace file links in *html* from *new_links*.
+    if submit is None:
+        response = client.get(url, **options)
+        response.raise_for_status()
+        return response.content, response_encoding(response), None
+    asset_links = []
+    with client.get(url, stream=True, **options) as response:
+        response.raise_for_status()
+        content = b''.join(prefetch_links(
+            url,
+            response.iter_content(PAGE_CHUNK_SIZE),
+            response.encoding,
+            submit,
+            asset_classes,
+            asset_links,
+        ))
+    encoding = known_encoding(response.encoding)
+    if encoding is None:
+        return content, detect_encoding(content), None
+    return content, encoding, asset_links
 
-    html - html text.
-    new_links - list of tuple (tag_name, link_attribute_name, new_links).
-    files_dir - the directory where the files are stored.
-    Return new html text.
+
+def create_document(  # noqa: WPS211
+    document_class,
+    content: bytes,
+    encoding: str,
+    url: str,
+    asset_links: list = None,
+):
+    """Return document_class(content, encoding, url).
+
+    SourceDocument gets *asset_links* found while the page arrived, so it
+    doesn't scan the page again. Other documents find links themselves.
+    """
+    is_source = getattr(document_class, 'func', document_class) is (
+        SourceDocument
+    )
+    if asset_links is not None and is_source:
+        return document_class(content, encoding, url, asset_links=asset_links)
+    return document_class(content, encoding, url)
+
+
+def response_encoding(response):
+    """Return encoding of *response*, guessed if its charset is unknown."""
+    return known_encoding(response.encoding) or response.apparent_encoding
+
+
+def detect_encoding(content: bytes):
+    """Return encoding of *content* guessed as Response.apparent_encoding."""
+    if chardet is None:
+        return None
+    return chardet.detect(content)['encoding']
+
+
+def stream_page(  # noqa: WPS211
+    url: str,
+    output_path: str,
+    client,
+    fetch_file,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    files_dir: str = None,
+    stats=NULL_STATS,
+    resume: bool = False,
+    asset_classes: Iterable[str] = None,
+    budget: Budget = None,
+) -> PageResult:
+    """Download page from *url* in chunks, writing it as it arrives.
+
+    The page is never held whole: every chunk of *chunk_size* bytes is
+    scanned, downloads of its links are submitted at once, and the page
+    is written up to the first link whose file isn't downloaded yet, see
+    streaming.PageStream. Other arguments are the same as in
+    download_page().
+    Return PageResult.
+    """
+    start = time.perf_counter()
+    page_result = PageResult(url)
+    file_path = Path(output_path) / url_to_name(url)
+    files_dir = files_dir or str(
+        Path(output_path) / url_to_name(url, '_files'),
+    )
+    fetch_file, page_budget = page_fetcher(
+        fetch_file, url, output_path, stats, resume, budget,
+    )
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        queue = DownloadQueue(executor, files_dir, fetch_file)
+        with stats.phase('stream'):
+            page = write_page_stream(
+                url,
+                client.get(url, stream=True, **page_options(page_budget)),
+                file_path,
+                partial(submit_link, queue, url_resolver(url)),
+                chunk_size,
+                asset_classes,
+            )
+    page_result.file_paths, page_result.errors = page.file_paths, page.errors
+    return finish_result(page_result, file_path, page.size, start, stats)
+
+
+def finish_result(  # noqa: WPS211
+    page_result: PageResult,
+    file_path: Path,
+    page_size: int,
+    start: float,
+    stats=NULL_STATS,
+) -> PageResult:
+    """Complete *page_result* of the page saved to *file_path*.
+
+    Files skipped over the budget are moved out of the errors, and both
+    are logged.
+    page_size - bytes of the page itself.
+    start - time.perf_counter() when the page download started.
+    Return *page_result*.
+    """
+    page_result.skipped = pop_skipped(page_result.errors)
+    for link, reason in page_result.skipped.items():
+        logger.info('Skipped %s: %s', link, reason)
+    for link, error in page_result.errors.items():
+        logger.warning('Failed to download %s: %s', link, error)
+    page_result.path = str(file_path.resolve())
+    page_result.bytes_downloaded = page_size + sum(
+        os.path.getsize(path) for path in set(page_result.file_paths.values())
+    )
+    page_result.seconds = time.perf_counter() - start
+    if stats is not NULL_STATS:
+        page_result.stats = stats.report()
+    return page_result
+
+
+def write_page_stream(  # noqa: WPS211
+    url: str,
+    response,
+    file_path: Path,
+    submit,
+    chunk_size: int,
+    asset_classes: Iterable[str] = None,
+) -> PageStream:
+    """Write streamed *response* of the page from *url* to *file_path*.
+
+    submit - function (link) returning future of the download of its file.
+    The host slot of *response* is released once its headers arrive, as
+    the page waits for files from the same host while it is still open.
+    Return the finished PageStream.
     """
-    soup = bs4.BeautifulSoup(html, features='html.parser')
-    for tag_name, link_attribute_name, links in new_links:
-        tags = soup.find_all(tag_name)
-        for tag in tags:
-            link = tag.get(link_attribute_name)
-            if link not in links:
-                continue
-            new_path = links[link]
-            relative_path = Path(new_path).relative_to(Path(files_dir).parent)
-            tag[link_attribute_name] = relative_path
+    with response:
+        response.raise_for_status()
+        release_slot = getattr(response, 'release_slot', None)
+        if release_slot is not None:
+            release_slot()
+        with open(file_path, 'wb') as page_file:
+            page = PageStream(
+                page_file,
+                url,
+                response.encoding or DEFAULT_ENCODING,
+                submit,
+                collect_results,
+                file_path.parent,
+                asset_classes,
+            )
+            for chunk in response.iter_content(chunk_size):
+                page.feed(chunk)
+            page.close()
+    return page
+
+
+def submit_link(queue, resolver, link: str) -> Future:
+    """Submit download of the file of *link* to DownloadQueue *queue*."""
+    Path(queue.files_dir).mkdir(parents=True, exist_ok=True)
+    return queue.submit_file(resolver.canonical(link))
 
-    return soup.prettify()
 
+def page_fetcher(  # noqa: WPS211
+    fetch_file,
+    url: str,
+    output_path: str,
+    stats=NULL_STATS,
+    resume: bool = False,
+    budget: Budget = None,
+) -> tuple:
+    """Return *fetch_file* recording files of the page from *url*.
+
+    Files are recorded to *stats*, and to the page manifest if *resume*
+    is True, and downloaded within the started *budget*.
+    Return tuple (fetch_file, PageBudget or None).
+    """
+    if stats is not NULL_STATS:
+        fetch_file = partial(fetch_file, stats=stats)
+    if resume:
+        fetch_file = partial(
+            fetch_file,
+            manifest=Manifest(manifest_path(url, output_path), url),
+        )
+    page_budget = budget.start() if budget else None
+    if page_budget is not None:
+        fetch_file = partial(fetch_file, page_budget=page_budget)
+    return fetch_file, page_budget
 
-def download_file(url: str, output_path: str, client=requests) -> str:
+
+def page_options(page_budget: PageBudget = None) -> dict:
+    """Return keyword arguments of the request of the page."""
+    if page_budget is None:
+        return {}
+    return {'timeout': page_budget.timeout()}
+
+
+def pop_skipped(errors: dict) -> dict:
+    """Remove BudgetExceeded errors from *errors* and return them."""
+    skipped = {
+        link: error for link, error in errors.items()
+        if isinstance(error, BudgetExceeded)
+    }
+    for link in skipped:
+        errors.pop(link)
+    return skipped
+
+
+def download_file(  # noqa: WPS211
+    url: str,
+    output_path: str,
+    client=requests,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    content_addressed: bool = False,
+    cache=None,
+    stats=NULL_STATS,
+    manifest=None,
+    compress: bool = False,
+    page_budget: PageBudget = None,
+) -> str:
     """Download and save file to *output_path*.
 
+    The response body is streamed to disk in chunks of *chunk_size* bytes,
+    so memory usage doesn't depend on the file size. If *content_addressed*
+    is True, the file is named after the hash of its content. If *cache*
+    is given, the file is taken from it when possible. The download is
+    recorded to *stats*.
+
+    If *manifest* is given, a file it lists as complete and intact isn't
+    downloaded again, and the outcome is recorded to it. Without *cache*,
+    the body is also kept in a part file while it is downloaded, and a
+    part left by an interrupted run is continued, see
+    manifest.open_resumable_stream().
+
+    If *compress* is True, text files are stored compressed as *name.gz*,
+    or *name.br* if the server sent brotli. Compressed responses are
+    written as they came off the wire, others are gzipped while written.
+
+    If *page_budget* is given, the file is requested with its timeouts,
+    and BudgetExceeded is raised if the type or the size of the file is
+    over it, see page_loader.budget.PageBudget.
     Return full file path.
     """
-    response = client.get(url)
-    file_path = Path(output_path) / url_to_name(response.url)
-    file_path.write_bytes(response.content)
+    if manifest is not None:
+        verified_path = manifest.verified_path(url)
+        if verified_path is not None:
+            return verified_path
+    start = time.perf_counter()
+    recording = manifest.recording(
+        url, part_path(url, output_path),
+    ) if manifest else nullcontext({})
+    with recording as outcome:
+        with open_file_stream(
+            url,
+            output_path,
+            client,
+            chunk_size,
+            cache=cache,
+            manifest=manifest,
+            compress=compress,
+            page_budget=page_budget,
+        ) as file_stream:
+            file_path, sha256 = save_stream(
+                file_stream, output_path, content_addressed, compress,
+            )
+        outcome.update(file_path=file_path, sha256=sha256)
+    if stats is not NULL_STATS:
+        stats.record_file(
+            url=url,
+            bytes=file_path.stat().st_size,
+            seconds=round(time.perf_counter() - start, 6),
+            retries=file_stream.retries,
+            cached=file_stream.cached,
+        )
     return str(file_path.resolve())
 
 
-def download_additional_files(
+@contextmanager
+def open_file_stream(  # noqa: WPS211
+    url: str,
+    output_path: str,
+    client,
+    chunk_size: int,
+    cache=None,
+    manifest=None,
+    compress: bool = False,
+    page_budget: PageBudget = None,
+):
+    """Provide FileStream of *url* for download_file().
+
+    The body comes from *cache*, continues the part recorded in
+    *manifest* or is requested, and it is cut at the limits of
+    *page_budget*.
+    """
+    if page_budget is not None:
+        client = BudgetClient(client, page_budget)
+    if cache is not None:
+        stream = partial(cache.open_stream, page_budget=page_budget)
+    elif manifest is not None:
+        stream = partial(
+            open_resumable_stream, manifest=manifest, output_path=output_path,
+        )
+    else:
+        stream = partial(open_stream, compressed=compress)
+    with stream(url, client, chunk_size) as file_stream:
+        if page_budget is not None:
+            file_stream = file_stream._replace(
+                chunks=page_budget.limit(file_stream.chunks),
+            )
+        yield file_stream
+
+
+def save_stream(
+    file_stream,
+    output_path: str,
+    content_addressed: bool = False,
+    compress: bool = False,
+) -> tuple:
+    """Write FileStream to *output_path*.
+
+    Return tuple (file path, SHA-256 hex digest of the stored content).
+    """
+    file_name = url_to_name(file_stream.url)
+    chunks = file_stream.chunks
+    if file_stream.encoding:
+        file_name += ENCODING_SUFFIXES[file_stream.encoding]
+    elif compress and is_text_file(file_name):
+        chunks = gzip_chunks(chunks)
+        file_name += ENCODING_SUFFIXES['gzip']
+    if content_addressed:
+        suffix = ''.join(Path(file_name).suffixes[-2:])
+        file_path = write_chunks_by_hash(chunks, Path(output_path), suffix)
+        return file_path, file_path.name.partition('.')[0]
+    file_path = Path(output_path) / file_name
+    return file_path, write_chunks(chunks, file_path)
+
+
+def file_fetcher(
+    client,
+    chunk_size: int,
+    store_dir: str = None,
+    cache=None,
+    compress: bool = False,
+):
+    """Return function (file_url, files_dir) downloading one file."""
+    return partial(
+        download_file,
+        client=client,
+        chunk_size=chunk_size,
+        content_addressed=store_dir is not None,
+        cache=cache,
+        compress=compress,
+    )
+
+
+def download_additional_files(  # noqa: WPS211
     url: str,
     files_dir: str,
-    html: str,
-    tag_name: str,
-    link_attribute_name: str,
-) -> dict:
-    """Download same domain or subdomain files.
+    asset_links: list,
+    fetch_file=download_file,
+    workers: int = 1,
+) -> tuple:
+    """Download files from *asset_links*.
 
-    url - url from which the *html* was downloaded.
+    url - url from which the page was downloaded.
     files_dir - the directory where the files are stored.
-    html - html text from which to download files.
-    tag_name - the name of tag containing a link to the file.
-    link_attribute_name - link attribute name of tag.
+    asset_links - list of tuple (tag, link_attribute_name, link).
+    fetch_file - function (file_url, files_dir) that downloads one file
+        and returns its absolute path, download_file() by default.
+    workers - the maximum number of files downloaded at the same time.
 
+    Links are resolved to canonical urls and every url is downloaded once.
+    Files that stylesheets refer to are downloaded too, see DownloadQueue.
     If the *files_dir* doesn't exists, it will be created.
-    Return dict. Key is file url, value is absolute file path.
+    Return tuple (file_paths, errors). Both are dicts keyed by file link:
+    file_paths values are absolute file paths, errors values are the
+    exceptions raised while downloading the file.
     """
-    soup = bs4.BeautifulSoup(html, features='html.parser')
-    file_paths = {}
-    if soup.find(tag_name):
-        tags = soup.find_all(
-            lambda t: (   # noqa: WPS111
-                t.name == tag_name
-                and is_same_domain_or_subdomain(
-                    url, t.get(link_attribute_name, ""),
+    if not asset_links:
+        return {}, {}
+    Path(files_dir).mkdir(parents=True, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        queue = DownloadQueue(executor, files_dir, fetch_file)
+        return collect_results(queue.submit(url, asset_links))
+
+
+class DownloadQueue(object):
+    """Downloads of files to *files_dir* with every url downloaded once.
+
+    A stylesheet is scanned for url() and @import links in the worker
+    that downloaded it, and its files are submitted to the same queue.
+    The future of the stylesheet gives a Stylesheet, which collect_results()
+    finishes by rewriting its links once its files are downloaded, so
+    workers never wait for each other.
+    """
+
+    def __init__(
+        self,
+        executor,
+        files_dir: str,
+        fetch_file,
+        scan=scan_stylesheet,
+        rewrite_links: bool = True,
+    ):
+        """Create queue submitting downloads to *executor*.
+
+        scan - function returning list of css.Reference of the stylesheet
+            at the path fetch_file() returned.
+        rewrite_links - False to keep the links of stylesheets as they are.
+        """
+        self.executor = executor
+        self.files_dir = files_dir
+        self.fetch_file = fetch_file
+        self.scan = scan
+        self.rewrite_links = rewrite_links
+        self.url_futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, url: str, asset_links: list) -> dict:
+        """Submit downloads of files from *asset_links* of page *url*.
+
+        Urls already in the queue aren't downloaded again, so the queue can
+        be shared between pages.
+        Return dict. Key is file link, value is future of its download.
+        """
+        resolver = url_resolver(url)
+        return {
+            file_url: self.submit_file(resolver.canonical(file_url))
+            for _, _, file_url in asset_links
+        }
+
+    def submit_file(self, file_url: str) -> Future:
+        """Return future of the download of canonical *file_url*."""
+        with self._lock:
+            if file_url not in self.url_futures:
+                fetch = self.fetch_file
+                if is_stylesheet(file_url):
+                    fetch = self.fetch_stylesheet
+                self.url_futures[file_url] = self.executor.submit(
+                    fetch, file_url, self.files_dir,
                 )
-            ),
+            return self.url_futures[file_url]
+
+    def fetch_stylesheet(self, file_url: str, files_dir: str):
+        """Download stylesheet and submit downloads of its files.
+
+        Return Stylesheet.
+        """
+        file_path = self.fetch_file(file_url, files_dir)
+        resolver = url_resolver(file_url)
+        references = [
+            reference for reference in self.scan(file_path)
+            if resolver.is_same_domain(reference.link)
+        ]
+        futures = self.submit(
+            file_url,
+            [(None, 'url', reference.link) for reference in references],
         )
-        files_dir_path = Path(files_dir)
-        if not files_dir_path.exists():
-            files_dir_path.mkdir()
-
-        for tag in tags:
-            file_url = tag.get(link_attribute_name, '')
-            absolute_file_url = relative_url_to_absolute(
-                file_url, parent_url=url,
-            )
-            file_path = download_file(absolute_file_url, files_dir)
+        if not self.rewrite_links:
+            references = []
+        return Stylesheet(file_path, references, futures)
+
+
+class Stylesheet(object):
+    """Downloaded stylesheet waiting for its files to rewrite its links."""
+
+    def __init__(self, file_path: str, references: list, futures: dict):
+        """Create stylesheet at *file_path* with futures of its files."""
+        self.file_path = file_path
+        self.references = references
+        self.futures = futures
+        self.rewritten_path = None
+        self._lock = threading.RLock()
+
+    def finish(self) -> str:
+        """Wait for the files and rewrite the links once.
+
+        A stylesheet importing itself through others gets its path back
+        while it is being finished.
+        Return full path of the rewritten file.
+        """
+        with self._lock:
+            if self.rewritten_path is None:
+                self.rewritten_path = self.file_path
+                local_paths, errors = collect_results(self.futures)
+                for link, error in errors.items():
+                    logger.warning('Failed to download %s: %s', link, error)
+                base_dir = Path(self.file_path).parent.resolve()
+                self.rewritten_path = str(rewrite_stylesheet(
+                    self.file_path,
+                    self.references,
+                    {
+                        link: local_link(file_path, base_dir)
+                        for link, file_path in local_paths.items()
+                    },
+                ).resolve())
+            return self.rewritten_path
+
+
+def is_stylesheet(file_url: str) -> bool:
+    """Return True if *file_url* is saved as a stylesheet."""
+    return url_to_name(file_url).endswith('.css')
+
+
+def collect_results(futures: dict) -> tuple:
+    """Wait for *futures* and split their results into paths and errors.
+
+    futures - dict. Key is file link, value is future of download_file().
+        Stylesheets are finished before their paths are returned.
+    Return tuple (file_paths, errors).
+    """
+    file_paths = {}
+    errors = {}
+    for file_url, future in futures.items():
+        try:
+            file_path = future.result()
+            if isinstance(file_path, Stylesheet):
+                file_path = file_path.finish()
+        except (requests.RequestException, OSError, BudgetExceeded) as error:
+            errors[file_url] = error
+        else:
             file_paths[file_url] = file_path
-    return file_paths
+    return file_paths, errors
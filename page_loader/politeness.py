@@ -0,0 +1,310 @@
+import email.utils
+import random
+import threading
+import time
+import urllib
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from page_loader.defaults import (
+    DEFAULT_BURST,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_RETRIES,
+)
+from page_loader.http import session_scope
+
+DEFAULT_BACKOFF = 0.5
+MAX_RETRY_DELAY = 60
+RETRY_JITTER = 0.25
+THROTTLE_STATUSES = (429, 503)
+
+
+class TokenBucket(object):
+    """Token bucket letting *rate* requests a second after a *burst*.
+
+    Tokens are reserved in order, so waiting requests are served first
+    come first served without polling.
+    """
+
+    def __init__(self, rate: float, burst: int = DEFAULT_BURST):
+        """Create full bucket."""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, waiting for it if needed. Return seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate,
+            )
+            self.updated = now
+            self.tokens -= 1
+            delay = max(0, -self.tokens / self.rate)
+        time.sleep(delay)
+        return delay
+
+
+@dataclass
+class HostState(object):
+    """Limits and numbers of requests to one host."""
+
+    bucket: TokenBucket = None
+    slots: threading.Semaphore = None
+    paused_until: float = 0
+    requests: int = 0
+    retries: int = 0
+    bytes_received: int = 0
+    waited: float = 0
+    started: float = None
+    finished: float = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def report(self) -> dict:
+        """Return JSON serializable numbers with effective throughput."""
+        seconds = (self.finished or 0) - (self.started or 0)
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'bytes': self.bytes_received,
+            'seconds': round(seconds, 6),
+            'waited': round(self.waited, 6),
+            'requests_per_second': round(
+                self.requests / seconds if seconds else 0, 3,
+            ),
+            'bytes_per_second': round(
+                self.bytes_received / seconds if seconds else 0, 3,
+            ),
+        }
+
+
+class HostLimiter(object):
+    """Politeness policy of requests to every host.
+
+    rate - maximum number of requests a second to one host after the first
+        *burst* ones, None for no limit.
+    per_host - maximum number of requests to one host in flight at the
+        same time, a streamed response counts until it is closed or its
+        release_slot() is called. None for no limit.
+    retries - number of retries of 429 Too Many Requests and 503 Service
+        Unavailable responses. The host is paused for Retry-After seconds
+        if the server sends it, otherwise for exponential backoff starting
+        at *backoff* seconds, both capped at *max_delay* and with jitter.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        rate: float = None,
+        burst: int = DEFAULT_BURST,
+        per_host: int = None,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        max_delay: float = MAX_RETRY_DELAY,
+    ):
+        """Create limiter with no hosts seen yet."""
+        self.rate = rate
+        self.burst = burst
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def request(self, send, url: str, **kwargs):
+        """Call send(url, **kwargs) within the limits of the url host.
+
+        Throttled responses are retried. Return the response, its host
+        slot is released when the response is closed or at once if it
+        isn't streamed.
+        """
+        host = self.host_state(url)
+        attempt = 0
+        while True:
+            response = self.send(host, send, url, **kwargs)
+            if attempt >= self.retries or (
+                response.status_code not in THROTTLE_STATUSES
+            ):
+                break
+            response.close()
+            self.pause(host, retry_delay(response, attempt, self))
+            attempt += 1
+        if not kwargs.get('stream'):
+            response.close()
+        return response
+
+    def send(self, host: HostState, send, url: str, **kwargs):
+        """Send request in a slot of *host* and count it.
+
+        The slot is released when the response is closed.
+        """
+        self.acquire(host)
+        try:
+            response = send(url, **kwargs)
+        except BaseException:
+            self.release(host)
+            raise
+        slot = HostSlot(self, host, response)
+        response.close = slot.close
+        response.release_slot = slot.release
+        return response
+
+    def acquire(self, host: HostState) -> None:
+        """Wait until a request to *host* is allowed."""
+        start = time.monotonic()
+        if host.slots is not None:
+            host.slots.acquire()
+        time.sleep(max(0, host.paused_until - time.monotonic()))
+        if host.bucket is not None:
+            host.bucket.acquire()
+        with host.lock:
+            host.requests += 1
+            host.waited += time.monotonic() - start
+            if host.started is None:
+                host.started = time.monotonic()
+
+    def release(
+        self, host: HostState, bytes_received: int = 0, free_slot: bool = True,
+    ) -> None:
+        """Count *bytes_received* from *host* and free its slot.
+
+        free_slot - False if the slot has already been freed.
+        """
+        with host.lock:
+            host.bytes_received += bytes_received
+            host.finished = time.monotonic()
+        if free_slot and host.slots is not None:
+            host.slots.release()
+
+    def pause(self, host: HostState, delay: float) -> None:
+        """Hold all requests to *host* for *delay* seconds."""
+        with host.lock:
+            host.retries += 1
+            host.paused_until = max(
+                host.paused_until, time.monotonic() + delay,
+            )
+
+    def host_state(self, url: str) -> HostState:
+        """Return state of the host of *url*, creating it on first use."""
+        hostname = urllib.parse.urlsplit(url).hostname or ''
+        with self._lock:
+            if hostname not in self.hosts:
+                self.hosts[hostname] = HostState(
+                    bucket=TokenBucket(self.rate, self.burst)
+                    if self.rate else None,
+                    slots=threading.BoundedSemaphore(self.per_host)
+                    if self.per_host else None,
+                )
+            return self.hosts[hostname]
+
+    def report(self) -> dict:
+        """Return numbers and effective throughput of every host."""
+        with self._lock:
+            return {
+                hostname: host.report()
+                for hostname, host in self.hosts.items()
+            }
+
+
+class HostSlot(object):
+    """Slot of a host held by a response until it is closed.
+
+    The slot can be released earlier, while the body is still being read,
+    by a caller that waits for other requests to the same host before it
+    closes the response.
+    """
+
+    def __init__(self, limiter: HostLimiter, host: HostState, response):
+        """Hold the slot for *response*."""
+        self.limiter = limiter
+        self.host = host
+        self.response_close = response.close
+        self.raw = getattr(response, 'raw', None)
+        self.released = False
+        self.closed = False
+
+    def release(self) -> None:
+        """Free the slot once, leaving the response open."""
+        if self.released:
+            return
+        self.released = True
+        self.limiter.release(self.host)
+
+    def close(self) -> None:
+        """Close the response, count its bytes and free the slot once."""
+        self.response_close()
+        if self.closed:
+            return
+        self.closed = True
+        tell = getattr(self.raw, 'tell', None)
+        self.limiter.release(
+            self.host, tell() if tell else 0, free_slot=not self.released,
+        )
+        self.released = True
+
+
+class PoliteClient(object):
+    """Client sending requests of *client* within limits of *limiter*."""
+
+    def __init__(self, client, limiter: HostLimiter):
+        """Wrap requests module or session *client*."""
+        self.client = client
+        self.limiter = limiter
+
+    def get(self, url: str, **kwargs):
+        """Send GET request like requests.get()."""
+        return self.limiter.request(self.client.get, url, **kwargs)
+
+    def __getattr__(self, name: str):
+        """Delegate other attributes to the wrapped client."""
+        return getattr(self.client, name)
+
+
+@contextmanager
+def polite_session_scope(
+    client=None,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    retries: int = DEFAULT_RETRIES,
+    limiter: HostLimiter = None,
+):
+    """Provide client like session_scope() within limits of *limiter*.
+
+    Without *limiter* only throttled responses are retried, up to *retries*
+    times.
+    """
+    limiter = limiter or HostLimiter(retries=retries)
+    with session_scope(client, pool_size, retries) as session:
+        yield PoliteClient(session, limiter)
+
+
+def retry_delay(response, attempt: int, limiter: HostLimiter) -> float:
+    """Return seconds to wait before retrying throttled *response*."""
+    delay = retry_after(response.headers.get('Retry-After'))
+    if delay is None:
+        delay = limiter.backoff * 2 ** attempt
+    return min(delay, limiter.max_delay) * random.uniform(  # noqa: S311
+        1, 1 + RETRY_JITTER,
+    )
+
+
+def retry_after(header_value: str):
+    """Return seconds from Retry-After *header_value*, None if invalid.
+
+    >>> retry_after('120')
+    120.0
+
+    >>> retry_after('Wed, 21 Oct 2015 07:28:00 GMT')
+    0
+    """
+    if not header_value:
+        return None
+    if header_value.strip().isdigit():
+        return float(header_value)
+    try:
+        retry_date = email.utils.parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, retry_date.timestamp() - time.time())
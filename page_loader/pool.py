@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from page_loader import extractors
+from page_loader.document import SourceDocument
+
+
+class PooledDocument(object):
+    """Page parsed and rewritten in a process pool.
+
+    Only the page bytes, the links and the local paths cross between
+    processes: the page is scanned in one call, which returns its links,
+    and parsed, rewritten and rendered in another, which returns the
+    bytes to write. Links are found with the splice scanner, which is
+    much cheaper than a soup, so a soup document is parsed once, when it
+    is rendered, and a splice document gets its spans back and is
+    scanned once.
+    """
+
+    def __init__(
+        self,
+        executor,
+        document_class,
+        content: bytes,
+        encoding: str,
+        url: str,
+    ):
+        """Scan page *content* from *url* with *document_class* in *executor*.
+
+        document_class - callable (content, encoding, url) creating the page
+            document, see document.document_factory(). It is pickled.
+        """
+        self.executor = executor
+        self.document_class = document_class
+        self.page = (content, encoding, url)
+        self.asset_links = executor.submit(
+            scan_page, document_class, *self.page,
+        ).result()
+        self.local_paths = {}
+        self.base_dir = None
+
+    def rewrite(self, local_paths: dict, base_dir: str) -> None:
+        """Remember where the files are for render()."""
+        self.local_paths = local_paths
+        self.base_dir = str(Path(base_dir).resolve())
+
+    def render(self) -> bytes:
+        """Return the rewritten page rendered in the pool."""
+        return self.executor.submit(
+            render_page,
+            self.document_class,
+            *self.page,
+            self.asset_links,
+            self.local_paths,
+            self.base_dir,
+        ).result()
+
+
+def create_pool(processes: int = None) -> ProcessPoolExecutor:
+    """Create pool of *processes* workers, one per core by default.
+
+    Workers are spawned, not forked, as the pool is used from threads, and
+    get the extractors registered in this process.
+    """
+    return ProcessPoolExecutor(
+        max_workers=processes or os.cpu_count(),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=load_extractors,
+        initargs=(list(extractors.EXTRACTORS),),
+    )
+
+
+def load_extractors(registered: list) -> None:
+    """Use the *registered* extractors in a worker process."""
+    extractors.EXTRACTORS[:] = registered
+
+
+def scan_page(document_class, content: bytes, encoding: str, url: str):
+    """Return asset links of the page found by the splice scanner.
+
+    Links are collected for the asset classes *document_class* is created
+    with, and their spans can be sent between processes.
+    """
+    keywords = getattr(document_class, 'keywords', {})
+    return SourceDocument(
+        content, encoding, url, keywords.get('asset_classes'),
+    ).asset_links
+
+
+def render_page(  # noqa: WPS211
+    document_class,
+    content: bytes,
+    encoding: str,
+    url: str,
+    asset_links: list,
+    local_paths: dict,
+    base_dir: str,
+) -> bytes:
+    """Return the page with links to *local_paths* rendered."""
+    if getattr(document_class, 'func', document_class) is SourceDocument:
+        document = document_class(
+            content, encoding, url, asset_links=asset_links,
+        )
+    else:
+        document = document_class(content, encoding, url)
+    document.rewrite(local_paths, base_dir)
+    return document.render()
@@ -1,13 +1,251 @@
+"""Command line interface.
+
+Only argparse and page_loader.defaults are imported at startup, so
+--help and argument errors don't pay for requests and bs4. The rest is
+imported by the function that needs it.
+"""
 import argparse
+import json
+import os
+import sys
 from pathlib import Path
 
-from page_loader import download
+from page_loader.defaults import (
+    ARCHIVE_FORMATS,
+    ASSET_CLASSES,
+    DEFAULT_BURST,
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_MAX_PAGES,
+    DEFAULT_PARSER,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_RETRIES,
+    DEFAULT_REWRITE,
+    PARSERS,
+    REWRITES,
+)
+
+DIR_FORMAT = 'dir'
+ARCHIVE_UNSUPPORTED = (
+    ('store_dir', '--store'),
+    ('compress', '--compress'),
+    ('resume', '--resume'),
+    ('low_memory', '--low-memory'),
+)
 
 
 def main():
     """Entry point."""
+    parser = make_parser()
+    args = parser.parse_args()
+    check_arguments(parser, args)
+    if not Path(args.dir_path).exists():
+        print('No such directory:', args.dir_path)  # noqa: WPS421
+        return
+    if args.batch is not None:
+        run_batch(parser, args)
+    elif args.depth > 0:
+        run_crawl(parser, args)
+    elif args.archive_format != DIR_FORMAT:
+        run_archive(parser, args)
+    else:
+        run_download(args)
+
+
+def check_arguments(
+    parser: argparse.ArgumentParser, args: argparse.Namespace,
+) -> None:
+    """Exit with an error if parsed *args* don't go together."""
+    if (args.url is None) == (args.batch is None):
+        parser.error('either url or --batch is required')
+    if args.processes and args.batch is None:
+        parser.error('--processes is only supported with --batch')
+    if args.page_workers != 1 and args.batch is None:
+        parser.error('--page-workers is only supported with --batch')
+    if args.max_pages != DEFAULT_MAX_PAGES and args.depth == 0:
+        parser.error('--max-pages is only supported with --depth')
+
+
+def run_download(args: argparse.Namespace) -> None:
+    """Download the url and print path of the saved page."""
+    from page_loader import download  # noqa: WPS433
+    from page_loader.stats import Stats  # noqa: WPS433
+
+    stats = Stats() if args.stats else None
+    options = download_options(args)
+    path = download(args.url, args.dir_path, stats=stats, **options)
+    if stats:
+        report = {**stats.report(), 'hosts': options['limiter'].report()}
+        print(json.dumps(report), file=sys.stderr)  # noqa: WPS421
+    print(path)  # noqa: WPS421
+
+
+def run_archive(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """Download the url into an archive and print path of the archive."""
+    from page_loader.archive import download_archive  # noqa: WPS433
+    from page_loader.stats import Stats  # noqa: WPS433
+
+    stats = Stats() if args.stats else None
+    options = download_options(args)
+    for option, flag in ARCHIVE_UNSUPPORTED:
+        if options.pop(option):
+            parser.error(f'{flag} is not supported with --format')
+    path = download_archive(
+        args.url,
+        args.dir_path,
+        archive_format=args.archive_format,
+        stats=stats,
+        **options,
+    )
+    if stats:
+        report = {**stats.report(), 'hosts': options['limiter'].report()}
+        print(json.dumps(report), file=sys.stderr)  # noqa: WPS421
+    print(path)  # noqa: WPS421
+
+
+def run_crawl(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """Download the url with linked pages and print path of its page."""
+    from page_loader.crawler import crawl  # noqa: WPS433
+
+    options = download_options(args)
+    unsupported = (
+        ('--format', args.archive_format != DIR_FORMAT),
+        ('--stats', args.stats),
+        ('--rewrite', options.pop('rewrite') != DEFAULT_REWRITE),
+        ('--resume', options.pop('resume')),
+        ('a budget', options.pop('budget') is not None),
+        ('--low-memory', options.pop('low_memory')),
+    )
+    for flag, is_used in unsupported:
+        if is_used:
+            parser.error(f'{flag} is not supported with --depth')
+    path, *_ = crawl(
+        args.url,
+        args.dir_path,
+        depth=args.depth,
+        max_pages=args.max_pages,
+        **options,
+    )
+    print(path)  # noqa: WPS421
+
+
+def run_batch(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """Download urls listed in --batch file and print JSON lines."""
+    from page_loader.batch import download_batch, read_urls  # noqa: WPS433
+
+    unsupported = (
+        ('--format', args.archive_format != DIR_FORMAT),
+        ('--depth', args.depth > 0),
+    )
+    for flag, is_used in unsupported:
+        if is_used:
+            parser.error(f'{flag} is not supported with --batch')
+    options = download_options(args)
+    with args.batch:
+        page_results = download_batch(
+            read_urls(args.batch),
+            args.dir_path,
+            page_workers=args.page_workers,
+            processes=args.processes,
+            stats=args.stats,
+            **options,
+        )
+        for page_result in page_results:
+            line = json.dumps(page_result.to_dict())
+            print(line, flush=True)  # noqa: WPS421
+    if args.stats:
+        hosts = json.dumps({'hosts': options['limiter'].report()})
+        print(hosts, file=sys.stderr)  # noqa: WPS421
+
+
+def download_options(args: argparse.Namespace) -> dict:
+    """Return keyword arguments of download() from parsed *args*."""
+    from page_loader.politeness import HostLimiter  # noqa: WPS433
+
+    return {
+        'workers': args.workers,
+        'pool_size': args.pool_size,
+        'retries': args.retries,
+        'chunk_size': args.chunk_size,
+        'store_dir': args.store_dir,
+        'cache_dir': args.cache_dir,
+        'cache_size': args.cache_size,
+        'rewrite': args.rewrite,
+        'parser': args.parser,
+        'resume': args.resume,
+        'compress': args.compress,
+        'asset_classes': args.asset_classes,
+        'budget': budget(args),
+        'low_memory': args.low_memory,
+        'limiter': HostLimiter(
+            rate=args.rate,
+            burst=args.burst,
+            per_host=args.per_host,
+            retries=args.retries,
+        ),
+    }
+
+
+def asset_classes(argument: str) -> tuple:
+    """Return asset classes listed in comma-separated *argument*."""
+    names = tuple(name.strip() for name in argument.split(',') if name.strip())
+    unknown = set(names) - set(ASSET_CLASSES)
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            'unknown asset classes: {0}'.format(', '.join(sorted(unknown))),
+        )
+    return names
+
+
+def positive_int(argument: str) -> int:
+    """Return *argument* as an integer greater than 0."""
+    return bounded_int(argument, 1, 'a positive')
+
+
+def non_negative_int(argument: str) -> int:
+    """Return *argument* as an integer not less than 0."""
+    return bounded_int(argument, 0, 'a non-negative')
+
+
+def bounded_int(argument: str, minimum: int, kind: str) -> int:
+    """Return *argument* as an integer not less than *minimum*.
+
+    kind - words before "integer" in the error message.
+    """
+    try:
+        number = int(argument)
+    except ValueError:
+        number = minimum - 1
+    if number < minimum:
+        raise argparse.ArgumentTypeError(
+            f'expected {kind} integer, got {argument!r}',
+        )
+    return number
+
+
+def budget(args: argparse.Namespace):
+    """Return Budget from parsed *args*, None if there are no limits."""
+    from page_loader.budget import Budget  # noqa: WPS433
+
+    page_budget = Budget(
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        max_file_bytes=args.max_file_size,
+        max_page_bytes=args.max_page_size,
+        deadline=args.deadline,
+        allow_types=tuple(args.allow_types),
+        deny_types=tuple(args.deny_types),
+    )
+    return None if page_budget == Budget() else page_budget
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """Create parser of command-line arguments."""
     parser = argparse.ArgumentParser(
-        usage='%(prog)s [options] <url>',  # noqa: WPS323
+        usage=(
+            '%(prog)s [options] <url>\n'  # noqa: WPS323
+            '       %(prog)s [options] --batch <file>'  # noqa: WPS323
+        ),
         description="""
         PageLoader is a command-line utility that downloads pages
         from the Internet and saves them on your computer. Together with
@@ -25,9 +263,254 @@ def main():
         metavar='[dir]',
         dest='dir_path',
     )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        help='maximum number of resources downloaded at the same time',
+        default=1,
+        type=positive_int,
+        metavar='N',
+    )
+    parser.add_argument(
+        '--pool-size',
+        help='maximum number of kept-alive connections per host',
+        default=DEFAULT_POOL_SIZE,
+        type=positive_int,
+        metavar='N',
+    )
+    parser.add_argument(
+        '--retries',
+        help=(
+            'number of retries of failed connections, 5xx and 429 '
+            'responses, Retry-After is honoured'
+        ),
+        default=DEFAULT_RETRIES,
+        type=int,
+        metavar='N',
+    )
+    parser.add_argument(
+        '--chunk-size',
+        help='size in bytes of chunks in which resources are written',
+        default=DEFAULT_CHUNK_SIZE,
+        type=positive_int,
+        metavar='BYTES',
+    )
+    parser.add_argument(
+        '--rate',
+        help='maximum number of requests a second to one host',
+        type=float,
+        metavar='N',
+    )
+    parser.add_argument(
+        '--burst',
+        help='number of requests to a host sent at once before --rate applies',
+        default=DEFAULT_BURST,
+        type=int,
+        metavar='N',
+    )
+    parser.add_argument(
+        '--per-host',
+        help='maximum number of connections to one host at the same time',
+        type=positive_int,
+        metavar='N',
+    )
+    parser.add_argument(
+        '--store',
+        help=(
+            'directory where resources are stored under the hash of their '
+            'content, shared between pages'
+        ),
+        type=Path,
+        metavar='[dir]',
+        dest='store_dir',
+    )
+    parser.add_argument(
+        '--compress',
+        help=(
+            'store text resources compressed as <name>.gz or <name>.br, '
+            'the page links to <name> for servers with static compression'
+        ),
+        action='store_true',
+    )
+    parser.add_argument(
+        '--assets',
+        help=(
+            'comma-separated classes of resources to download: {0}; '
+            'all by default'.format(', '.join(ASSET_CLASSES))
+        ),
+        type=asset_classes,
+        metavar='CLASSES',
+        dest='asset_classes',
+    )
+    parser.add_argument(
+        '--connect-timeout',
+        help='seconds to wait for a connection to a server',
+        type=float,
+        metavar='S',
+    )
+    parser.add_argument(
+        '--read-timeout',
+        help='seconds to wait for the next bytes of a response',
+        type=float,
+        metavar='S',
+    )
+    parser.add_argument(
+        '--deadline',
+        help=(
+            'seconds after which resources of a page are no longer '
+            'downloaded'
+        ),
+        type=float,
+        metavar='S',
+    )
+    parser.add_argument(
+        '--max-file-size',
+        help='maximum size of one resource in bytes',
+        type=int,
+        metavar='BYTES',
+    )
+    parser.add_argument(
+        '--max-page-size',
+        help='maximum size of all resources of a page in bytes',
+        type=int,
+        metavar='BYTES',
+    )
+    parser.add_argument(
+        '--allow-type',
+        help=(
+            'download only resources of this MIME type, such as image/*; '
+            'can be repeated'
+        ),
+        action='append',
+        default=[],
+        metavar='TYPE',
+        dest='allow_types',
+    )
+    parser.add_argument(
+        '--deny-type',
+        help='skip resources of this MIME type; can be repeated',
+        action='append',
+        default=[],
+        metavar='TYPE',
+        dest='deny_types',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help='directory of the cache of resources reused between runs',
+        type=Path,
+        metavar='[dir]',
+    )
+    parser.add_argument(
+        '--cache-size',
+        help='maximum size of the cache in bytes',
+        default=DEFAULT_CACHE_SIZE,
+        type=int,
+        metavar='BYTES',
+    )
+    parser.add_argument(
+        '--rewrite',
+        help=(
+            'how the page is saved: prettify re-indents the whole page, '
+            'splice keeps the original bytes and only replaces links'
+        ),
+        default=DEFAULT_REWRITE,
+        choices=REWRITES,
+    )
+    parser.add_argument(
+        '--parser',
+        help=(
+            'html parser backend, auto is the fastest installed one; '
+            'parsers that are not installed fall back to html.parser'
+        ),
+        default=DEFAULT_PARSER,
+        choices=PARSERS,
+    )
+    parser.add_argument(
+        '--low-memory',
+        help=(
+            'stream the page instead of reading it whole: resources are '
+            'downloaded as their links arrive and the page is written as '
+            'it is scanned, keeping its bytes like --rewrite splice'
+        ),
+        action='store_true',
+    )
+    parser.add_argument(
+        '--format',
+        help=(
+            'save the page with its resources as a directory, or stream '
+            'them into a single warc, mhtml or tar file with an .idx index'
+        ),
+        default=DIR_FORMAT,
+        choices=(DIR_FORMAT, *ARCHIVE_FORMATS),
+        dest='archive_format',
+    )
+    parser.add_argument(
+        '--depth',
+        help=(
+            'follow links to same domain pages up to N links away from '
+            'the url'
+        ),
+        default=0,
+        type=int,
+        metavar='N',
+    )
+    parser.add_argument(
+        '--max-pages',
+        help='maximum number of pages saved when following links',
+        default=DEFAULT_MAX_PAGES,
+        type=int,
+        metavar='M',
+    )
+    parser.add_argument(
+        '--batch',
+        help=(
+            'file with urls to download, one per line, or - for stdin; '
+            'a JSON line with the result is printed per url'
+        ),
+        type=argparse.FileType('r'),
+        metavar='FILE',
+    )
+    parser.add_argument(
+        '--page-workers',
+        help='maximum number of --batch pages downloaded at the same time',
+        default=1,
+        type=positive_int,
+        metavar='N',
+    )
+    parser.add_argument(
+        '--processes',
+        help=(
+            'parse and rewrite --batch pages in a pool of N processes, '
+            'one per core if N is not given; 0 keeps them in threads'
+        ),
+        nargs='?',
+        const=os.cpu_count(),
+        default=0,
+        type=non_negative_int,
+        metavar='N',
+    )
+    parser.add_argument(
+        '--stats',
+        help=(
+            'report time of every phase, numbers of every resource and '
+            'throughput of every host as JSON: on stderr for a single page, '
+            'in result lines and a final stderr line for --batch'
+        ),
+        action='store_true',
+    )
+    parser.add_argument(
+        '--resume',
+        help=(
+            'record resources in a page manifest and continue the '
+            'interrupted run that recorded it: skip resources it lists as '
+            'complete and intact, continue partial ones'
+        ),
+        action='store_true',
+    )
     parser.add_argument(
         'url',
         type=str,
+        nargs='?',
     )
     parser.add_argument(
         '-h',
@@ -35,12 +518,7 @@ def main():
         action='help',
         help='display help for command',
     )
-    args = parser.parse_args()
-    if not Path(args.dir_path).exists():
-        print('No such directory:', args.dir_path)  # noqa: WPS421
-        return
-    path = download(args.url, args.dir_path)
-    print(path)  # noqa: WPS421
+    return parser
 
 
 if __name__ == '__main__':
@@ -0,0 +1,226 @@
+import html
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+from page_loader.assets import local_link
+from page_loader.extractors import CONTAINERS, TEXT, AssetSelector
+from page_loader.url import url_resolver
+
+ATTRIBUTE_PATTERN = re.compile(
+    r"""\s(?P<name>[^\s"'>/=]+)"""
+    r"""(?:\s*=\s*(?:"(?P<double>[^"]*)"|'(?P<single>[^']*)'"""
+    r"""|(?P<bare>[^\s"'=<>`]+)))?""",
+)
+VALUE_GROUPS = ('double', 'single', 'bare')
+
+
+class Span(NamedTuple):
+    """Position of an attribute value in the page source."""
+
+    start: int
+    end: int
+    quoted: bool
+
+
+class AssetScanner(HTMLParser):
+    """Finds asset links in the page source together with their positions.
+
+    Only the raw text of the start tags and of raw text elements with
+    links, such as <style>, is inspected, so the rest of the document is
+    never copied or rebuilt.
+    """
+
+    def __init__(self, url: str, asset_classes: Iterable[str] = None):
+        """Create scanner of a page downloaded from *url*.
+
+        asset_classes - names of the asset classes to collect, all of them
+            by default.
+        """
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.resolver = url_resolver(url)
+        self.selector = AssetSelector(asset_classes)
+        self.container = None
+        self.text_extractors = []
+        self.asset_links = []
+        self.line_starts = [0]
+        self.forgotten_lines = 0
+        self.source_length = 0
+
+    def scan(self, source: str) -> list:
+        """Scan the whole *source*.
+
+        Return list of tuple (span, link_attribute_name, link) in document
+        order, where span is the Span of the link in *source*.
+        """
+        self.feed_source(source)
+        self.close()
+        return self.asset_links
+
+    def feed_source(self, source: str) -> None:
+        """Scan the next part of the source.
+
+        Links are added to asset_links as soon as their tags are complete.
+        Spans are positions in the whole source fed so far.
+        """
+        self.line_starts.extend(
+            self.source_length + match.end()
+            for match in re.finditer('\n', source)
+        )
+        self.source_length += len(source)
+        self.feed(source)
+
+    def take_links(self) -> list:
+        """Return links found since the last call and forget them."""
+        asset_links, self.asset_links = self.asset_links, []
+        return asset_links
+
+    def forget_lines(self) -> None:
+        """Forget starts of the lines already scanned.
+
+        Keeps memory of a long source scanned in parts bounded.
+        """
+        scanned_lines = self.getpos()[0] - 1
+        del self.line_starts[:scanned_lines - self.forgotten_lines]
+        self.forgotten_lines = scanned_lines
+
+    def handle_starttag(self, tag, attrs):
+        """Remember positions of the asset links of the tag.
+
+        Extractors are matched in registry order, the links of the tag are
+        sorted by position, so they stay in document order.
+        """
+        self.text_extractors = []
+        if tag in CONTAINERS:
+            self.container = tag
+        attributes = dict(reversed(attrs))
+        if not self.selector.has_links(tag, attributes):
+            return
+        tag_start = self.source_position()
+        tag_text = self.get_starttag_text()
+        first_link = len(self.asset_links)
+        for extractor in self.selector.select(
+            tag, attributes, self.container,
+        ):
+            if extractor.attribute == TEXT:
+                self.text_extractors.append(extractor)
+                continue
+            span = find_attribute(
+                tag_text, extractor.attribute, attributes[extractor.attribute],
+            )
+            if span is not None:
+                self.add_links(
+                    extractor,
+                    tag_text[span.start:span.end],
+                    tag_start + span.start,
+                    quoted=span.quoted,
+                )
+        self.asset_links[first_link:] = sorted(
+            self.asset_links[first_link:],
+            key=lambda asset_link: asset_link[0].start,
+        )
+
+    def handle_endtag(self, tag):
+        """Leave the container or raw text element."""
+        self.text_extractors = []
+        if tag == self.container:
+            self.container = None
+
+    def handle_data(self, data):
+        """Remember positions of links in the text of a raw text element."""
+        for extractor in self.text_extractors:
+            self.add_links(
+                extractor, data, self.source_position(), escaped=False,
+            )
+
+    def add_links(  # noqa: WPS211
+        self,
+        extractor,
+        raw_value: str,
+        value_start: int,
+        quoted: bool = True,
+        escaped: bool = True,
+    ) -> None:
+        """Remember links *extractor* finds in *raw_value*.
+
+        value_start - position of *raw_value* in the source.
+        quoted - False if *raw_value* is an unquoted attribute value.
+        escaped - True if character references of *raw_value* have to be
+            decoded to get the links.
+        """
+        for start, end in extractor.parse(raw_value):
+            link = raw_value[start:end]
+            if escaped:
+                link = html.unescape(link)
+            if self.resolver.is_same_domain(link):
+                self.asset_links.append((
+                    Span(
+                        value_start + start,
+                        value_start + end,
+                        quoted or (start, end) != (0, len(raw_value)),
+                    ),
+                    extractor.attribute,
+                    link,
+                ))
+
+    def source_position(self) -> int:
+        """Return position in the source of the current token."""
+        lineno, column = self.getpos()
+        return self.line_starts[lineno - 1 - self.forgotten_lines] + column
+
+
+def find_attribute(tag_text: str, name: str, link: str):
+    """Return Span of the value of attribute *name* in *tag_text*.
+
+    Return None if the attribute isn't there or its value isn't *link*.
+    """
+    for match in ATTRIBUTE_PATTERN.finditer(tag_text):
+        if match.group('name').lower() != name:
+            continue
+        group = next(
+            (
+                group for group in VALUE_GROUPS
+                if match.group(group) is not None
+            ),
+            None,
+        )
+        if group is None or html.unescape(match.group(group)) != link:
+            return None
+        return Span(
+            match.start(group), match.end(group), group != 'bare',
+        )
+    return None
+
+
+def splice_links(
+    source: str, asset_links: list, local_paths: dict, base_dir: str,
+) -> str:
+    """Replace asset links in *source* with links to local files.
+
+    asset_links - list of tuple (span, link_attribute_name, link).
+    local_paths - dict. Key is link, value is absolute file path.
+    base_dir - the directory where the page is stored.
+    Everything except the replaced values is kept as is.
+    """
+    base_dir = Path(base_dir).resolve()
+    pieces = []
+    position = 0
+    for span, _, link in asset_links:
+        if link not in local_paths:
+            continue
+        pieces.append(source[position:span.start])
+        pieces.append(replacement(local_paths[link], base_dir, span.quoted))
+        position = span.end
+    pieces.append(source[position:])
+    return ''.join(pieces)
+
+
+def replacement(file_path: str, base_dir: Path, quoted: bool) -> str:
+    """Return attribute value linking *file_path* from *base_dir*.
+
+    quoted - False if the replaced value is unquoted.
+    """
+    new_link = html.escape(local_link(file_path, base_dir))
+    return new_link if quoted else f'"{new_link}"'
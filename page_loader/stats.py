@@ -0,0 +1,98 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+
+class Stats(object):
+    """Per-phase timings and per-file numbers of a page download.
+
+    Phases and files are also put on a timeline of start and end seconds
+    since the stats were created, which shows how they overlap.
+    Every measurement is also passed to *hooks*: callables taking an event
+    name ('phase' or 'file') and a dict with its data. 'file' events are
+    emitted from download threads.
+    """
+
+    def __init__(self, hooks: Iterable[Callable] = ()):
+        """Create empty stats notifying *hooks*."""
+        self.hooks = list(hooks)
+        self.phases = {}
+        self.files = []
+        self.timeline = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Measure time spent in the block as phase *name*."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            seconds = end - start
+            self.phases[name] = self.phases.get(name, 0) + seconds
+            self.mark(name, start, end)
+            self.emit('phase', {'name': name, 'seconds': seconds})
+
+    def record_file(self, **file_stats) -> None:
+        """Record numbers of one downloaded file.
+
+        file_stats - url, bytes, seconds, retries and cached.
+        """
+        end = time.perf_counter()
+        self.mark(
+            'file', end - file_stats['seconds'], end, url=file_stats['url'],
+        )
+        self.files.append(file_stats)
+        self.emit('file', file_stats)
+
+    def mark(self, name: str, start: float, end: float, **details) -> None:
+        """Put *name* on the timeline from *start* to *end* perf_counter."""
+        self.timeline.append({
+            'name': name,
+            'start': round(start - self.started, 6),
+            'end': round(end - self.started, 6),
+            **details,
+        })
+
+    def emit(self, event: str, event_data: dict) -> None:
+        """Pass *event* to the hooks."""
+        for hook in self.hooks:
+            hook(event, event_data)
+
+    def report(self) -> dict:
+        """Return JSON serializable report."""
+        cached = [file_stats['cached'] for file_stats in self.files]
+        return {
+            'phases': {
+                name: round(seconds, 6)
+                for name, seconds in self.phases.items()
+            },
+            'files': self.files,
+            'timeline': sorted(
+                self.timeline, key=lambda event: event['start'],
+            ),
+            'bytes': sum(file_stats['bytes'] for file_stats in self.files),
+            'retries': sum(
+                file_stats['retries'] for file_stats in self.files
+            ),
+            'cache': {
+                'hits': cached.count(True),
+                'misses': cached.count(False),
+            },
+        }
+
+
+class NullStats(object):
+    """Stats that measure nothing, used when stats are disabled."""
+
+    @contextmanager
+    def phase(self, name: str):
+        """Run the block without measuring it."""
+        yield
+
+    def record_file(self, **file_stats) -> None:
+        """Ignore file numbers."""
+
+
+NULL_STATS = NullStats()
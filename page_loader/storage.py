@@ -0,0 +1,202 @@
+import hashlib
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator
+
+ENCODING_SUFFIXES = {'gzip': '.gz', 'br': '.br'}  # noqa: WPS407
+TEXT_SUFFIXES = (
+    '.html', '.css', '.js', '.mjs', '.json', '.svg', '.xml', '.txt', '.map',
+)
+GZIP_LEVEL = 6
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+READ_CHUNK_SIZE = 1024 * 1024
+NEW_FILE_MODE = 0o666
+
+
+def current_umask() -> int:
+    """Return the file mode creation mask of the process."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+FILE_MODE = NEW_FILE_MODE & ~current_umask()
+
+
+def write_chunks(chunks: Iterable[bytes], file_path: Path) -> str:
+    """Write *chunks* to *file_path* atomically.
+
+    Chunks go to a temporary file in the same directory, which replaces
+    *file_path* only after the last chunk is written. Nothing is left
+    behind if writing fails.
+    Return SHA-256 hex digest of the content.
+    """
+    temp_name, digest = write_temp_file(
+        chunks, file_path.parent, file_path.name,
+    )
+    os.replace(temp_name, file_path)
+    return digest
+
+
+def write_chunks_by_hash(
+    chunks: Iterable[bytes], store_dir: Path, suffix: str,
+) -> Path:
+    """Write *chunks* to *store_dir* under the hash of their content.
+
+    The file is named after the SHA-256 digest of the content plus *suffix*,
+    so identical content is stored once whatever url it came from.
+    Return the file path.
+    """
+    temp_name, digest = write_temp_file(chunks, store_dir, 'content')
+    file_path = store_dir / f'{digest}{suffix}'
+    move_to_store(temp_name, file_path)
+    return file_path
+
+
+def move_to_store(temp_name: str, file_path: Path) -> None:
+    """Move temporary file to *file_path* named after its content.
+
+    If the same content is already stored, the temporary file is removed.
+    """
+    if file_path.exists():
+        os.unlink(temp_name)
+    else:
+        os.replace(temp_name, file_path)
+
+
+def write_temp_file(
+    chunks: Iterable[bytes], directory: Path, name: str,
+) -> tuple:
+    """Write *chunks* to a new temporary file in *directory*.
+
+    Return tuple (temporary file name, SHA-256 hex digest of the content).
+    The file is removed if writing fails.
+    """
+    descriptor, temp_name = create_temp_file(directory, name)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(descriptor, 'wb') as temp_file:
+            for chunk in chunks:
+                digest.update(chunk)
+                temp_file.write(chunk)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+    return temp_name, digest.hexdigest()
+
+
+def create_temp_file(directory: Path, name: str) -> tuple:
+    """Create temporary file for file *name* in *directory*.
+
+    The file gets the mode open() would give it, not the private mode of
+    tempfile.mkstemp().
+    Return tuple (descriptor open for writing, temporary file name).
+    """
+    descriptor, temp_name = tempfile.mkstemp(
+        prefix=f'.{name}.', suffix='.part', dir=directory,
+    )
+    try:
+        os.chmod(temp_name, FILE_MODE)
+    except BaseException:
+        os.close(descriptor)
+        os.unlink(temp_name)
+        raise
+    return descriptor, temp_name
+
+
+def is_text_file(file_name: str) -> bool:
+    """Return True if *file_name* is a text file worth compressing."""
+    return Path(file_name).suffix.lower() in TEXT_SUFFIXES
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress *chunks* into gzip format on the fly."""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk)
+    yield compressor.flush()
+
+
+def read_stored(
+    file_path: Path, chunk_size: int = READ_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """Yield content of *file_path*, decompressed if it's stored compressed."""
+    decompress = decompressor(file_path)
+    with open(file_path, 'rb') as stored_file:
+        for chunk in iter(lambda: stored_file.read(chunk_size), b''):
+            yield decompress(chunk)
+
+
+def decompressor(file_path: Path):
+    """Return function decompressing successive chunks of *file_path*."""
+    encoding = stored_encoding(file_path)
+    if encoding is None:
+        return bytes
+    if encoding == 'gzip':
+        return zlib.decompressobj(GZIP_WBITS).decompress
+    import brotli  # noqa: WPS433
+    return brotli.Decompressor().process
+
+
+def encode_stored(
+    chunks: Iterable[bytes], file_path: Path,
+) -> Iterator[bytes]:
+    """Yield *chunks* compressed the same way as *file_path* is stored."""
+    encoding = stored_encoding(file_path)
+    if encoding is None:
+        return iter(chunks)
+    if encoding == 'gzip':
+        return gzip_chunks(chunks)
+    return brotli_chunks(chunks)
+
+
+def brotli_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress *chunks* into brotli format on the fly."""
+    import brotli  # noqa: WPS433
+    compressor = brotli.Compressor()
+    for chunk in chunks:
+        yield compressor.process(chunk)
+    yield compressor.finish()
+
+
+def stored_encoding(file_path: Path):
+    """Return content encoding of *file_path*, None if it isn't compressed."""
+    file_path = Path(file_path)
+    if servable_path(file_path) == file_path:
+        return None
+    return next(
+        encoding for encoding, suffix in ENCODING_SUFFIXES.items()
+        if suffix == file_path.suffix
+    )
+
+
+def servable_path(file_path: str) -> Path:
+    """Return path under which the file at *file_path* is served.
+
+    Files stored compressed are named like *name.css.gz* and served as
+    *name.css* with the gzip or brotli content encoding. Other files are
+    served as they are named.
+
+    >>> servable_path('files/site-com-style.css.gz').as_posix()
+    'files/site-com-style.css'
+
+    >>> servable_path('files/site-com-archive.gz').as_posix()
+    'files/site-com-archive.gz'
+    """
+    file_path = Path(file_path)
+    is_compressed = (
+        len(file_path.suffixes) > 1
+        and file_path.suffix in ENCODING_SUFFIXES.values()
+    )
+    return file_path.with_suffix('') if is_compressed else file_path
+
+
+def file_digest(file_path: Path, chunk_size: int = READ_CHUNK_SIZE) -> str:
+    """Return SHA-256 hex digest of the content of *file_path*."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as stored_file:
+        for chunk in iter(lambda: stored_file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
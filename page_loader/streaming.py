@@ -0,0 +1,193 @@
+import codecs
+from collections import deque
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from page_loader.document import DEFAULT_ENCODING, known_encoding
+from page_loader.splice import AssetScanner, replacement
+
+DEFAULT_WINDOW = 1024 * 1024
+
+
+class Segment(NamedTuple):
+    """Link whose file is being downloaded."""
+
+    original: str
+    quoted: bool
+    link: str
+    future: object
+
+
+class PageStream(object):
+    """Page written to a file while it is being downloaded.
+
+    Chunks of the page are scanned as they arrive, the files of the links
+    are submitted for download at once, and the source is written up to
+    the first link whose file is not downloaded yet. When more than
+    *window* characters wait for downloads, the oldest link is waited for,
+    so memory doesn't depend on the size of the page. Everything except
+    the replaced links is written byte for byte, as SourceDocument does.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        page_file,
+        url: str,
+        encoding: str,
+        submit,
+        collect,
+        base_dir: str,
+        asset_classes: Iterable[str] = None,
+        window: int = DEFAULT_WINDOW,
+    ):
+        """Create stream of page from *url* written to binary *page_file*.
+
+        A page in an unknown *encoding* is read as UTF-8, the bytes that
+        aren't UTF-8 are still written as they were.
+        submit - function (link) returning future of the download of the
+            file of the link.
+        collect - function (futures) returning tuple (file_paths, errors),
+            see page_loader.collect_results().
+        base_dir - the directory where the page is stored.
+        """
+        self.page_file = page_file
+        self.encoding = known_encoding(encoding) or DEFAULT_ENCODING
+        self.decoder = codecs.getincrementaldecoder(self.encoding)(
+            'surrogateescape',
+        )
+        self.scanner = AssetScanner(url, asset_classes)
+        self.submit = submit
+        self.collect = collect
+        self.base_dir = Path(base_dir).resolve()
+        self.window = window
+        self.source = ''
+        self.position = 0
+        self.pending = deque()
+        self.pending_size = 0
+        self.size = 0
+        self.file_paths = {}
+        self.errors = {}
+
+    def feed(self, chunk: bytes) -> None:
+        """Scan and write the next *chunk* of the page."""
+        self.size += len(chunk)
+        self.scan(self.decoder.decode(chunk))
+        self.queue_text(self.scanner.source_position())
+        self.scanner.forget_lines()
+        self.write_ready()
+
+    def close(self) -> None:
+        """Scan the rest of the page and write it once files are ready."""
+        self.scan(self.decoder.decode(b'', final=True))
+        self.scanner.close()
+        self.queue_links()
+        self.queue_text(self.position + len(self.source))
+        while self.pending:
+            self.write_next()
+
+    def scan(self, text: str) -> None:
+        """Scan *text* and submit downloads of the links found."""
+        self.source += text
+        self.scanner.feed_source(text)
+        self.queue_links()
+
+    def queue_links(self) -> None:
+        """Queue the links found so far behind the source before them."""
+        for span, _, link in self.scanner.take_links():
+            self.queue_text(span.start)
+            original = self.take(span.end)
+            self.pending.append(Segment(
+                original, span.quoted, link, self.submit(link),
+            ))
+            self.pending_size += len(original)
+
+    def queue_text(self, end: int) -> None:
+        """Queue the source up to position *end* that has no links."""
+        text = self.take(end)
+        if text:
+            self.pending.append(text)
+            self.pending_size += len(text)
+
+    def take(self, end: int) -> str:
+        """Remove the source up to position *end* and return it."""
+        text = self.source[:end - self.position]
+        self.source = self.source[end - self.position:]
+        self.position = end
+        return text
+
+    def write_ready(self) -> None:
+        """Write the source up to the first link that isn't downloaded.
+
+        Over the window, links are waited for.
+        """
+        while self.pending and (
+            self.pending_size > self.window or is_ready(self.pending[0])
+        ):
+            self.write_next()
+
+    def write_next(self) -> None:
+        """Write the oldest queued text or segment."""
+        segment = self.pending.popleft()
+        if isinstance(segment, str):
+            self.write(segment)
+            self.pending_size -= len(segment)
+            return
+        self.pending_size -= len(segment.original)
+        file_paths, errors = self.collect({segment.link: segment.future})
+        self.errors.update(errors)
+        if segment.link not in file_paths:
+            self.write(segment.original)
+            return
+        self.file_paths.update(file_paths)
+        self.write(replacement(
+            file_paths[segment.link], self.base_dir, segment.quoted,
+        ))
+
+    def write(self, text: str) -> None:
+        """Write *text* in the encoding of the page."""
+        self.page_file.write(text.encode(self.encoding, 'surrogateescape'))
+
+
+def is_ready(segment) -> bool:
+    """Return True if *segment* can be written without waiting."""
+    return isinstance(segment, str) or segment.future.done()
+
+
+def prefetch_links(  # noqa: WPS211
+    url: str,
+    chunks: Iterable[bytes],
+    encoding: str,
+    submit,
+    asset_classes: Iterable[str] = None,
+    asset_links: list = None,
+) -> Iterator[bytes]:
+    """Yield *chunks* of the page from *url* while scanning them for links.
+
+    submit(link) is called for every asset link as soon as its tag is
+    complete, so files are downloaded while the rest of the page is still
+    arriving. The page is decoded with *encoding*, or UTF-8 if it is not
+    known, only to find the links.
+    asset_links - list extended with tuple (span, link_attribute_name,
+        link) of every link found, spans are positions in the source as
+        SourceDocument decodes it.
+    """
+    decoder = codecs.getincrementaldecoder(
+        known_encoding(encoding) or DEFAULT_ENCODING,
+    )('surrogateescape')
+    scanner = AssetScanner(url, asset_classes)
+    for chunk in chunks:
+        scanner.feed_source(decoder.decode(chunk))
+        submit_found(scanner.take_links(), submit, asset_links)
+        scanner.forget_lines()
+        yield chunk
+    scanner.feed_source(decoder.decode(b'', final=True))
+    scanner.close()
+    submit_found(scanner.take_links(), submit, asset_links)
+
+
+def submit_found(new_links: list, submit, asset_links: list = None) -> None:
+    """Call submit(link) for *new_links*, add them to *asset_links*."""
+    for _, _, link in new_links:
+        submit(link)
+    if asset_links is not None:
+        asset_links.extend(new_links)
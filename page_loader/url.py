@@ -1,5 +1,15 @@
+import posixpath
 import re
 import urllib
+from functools import lru_cache
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}  # noqa: WPS407
+HTTP_SCHEMES = ('http', 'https')
+NAME_PATTERN = re.compile('[^a-zA-Z0-9\n]')
+SCHEME_PATTERN = re.compile('[a-zA-Z][a-zA-Z0-9+.-]*:')
+DOT_SEGMENT_PATTERN = re.compile(r'(^|/)\.\.?([/?#]|$)')
+URL_CACHE_SIZE = 4096
+RESOLVERS_CACHE_SIZE = 64
 
 
 def is_same_domain_or_subdomain(url: str, verifiable_url: str) -> bool:
@@ -24,16 +34,16 @@ def is_same_domain_or_subdomain(url: str, verifiable_url: str) -> bool:
     >>> is_same_domain_or_subdomain(\
         'http://sub.host.com/any/path/', 'http://other-host.com/other/path')
     False
+
+    >>> is_same_domain_or_subdomain(\
+        'http://sub.host.com/any/path/', '//cdn.other.com/image.png')
+    False
     """
-    if not verifiable_url.startswith('http'):
-        return True
-    parsed_url = urllib.parse.urlparse(url)
-    parsed_verifiable_url = urllib.parse.urlparse(verifiable_url)
-    return parsed_verifiable_url.netloc.endswith(parsed_url.netloc)
+    return url_resolver(url).is_same_domain(verifiable_url)
 
 
 def relative_url_to_absolute(url: str, parent_url: str) -> str:
-    """Convert relative url to absulute.
+    """Convert relative url to absolute the way browsers do.
 
     >>> relative_url_to_absolute(\
         '/image/image1.png', parent_url='http://example.com/path')
@@ -41,36 +51,49 @@ def relative_url_to_absolute(url: str, parent_url: str) -> str:
 
     >>> relative_url_to_absolute(\
         '../../image/image1.png', parent_url='http://example.com/p1/p2/p3')
-    'http://example.com/p1/image/image1.png'
+    'http://example.com/image/image1.png'
 
     >>> relative_url_to_absolute(\
-        'image/image1.png', parent_url='http://example.com/p1/p2')
+        'image/image1.png', parent_url='http://example.com/p1/p2/')
     'http://example.com/p1/p2/image/image1.png'
 
     >>> relative_url_to_absolute(\
-        '/image/image1.png', parent_url='example.com/path')
-    'https://example.com/image/image1.png'
+        './image1.png?size=2', parent_url='http://example.com/p1/p2')
+    'http://example.com/p1/image1.png?size=2'
+
+    >>> relative_url_to_absolute(\
+        '//cdn.example.com/image1.png', parent_url='https://example.com/p1')
+    'https://cdn.example.com/image1.png'
     """
-    if parent_url.endswith('.html'):
-        parent_url, *_ = parent_url.rsplit('/', 1)
-        parent_url = f'{parent_url}/'
-    parsed_parent_url = urllib.parse.urlparse(parent_url)
-    if url.startswith('/'):
-        scheme = parsed_parent_url.scheme
-        netloc = parsed_parent_url.netloc
-        absolute_url = f'{scheme}://{netloc}{url}'
-    elif url.startswith('..'):
-        new_parent_url = parent_url.rstrip('/').rpartition('/')[0]
-        new_parent_url = f'{new_parent_url}/'
-        new_url = url.partition('../')[2]
-        absolute_url = relative_url_to_absolute(
-            new_url, new_parent_url,
-        )
-    elif url.startswith('http'):
-        absolute_url = url
-    else:
-        absolute_url = f'{parent_url}{url}'
-    return absolute_url
+    return url_resolver(parent_url).absolute(url)
+
+
+def canonical_url(url: str) -> str:
+    """Return absolute *url* in canonical form.
+
+    Spellings of the same url give the same string: scheme and host are
+    lowercased, default port, dot segments and fragment are removed.
+
+    >>> canonical_url('HTTPS://Sub.Example.com:443/a/./b/../c.png#top')
+    'https://sub.example.com/a/c.png'
+
+    >>> canonical_url('http://example.com/path/../to/?q=1')
+    'http://example.com/to/?q=1'
+
+    >>> canonical_url('http://example.com')
+    'http://example.com/'
+    """
+    parsed_url = urllib.parse.urlsplit(url)
+    scheme = parsed_url.scheme.lower()
+    netloc = parsed_url.netloc.lower()
+    if parsed_url.port and parsed_url.port == DEFAULT_PORTS.get(scheme):
+        netloc = netloc.rpartition(':')[0]
+    path = posixpath.normpath(parsed_url.path or '/')
+    if parsed_url.path.endswith(('/', '/.', '/..')) and path != '/':
+        path = f'{path}/'
+    return urllib.parse.urlunsplit(
+        (scheme, netloc, path, parsed_url.query, ''),
+    )
 
 
 def url_to_name(url: str, extension=None) -> str:
@@ -84,7 +107,79 @@ def url_to_name(url: str, extension=None) -> str:
         domain=parsed_url.netloc,
         path=path.rstrip('/'),
     )
-    file_name = re.sub('[^a-zA-Z0-9\n]', '-', domain_and_path)
+    file_name = NAME_PATTERN.sub('-', domain_and_path)
     extension_from_path = f'.{other[0]}' if other else '.html'
     suffix = extension if extension else extension_from_path
     return f'{file_name}{suffix}'
+
+
+class UrlResolver(object):
+    """Resolver of links found on the page downloaded from *base_url*.
+
+    The base url is parsed once. Absolute urls, canonical urls, domain
+    checks and file names of links are memoized in LRU caches of up to
+    *cache_size* entries each, so repeated links cost a dict lookup.
+    """
+
+    def __init__(self, base_url: str, cache_size: int = URL_CACHE_SIZE):
+        """Create resolver of links relative to *base_url*."""
+        parsed_url = urllib.parse.urlsplit(base_url)
+        self.base_url = base_url
+        self.scheme = parsed_url.scheme
+        self.hostname = parsed_url.hostname or ''
+        self.origin = f'{parsed_url.scheme}://{parsed_url.netloc}'
+        self.base_dir = '{origin}{path}/'.format(
+            origin=self.origin, path=parsed_url.path.rpartition('/')[0],
+        )
+        memoize = lru_cache(maxsize=cache_size)
+        self.absolute = memoize(self.absolute)
+        self.canonical = memoize(self.canonical)
+        self.is_same_domain = memoize(self.is_same_domain)
+        self.name = memoize(self.name)
+
+    def absolute(self, link: str) -> str:
+        """Return absolute url of *link*, resolved like urljoin() does.
+
+        Common links are joined to the parsed base url directly, links
+        with dot segments, bare queries or fragments go through urljoin().
+        """
+        if link.startswith('//'):
+            return f'{self.scheme}:{link}'
+        if SCHEME_PATTERN.match(link):
+            return link
+        if not link or link[0] in '?#' or DOT_SEGMENT_PATTERN.search(link):
+            return urllib.parse.urljoin(self.base_url, link)
+        prefix = self.origin if link.startswith('/') else self.base_dir
+        return f'{prefix}{link}'
+
+    def canonical(self, link: str) -> str:
+        """Return canonical absolute url of *link*."""
+        return canonical_url(self.absolute(link))
+
+    def is_same_domain(self, link: str) -> bool:
+        """Return True if *link* is an http(s) url of the domain or subdomain.
+
+        Protocol-relative links are checked against their own host, links
+        of other schemes (data:, mailto:) are never the same domain.
+        """
+        parsed_link = urllib.parse.urlsplit(self.absolute(link))
+        if parsed_link.scheme not in HTTP_SCHEMES:
+            return False
+        hostname = parsed_link.hostname or ''
+        return hostname == self.hostname or hostname.endswith(
+            f'.{self.hostname}',
+        )
+
+    def name(self, link: str, extension=None) -> str:
+        """Return url_to_name() of the absolute url of *link*."""
+        return url_to_name(self.absolute(link), extension)
+
+
+@lru_cache(maxsize=RESOLVERS_CACHE_SIZE)
+def url_resolver(base_url: str) -> UrlResolver:
+    """Return shared UrlResolver of *base_url*.
+
+    Functions called for the same page get the same resolver and reuse
+    its memoized results.
+    """
+    return UrlResolver(base_url)
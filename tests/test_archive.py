@@ -0,0 +1,159 @@
+import email
+import tarfile
+import threading
+
+import pytest
+
+from page_loader import download_archive
+from page_loader.archive import (
+    ARCHIVES,
+    TarArchive,
+    read_index,
+    read_resource,
+)
+
+page_url = 'https://sub1.example.com/page'
+page = (
+    '<html><head><link rel="stylesheet" href="/files/style.css"></head>'
+    '<body><img src="/files/a.png"></body></html>'
+)
+style = b'body { background: url("b.png"); }'
+images = {
+    'https://sub1.example.com/files/a.png': b'\x89PNG' + bytes(range(256)) * 4,
+    'https://sub1.example.com/files/b.png': b'b' * 100,
+}
+
+
+@pytest.fixture
+def site_mocks(requests_mock):
+    """Mock the page, its stylesheet and images."""
+    requests_mock.get(
+        page_url, text=page, headers={'Content-Type': 'text/html'},
+    )
+    requests_mock.get(
+        'https://sub1.example.com/files/style.css',
+        content=style,
+        headers={'Content-Type': 'text/css'},
+    )
+    for url, content in images.items():
+        requests_mock.get(
+            url, content=content, headers={'Content-Type': 'image/png'},
+        )
+
+
+@pytest.mark.parametrize('archive_format', list(ARCHIVES))
+def test_resources_are_read_back_by_index(
+    archive_format, tmp_path, site_mocks,
+):
+    """Test that every resource is found in the archive by its index."""
+    archive_path = download_archive(
+        page_url, tmp_path, archive_format=archive_format, workers=2,
+    )
+    assert archive_path == str(
+        tmp_path / f'sub1-example-com-page.{archive_format}',
+    )
+    assert sorted(read_index(archive_path)) == sorted([
+        page_url, 'https://sub1.example.com/files/style.css', *images,
+    ])
+    for url, content in images.items():
+        assert read_resource(archive_path, url) == content
+    entry = read_index(archive_path)[page_url]
+    assert entry.content_type == 'text/html'
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        f'sub1-example-com-page.{archive_format}',
+        f'sub1-example-com-page.{archive_format}.idx',
+    ]
+
+
+def test_tar_holds_page_with_local_links(tmp_path, site_mocks):
+    """Test that the tar is laid out as a downloaded page directory."""
+    archive_path = download_archive(page_url, tmp_path, archive_format='tar')
+    with tarfile.open(archive_path) as tar:
+        assert sorted(tar.getnames()) == [
+            'sub1-example-com-page.html',
+            'sub1-example-com-page_files/sub1-example-com-files-a.png',
+            'sub1-example-com-page_files/sub1-example-com-files-b.png',
+            'sub1-example-com-page_files/sub1-example-com-files-style.css',
+        ]
+        saved_page = tar.extractfile('sub1-example-com-page.html').read()
+        stylesheet = tar.extractfile(
+            'sub1-example-com-page_files/sub1-example-com-files-style.css',
+        ).read()
+    assert b'sub1-example-com-page_files/sub1-example-com-files-a.png' in (
+        saved_page
+    )
+    assert stylesheet == style
+
+
+def test_warc_records_have_exact_lengths(tmp_path, site_mocks):
+    """Test that Content-Length of the WARC records is patched in."""
+    archive_path = download_archive(page_url, tmp_path, archive_format='warc')
+    with open(archive_path, 'rb') as warc_file:
+        warc = warc_file.read()
+    for entry in read_index(archive_path).values():
+        header = warc[entry.record_offset:entry.offset].decode()
+        assert header.startswith('WARC/1.1\r\nWARC-Type: resource\r\n')
+        assert f'WARC-Target-URI: {entry.url}\r\n' in header
+        assert f'sha256:{entry.sha256}\r\n' in header
+        length = header.split('Content-Length: ')[1].split('\r\n')[0]
+        assert int(length) == entry.length
+        assert warc[entry.offset + entry.length:].startswith(b'\r\n\r\n')
+
+
+def test_mhtml_is_a_multipart_message(tmp_path, site_mocks):
+    """Test that the MHTML file parses as multipart/related."""
+    archive_path = download_archive(page_url, tmp_path, archive_format='mhtml')
+    with open(archive_path, 'rb') as mhtml_file:
+        message = email.message_from_binary_file(mhtml_file)
+    assert message.get_content_type() == 'multipart/related'
+    parts = {
+        part['Content-Location']: part.get_payload(decode=True)
+        for part in message.get_payload()
+    }
+    assert parts[page_url] == page.encode()
+    assert parts['https://sub1.example.com/files/style.css'] == style
+    for url, content in images.items():
+        assert parts[url] == content
+
+
+@pytest.mark.parametrize('archive_format', list(ARCHIVES))
+def test_page_with_unknown_charset(
+    archive_format, tmp_path, site_mocks, requests_mock,
+):
+    """Test that a page in an unknown charset is archived with its files."""
+    requests_mock.get(
+        page_url,
+        text=page,
+        headers={'Content-Type': 'text/html; charset=x-unknown'},
+    )
+    archive_path = download_archive(
+        page_url, tmp_path, archive_format=archive_format,
+    )
+    for url, content in images.items():
+        assert read_resource(archive_path, url) == content
+
+
+def test_slow_body_does_not_block_other_records(tmp_path):
+    """Test that the archive isn't locked while a body is arriving."""
+    started, arrived = threading.Event(), threading.Event()
+    threading.Timer(5, arrived.set).start()
+
+    def slow_chunks():
+        yield b'slow'
+        started.set()
+        arrived.wait()
+        yield b' body'
+
+    archive_path = tmp_path / 'page.tar'
+    with TarArchive(archive_path, tmp_path, page_url) as archive:
+        slow_add = threading.Thread(
+            target=archive.add, args=(page_url, None, slow_chunks(), 'slow'),
+        )
+        slow_add.start()
+        started.wait()
+        archive.add(page_url, None, [b'fast'], 'fast')
+        arrived.set()
+        slow_add.join()
+    with tarfile.open(archive_path) as tar:
+        assert tar.getnames() == ['fast', 'slow']
+        assert tar.extractfile('slow').read() == b'slow body'
@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import bs4
+import pytest
+
+from page_loader.assets import (
+    PARSERS,
+    find_asset_links,
+    parse_html,
+    replace_asset_links,
+    resolve_parser,
+)
+
+fixtures_path = Path('tests/fixtures/')
+page_url = 'https://sub1.example.com/path/to/file.html'
+
+
+def test_find_asset_links():
+    """Test that same domain links of all tag kinds are found in one walk."""
+    soup = parse_html((fixtures_path / 'original_file.html').read_text())
+    links = [link for _, _, link in find_asset_links(soup, page_url)]
+    assert links == [
+        '/assets/file1.css',
+        'assets/file2.css',
+        '../assets/file3.css',
+        'file4.html',
+        '/courses',
+        'https://sub1.example.com/assets/file5.css',
+        'http://sub2.sub1.example.com/path/assets/file6.css',
+        '/images/image1.png',
+        '_images/image2.png',
+        '../images/image3.png',
+        'https://sub1.example.com/images/image4.jpg',
+        'https://sub2.sub1.example.com/path/images/image5.png',
+        '/static/script1.js',
+        '_static/script2.js',
+        '../static/script3.js',
+        'https://sub1.example.com/static/script4.js',
+        'https://sub2.sub1.example.com/path/static/script5.js',
+    ]
+
+
+def test_replace_asset_links(tmp_path):
+    """Test that found tags are rewritten in place."""
+    soup = parse_html('<img src="/a.png"><img src="/b.png">')
+    asset_links = find_asset_links(soup, page_url)
+    files_dir = tmp_path / 'page_files'
+    replace_asset_links(
+        asset_links, {'/a.png': str(files_dir / 'a.png')}, str(tmp_path),
+    )
+    assert str(soup) == '<img src="page_files/a.png"/><img src="/b.png"/>'
+
+
+@pytest.mark.parametrize('parser', PARSERS)
+def test_parsers_give_same_results(parser, tmp_path):
+    """Test that every parser backend finds and rewrites the same links."""
+    html = (fixtures_path / 'original_file.html').read_text()
+    expected_soup = parse_html(html)
+    soup = parse_html(html, parser)
+    expected_links = find_asset_links(expected_soup, page_url)
+    asset_links = find_asset_links(soup, page_url)
+    assert [link for _, _, link in asset_links] == [
+        link for _, _, link in expected_links
+    ]
+    local_paths = {
+        link: str(tmp_path / 'files' / f'{index}.png')
+        for index, (_, _, link) in enumerate(asset_links)
+    }
+    replace_asset_links(expected_links, local_paths, tmp_path)
+    replace_asset_links(asset_links, local_paths, tmp_path)
+    assert soup.prettify() == expected_soup.prettify()
+
+
+def test_missing_parser_falls_back(monkeypatch):
+    """Test that a parser that is not installed is replaced."""
+    monkeypatch.setattr(
+        bs4.builder.builder_registry, 'lookup', lambda *features: None,
+    )
+    resolve_parser.cache_clear()
+    assert resolve_parser('lxml') == 'html.parser'
+    resolve_parser.cache_clear()
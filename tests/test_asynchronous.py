@@ -0,0 +1,145 @@
+import asyncio
+import stat
+import threading
+from pathlib import Path
+
+import pytest
+
+from page_loader.asynchronous import async_download
+
+httpx = pytest.importorskip('httpx')
+
+fixtures_path = Path('tests/fixtures/')
+page_url = 'https://sub1.example.com/path/to/file.html'
+
+
+def make_client(responses: dict, requested_urls: list):
+    """Create async client answering from *responses* by url."""
+    def handler(request):
+        requested_urls.append(str(request.url))
+        status_code, content = responses.get(str(request.url), (404, b''))
+        return httpx.Response(status_code, content=content)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_async_download(tmp_path):
+    """Test that async_download() saves the same page as download()."""
+    image_urls = [
+        'https://sub1.example.com/images/image1.png',
+        'https://sub1.example.com/path/to/_images/image2.png',
+        'https://sub1.example.com/path/images/image3.png',
+        'https://sub1.example.com/images/image4.jpg',
+        'https://sub2.sub1.example.com/path/images/image5.png',
+    ]
+    responses = {url: (200, b'image') for url in image_urls}
+    responses[page_url] = (
+        200, (fixtures_path / 'original_file.html').read_bytes(),
+    )
+    requested_urls = []
+    client = make_client(responses, requested_urls)
+    file_path = Path(asyncio.run(async_download(page_url, tmp_path, client)))
+    files_dir = tmp_path / 'sub1-example-com-path-to-file_files'
+    assert file_path == (tmp_path / 'sub1-example-com-path-to-file.html')
+    assert (files_dir / 'sub1-example-com-images-image1.png').read_bytes() == (
+        b'image'
+    )
+    page = file_path.read_text()
+    assert 'src="https://example.com/images/image6.png"' in page
+    assert (
+        'src="sub1-example-com-path-to-file_files/'
+        'sub1-example-com-images-image4.jpg"'
+    ) in page
+    assert 'href="/assets/file1.css"' in page
+    assert len(requested_urls) == len(set(requested_urls))
+
+
+def test_async_download_limits_concurrency_per_host(tmp_path):
+    """Test that no more than per_host files are fetched from one host."""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handler(request):
+        nonlocal in_flight, max_in_flight
+        if request.url.path == '/page':
+            images = ''.join(f'<img src="/{index}.png">' for index in range(8))
+            return httpx.Response(200, text=images)
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, content=b'image')
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    asyncio.run(async_download(
+        'https://sub1.example.com/page', tmp_path, client, per_host=2,
+    ))
+    assert max_in_flight == 2
+    files_dir = tmp_path / 'sub1-example-com-page_files'
+    assert len(list(files_dir.iterdir())) == 8
+
+
+def test_async_download_busy_host_does_not_block_others(tmp_path):
+    """Test that files waiting for their host don't take a worker."""
+    other_host_started = asyncio.Event()
+
+    async def handler(request):
+        if request.url.path == '/page':
+            return httpx.Response(200, text=(
+                '<img src="/a1.png"><img src="/a2.png">'
+                '<img src="https://sub2.sub1.example.com/b.png">'
+            ))
+        if request.url.host == 'sub2.sub1.example.com':
+            other_host_started.set()
+        else:
+            await other_host_started.wait()
+        return httpx.Response(200, content=b'image')
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    asyncio.run(asyncio.wait_for(async_download(
+        'https://sub1.example.com/page',
+        tmp_path,
+        client,
+        workers=2,
+        per_host=1,
+    ), timeout=5))
+    files_dir = tmp_path / 'sub1-example-com-page_files'
+    assert len(list(files_dir.iterdir())) == 3
+
+
+def test_async_download_parses_in_executor(tmp_path, monkeypatch):
+    """Test that the page is parsed and rendered outside the event loop."""
+    from page_loader import asynchronous  # noqa: WPS433
+
+    threads = []
+
+    def record_thread(function):
+        def wrapper(*args):
+            threads.append(threading.current_thread())
+            return function(*args)
+        return wrapper
+
+    for name in ('find_asset_links', 'replace_asset_links'):
+        monkeypatch.setattr(
+            asynchronous, name, record_thread(getattr(asynchronous, name)),
+        )
+    client = make_client({page_url: (200, b'<img src="/a.png">')}, [])
+    asyncio.run(async_download(page_url, tmp_path, client))
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+
+def test_async_download_file_mode(tmp_path):
+    """Test that files get the same mode as the page."""
+    client = make_client({
+        page_url: (200, b'<img src="/a.png">'),
+        'https://sub1.example.com/a.png': (200, b'image'),
+    }, [])
+    file_path = Path(asyncio.run(async_download(page_url, tmp_path, client)))
+    image_path = (
+        tmp_path / 'sub1-example-com-path-to-file_files'
+        / 'sub1-example-com-a.png'
+    )
+    assert stat.S_IMODE(image_path.stat().st_mode) == stat.S_IMODE(
+        file_path.stat().st_mode,
+    )
@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+import requests
+
+from page_loader import document
+from page_loader.batch import download_batch, load_page, read_urls
+from page_loader.pool import PooledDocument
+
+
+def test_read_urls():
+    """Test that blank lines and comments are skipped."""
+    lines = ['https://a.com\n', '\n', '# comment\n', '  https://b.com  \n']
+    assert list(read_urls(lines)) == ['https://a.com', 'https://b.com']
+
+
+def test_download_batch(tmp_path, requests_mock):
+    """Test that results are yielded per url in order."""
+    urls = [f'https://sub1.example.com/page{index}' for index in range(5)]
+    for url in urls:
+        requests_mock.get(url, text='<img src="/shared.png"/>')
+    requests_mock.get('https://sub1.example.com/shared.png', content=b'img')
+    requests_mock.get(
+        'https://sub1.example.com/broken', exc=requests.ConnectionError,
+    )
+    page_results = list(download_batch(
+        [*urls, 'https://sub1.example.com/broken'], tmp_path, page_workers=3,
+    ))
+    assert [page_result.url for page_result in page_results] == [
+        *urls, 'https://sub1.example.com/broken',
+    ]
+    first_result = page_results[0].to_dict()
+    assert first_result['path'] == str(
+        (tmp_path / 'sub1-example-com-page0.html').resolve(),
+    )
+    assert first_result['assets'] == 1
+    assert first_result['bytes'] == len('<img src="/shared.png"/>img')
+    assert first_result['errors'] == {}
+    assert Path(first_result['path']).exists()
+    broken_result = page_results[-1].to_dict()
+    assert broken_result['path'] is None
+    assert list(broken_result['errors']) == [
+        'https://sub1.example.com/broken',
+    ]
+
+
+def test_page_decoding_error_is_returned(tmp_path):
+    """Test that a page that can't be decoded doesn't stop the batch."""
+    def download_function(url, output_path, **kwargs):  # noqa: WPS430
+        raise LookupError('unknown encoding: x-unknown')
+
+    page_result = load_page(
+        'https://sub1.example.com/page',
+        tmp_path,
+        download_function=download_function,
+    )
+    assert page_result.path is None
+    assert list(page_result.errors) == ['https://sub1.example.com/page']
+
+
+def test_download_batch_with_stats(tmp_path, requests_mock):
+    """Test that every result has its own stats report."""
+    urls = ['https://sub1.example.com/page1', 'https://sub1.example.com/page2']
+    for url in urls:
+        requests_mock.get(url, text='<img src="/a.png"/>')
+    requests_mock.get('https://sub1.example.com/a.png', content=b'img')
+    events = []
+    page_results = download_batch(
+        urls,
+        tmp_path,
+        stats=True,
+        hooks=[lambda event, data: events.append(event)],
+    )
+    reports = [page_result.to_dict()['stats'] for page_result in page_results]
+    assert [len(report['files']) for report in reports] == [1, 1]
+    assert events.count('file') == 2
+
+
+@pytest.mark.parametrize('rewrite', ['prettify', 'splice'])
+def test_download_batch_in_processes(rewrite, tmp_path, requests_mock):
+    """Test that pages rendered in a process pool are saved the same."""
+    urls = [f'https://sub1.example.com/page{index}' for index in range(3)]
+    for url in urls:
+        requests_mock.get(
+            url, text='<p>text</p>\n<img src="/a.png"><img src=/b.png>',
+        )
+    requests_mock.get('https://sub1.example.com/a.png', content=b'a')
+    requests_mock.get('https://sub1.example.com/b.png', content=b'b')
+    pages = {}
+    for processes in (0, 2):
+        output_path = tmp_path / str(processes)
+        output_path.mkdir()
+        pages[processes] = [
+            Path(page_result.path).read_text()
+            for page_result in download_batch(
+                urls,
+                output_path,
+                page_workers=3,
+                rewrite=rewrite,
+                processes=processes,
+            )
+        ]
+    assert pages[2] == pages[0]
+    assert 'sub1-example-com-page0_files/sub1-example-com-b.png' in (
+        pages[2][0]
+    )
+
+
+def test_pooled_soup_document_is_parsed_once(tmp_path, monkeypatch):
+    """Test that a pooled soup document is only parsed when rendered."""
+    parses = []
+    parse_html = document.parse_html
+    monkeypatch.setattr(
+        document,
+        'parse_html',
+        lambda *args: parses.append(args) or parse_html(*args),
+    )
+    image_path = tmp_path / 'a.png'
+    with ThreadPoolExecutor() as executor:
+        pooled = PooledDocument(
+            executor,
+            document.document_factory('prettify', asset_classes=['image']),
+            b'<img src="/a.png"><script src="/a.js"></script>',
+            'utf-8',
+            'https://sub1.example.com/page',
+        )
+        assert [link for _, _, link in pooled.asset_links] == ['/a.png']
+        assert not parses
+        pooled.rewrite({'/a.png': str(image_path)}, tmp_path)
+        assert b'src="a.png"' in pooled.render()
+    assert len(parses) == 1
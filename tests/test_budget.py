@@ -0,0 +1,146 @@
+import time
+
+import pytest
+import requests
+
+from page_loader.batch import download_batch
+from page_loader.budget import Budget
+
+page_url = 'https://sub1.example.com/page'
+files_url = 'https://sub1.example.com/files'
+page = (
+    '<img src="/files/a.png">'
+    '<img src="/files/b.png">'
+    '<script src="/files/c.js"></script>'
+)
+
+
+def download_with(budget: Budget, tmp_path, cache_dir=None):
+    """Return PageResult and saved page downloaded within *budget*."""
+    page_result, = download_batch(
+        [page_url], tmp_path, budget=budget, cache_dir=cache_dir,
+    )
+    with open(page_result.path) as page_file:
+        return page_result, page_file.read()
+
+
+def test_files_over_budget_keep_links(tmp_path, requests_mock):
+    """Test that files over size and type limits are skipped."""
+    requests_mock.get(page_url, text=page)
+    requests_mock.get(
+        f'{files_url}/a.png',
+        content=b'a' * 10,
+        headers={'Content-Type': 'image/png', 'Content-Length': '10'},
+    )
+    requests_mock.get(
+        f'{files_url}/b.png',
+        content=b'b' * 4,
+        headers={'Content-Type': 'image/png'},
+    )
+    requests_mock.get(
+        f'{files_url}/c.js',
+        content=b'c',
+        headers={'Content-Type': 'text/javascript; charset=utf-8'},
+    )
+    page_result, saved_page = download_with(
+        Budget(max_file_bytes=5, deny_types=('text/*',)), tmp_path,
+    )
+    assert list(page_result.file_paths) == ['/files/b.png']
+    assert page_result.errors == {}
+    assert page_result.to_dict()['skipped'] == {
+        '/files/a.png': 'file is larger than 5 bytes',
+        '/files/c.js': 'type text/javascript is not allowed',
+    }
+    assert 'src="/files/a.png"' in saved_page
+    assert 'src="/files/c.js"' in saved_page
+    assert 'src="/files/b.png"' not in saved_page
+
+
+def test_page_budget_is_enforced_while_streaming(tmp_path, requests_mock):
+    """Test that files without Content-Length are cut by the page budget."""
+    requests_mock.get(page_url, text=page)
+    for name in ('a.png', 'b.png', 'c.js'):
+        requests_mock.get(f'{files_url}/{name}', content=b'x' * 4)
+    page_result, _ = download_with(
+        Budget(max_page_bytes=10, allow_types=('application/*',)), tmp_path,
+    )
+    assert list(page_result.file_paths) == ['/files/a.png', '/files/b.png']
+    assert list(page_result.skipped) == ['/files/c.js']
+    files_dir = tmp_path / 'sub1-example-com-page_files'
+    assert sorted(path.name for path in files_dir.iterdir()) == [
+        'sub1-example-com-files-a.png', 'sub1-example-com-files-b.png',
+    ]
+
+
+def test_cache_is_filled_within_budget(tmp_path, requests_mock):
+    """Test that the cache doesn't store or serve files over budget."""
+    requests_mock.get(page_url, text=page)
+    requests_mock.get(
+        f'{files_url}/a.png',
+        content=b'a' * 100,
+        headers={'Content-Type': 'image/png'},
+    )
+    requests_mock.get(
+        f'{files_url}/b.png',
+        content=b'b',
+        headers={'Content-Type': 'image/png', 'Cache-Control': 'max-age=60'},
+    )
+    requests_mock.get(f'{files_url}/c.js', status_code=404)
+    cache_dir = tmp_path / 'cache'
+    page_result, _ = download_with(
+        Budget(max_file_bytes=10), tmp_path, cache_dir,
+    )
+    assert list(page_result.file_paths) == ['/files/b.png']
+    assert list(page_result.skipped) == ['/files/a.png']
+    assert [path.stat().st_size for path in cache_dir.glob('*.body')] == [1]
+    page_result, _ = download_with(
+        Budget(deny_types=('image/*',)), tmp_path, cache_dir,
+    )
+    assert page_result.to_dict()['skipped'] == {
+        '/files/a.png': 'type image/png is not allowed',
+        '/files/b.png': 'type image/png is not allowed',
+    }
+
+
+def test_deadline_and_timeouts(tmp_path, requests_mock):
+    """Test that no file is downloaded after the deadline."""
+    requests_mock.get(page_url, text=page)
+
+    def slow_body(request, context):
+        time.sleep(0.2)
+        return b'slow'
+
+    requests_mock.get(f'{files_url}/a.png', content=slow_body)
+    requests_mock.get(f'{files_url}/b.png', content=b'b')
+    requests_mock.get(f'{files_url}/c.js', content=b'c')
+    page_result, _ = download_with(
+        Budget(connect_timeout=1, read_timeout=2, deadline=0.1), tmp_path,
+    )
+    assert page_result.file_paths == {}
+    assert set(page_result.skipped) == {
+        '/files/a.png', '/files/b.png', '/files/c.js',
+    }
+    page_request, file_request = requests_mock.request_history
+    for request in (page_request, file_request):
+        connect_timeout, read_timeout = request.timeout
+        assert connect_timeout == 1
+        assert 0 < read_timeout <= 0.1
+
+
+def test_failed_file_is_given_back_to_the_page():
+    """Test that bytes of a file that failed halfway aren't counted."""
+    page_budget = Budget(max_page_bytes=100).start()
+
+    def broken_chunks():
+        yield b'a' * 30
+        yield b'a' * 30
+        raise requests.ConnectionError('connection lost')
+
+    with pytest.raises(requests.ConnectionError):
+        list(page_budget.limit(broken_chunks()))
+    assert page_budget.bytes_used == 0
+    stopped = page_budget.limit(iter([b'b' * 30, b'b' * 30]))
+    next(stopped)
+    stopped.close()
+    assert page_budget.bytes_used == 0
+    assert list(page_budget.limit(iter([b'c' * 60]))) == [b'c' * 60]
@@ -0,0 +1,82 @@
+import requests
+
+from page_loader.cache import HttpCache
+
+file_url = 'https://sub1.example.com/images/a.png'
+
+
+def read_cached(cache, url):
+    """Return body of *url* provided by *cache*."""
+    with cache.open_stream(url, requests.Session()) as file_stream:
+        return b''.join(file_stream.chunks)
+
+
+def test_cache_revalidates_with_etag(tmp_path, requests_mock):
+    """Test that the cached body is reused when the server answers 304."""
+    file_mock = requests_mock.get(
+        file_url,
+        [
+            {'content': b'image', 'headers': {'ETag': '"v1"'}},
+            {'status_code': 304},
+        ],
+    )
+    cache = HttpCache(tmp_path)
+    assert read_cached(cache, file_url) == b'image'
+    assert read_cached(cache, file_url) == b'image'
+    assert file_mock.call_count == 2
+    assert file_mock.last_request.headers['If-None-Match'] == '"v1"'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_reuses_fresh_body(tmp_path, requests_mock):
+    """Test that a fresh cached body is used without a request."""
+    file_mock = requests_mock.get(
+        file_url,
+        content=b'image',
+        headers={'Cache-Control': 'public, max-age=3600'},
+    )
+    read_cached(HttpCache(tmp_path), file_url)
+    assert read_cached(HttpCache(tmp_path), file_url) == b'image'
+    assert file_mock.call_count == 1
+
+
+def test_cache_downloads_modified_body(tmp_path, requests_mock):
+    """Test that a changed file replaces the cached body."""
+    requests_mock.get(
+        file_url,
+        [
+            {'content': b'old', 'headers': {'Last-Modified': 'yesterday'}},
+            {'content': b'new'},
+        ],
+    )
+    cache = HttpCache(tmp_path)
+    read_cached(cache, file_url)
+    assert read_cached(cache, file_url) == b'new'
+    assert requests_mock.last_request.headers['If-Modified-Since'] == (
+        'yesterday'
+    )
+
+
+def test_cache_evicts_least_recently_used(tmp_path, requests_mock):
+    """Test that the cache size is bounded."""
+    urls = [f'https://sub1.example.com/{index}.png' for index in range(3)]
+    for url in urls:
+        requests_mock.get(url, content=b'12345')
+    cache = HttpCache(tmp_path, max_size=10)
+    for url in urls:
+        read_cached(cache, url)
+    assert cache.read_metadata(cache.key(urls[0])) is None
+    assert cache.read_metadata(cache.key(urls[1])) is not None
+    assert cache.read_metadata(cache.key(urls[2])) is not None
+
+
+def test_cache_serves_entry_larger_than_cache(tmp_path, requests_mock):
+    """Test that an entry over the cache size is served, then evicted."""
+    large_url = 'https://sub1.example.com/large.png'
+    requests_mock.get(large_url, content=b'x' * 100)
+    requests_mock.get(file_url, content=b'12345')
+    cache = HttpCache(tmp_path, max_size=10)
+    assert read_cached(cache, large_url) == b'x' * 100
+    assert read_cached(cache, file_url) == b'12345'
+    assert cache.read_metadata(cache.key(large_url)) is None
+    assert cache.read_metadata(cache.key(file_url)) is not None
@@ -0,0 +1,124 @@
+from pathlib import Path
+
+import pytest
+import requests
+
+from page_loader.crawler import NotHtmlPage, crawl
+
+site_url = 'https://sub1.example.com'
+pages = {  # noqa: WPS407
+    '/': (
+        '<a href="/a">a</a><a href="b.html#part">b</a>'
+        '<a href="https://other.com/">other</a><img src="/logo.png"/>'
+    ),
+    '/a': '<a href="/">home</a><a href="/a/deep">deep</a>'
+          '<img src="/logo.png"/>',
+    '/b.html': '<img src="logo.png"/>',
+    '/a/deep': '<a href="/a/deeper">deeper</a>',
+}
+
+
+def mock_site(requests_mock):
+    """Mock pages of the site and return mock of the shared image."""
+    for path, text in pages.items():
+        requests_mock.get(f'{site_url}{path}', text=text)
+    return requests_mock.get(f'{site_url}/logo.png', content=b'logo')
+
+
+def test_crawl(tmp_path, requests_mock):
+    """Test that linked pages are saved and links point to local copies."""
+    logo_mock = mock_site(requests_mock)
+    saved_paths = crawl(f'{site_url}/', tmp_path, depth=1, workers=4)
+    assert [Path(path).name for path in saved_paths] == [
+        'sub1-example-com.html',
+        'sub1-example-com-a.html',
+        'sub1-example-com-b.html',
+    ]
+    assert logo_mock.call_count == 1
+    files_dir = tmp_path / 'sub1-example-com_files'
+    assert [path.name for path in files_dir.iterdir()] == [
+        'sub1-example-com-logo.png',
+    ]
+    start_page = Path(saved_paths[0]).read_text()
+    assert 'href="sub1-example-com-a.html"' in start_page
+    assert 'href="sub1-example-com-b.html#part"' in start_page
+    assert 'href="https://other.com/"' in start_page
+    a_page = Path(saved_paths[1]).read_text()
+    assert 'href="sub1-example-com.html"' in a_page
+    assert 'href="/a/deep"' in a_page
+    assert 'src="sub1-example-com_files/sub1-example-com-logo.png"' in a_page
+
+
+def test_crawl_max_pages(tmp_path, requests_mock):
+    """Test that no more than max_pages pages are saved."""
+    mock_site(requests_mock)
+    saved_paths = crawl(f'{site_url}/', tmp_path, depth=5, max_pages=2)
+    assert [Path(path).name for path in saved_paths] == [
+        'sub1-example-com.html',
+        'sub1-example-com-a.html',
+    ]
+    start_page = Path(saved_paths[0]).read_text()
+    assert 'href="b.html#part"' in start_page
+
+
+def test_crawl_keeps_links_to_pages_not_saved(tmp_path, requests_mock):
+    """Test that failed and non-html pages aren't linked to local copies."""
+    requests_mock.get(f'{site_url}/', text=(
+        '<a href="/doc.pdf">doc</a><a href="/missing">missing</a>'
+        '<a href="/a">a</a>'
+    ))
+    pdf_mock = requests_mock.get(
+        f'{site_url}/doc.pdf',
+        content=b'%PDF',
+        headers={'Content-Type': 'application/pdf'},
+    )
+    requests_mock.get(f'{site_url}/missing', status_code=404)
+    requests_mock.get(
+        f'{site_url}/a',
+        text='<a href="/missing">missing</a>',
+        headers={'Content-Type': 'text/html; charset=utf-8'},
+    )
+    saved_paths = crawl(f'{site_url}/', tmp_path, depth=2)
+    assert [Path(path).name for path in saved_paths] == [
+        'sub1-example-com.html',
+        'sub1-example-com-a.html',
+    ]
+    assert pdf_mock.call_count == 1
+    start_page = Path(saved_paths[0]).read_text()
+    assert 'href="/doc.pdf"' in start_page
+    assert 'href="/missing"' in start_page
+    assert 'href="sub1-example-com-a.html"' in start_page
+    assert 'href="/missing"' in Path(saved_paths[1]).read_text()
+
+
+def test_crawl_pages_differing_in_query(tmp_path, requests_mock):
+    """Test that pages differing only in the query get their own files."""
+    requests_mock.get(f'{site_url}/list', text=(
+        '<a href="/list?page=2">2</a><a href="/list?page=3">3</a>'
+    ))
+    requests_mock.get(f'{site_url}/list?page=2', text='page two')
+    requests_mock.get(f'{site_url}/list?page=3', text='page three')
+    saved_paths = crawl(f'{site_url}/list', tmp_path, depth=1)
+    assert [Path(path).name for path in saved_paths] == [
+        'sub1-example-com-list.html',
+        'sub1-example-com-list-2.html',
+        'sub1-example-com-list-3.html',
+    ]
+    start_page = Path(saved_paths[0]).read_text()
+    assert 'href="sub1-example-com-list-2.html"' in start_page
+    assert 'href="sub1-example-com-list-3.html"' in start_page
+    assert 'page three' in Path(saved_paths[2]).read_text()
+
+
+def test_crawl_raises_error_of_start_page(tmp_path, requests_mock):
+    """Test that the start page isn't skipped like linked pages."""
+    requests_mock.get(f'{site_url}/missing', status_code=404)
+    with pytest.raises(requests.HTTPError):
+        crawl(f'{site_url}/missing', tmp_path)
+    requests_mock.get(
+        f'{site_url}/doc.pdf',
+        content=b'%PDF',
+        headers={'Content-Type': 'application/pdf'},
+    )
+    with pytest.raises(NotHtmlPage):
+        crawl(f'{site_url}/doc.pdf', tmp_path)
@@ -0,0 +1,100 @@
+import gzip
+
+import pytest
+
+from page_loader import download
+from page_loader.css import (
+    CssScanner,
+    replace_css_links,
+    rewrite_stylesheet,
+    scan_stylesheet,
+)
+
+page_url = 'https://sub1.example.com/path/page.html'
+css = (
+    '@import "print.css"; @import url(\'theme.css\') screen;\n'
+    '/* url(comment.png) */ .a { background: URL( "img/a.png" ); }\n'
+    '.b::after { content: "url(string.png)"; }\n'
+    '@font-face { src: url(fonts/b.woff2?v=1) format("woff2"); }\n'
+)
+css_links = ['print.css', 'theme.css', 'img/a.png', 'fonts/b.woff2?v=1']
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 7, len(css)])
+def test_css_scanner(chunk_size):
+    """Test that links are found whatever the chunks are."""
+    chunks = [
+        css[index:index + chunk_size]
+        for index in range(0, len(css), chunk_size)
+    ]
+    references = CssScanner().scan(chunks)
+    assert [reference.link for reference in references] == css_links
+    for reference in references:
+        assert css[reference.start:reference.end] == reference.link
+
+
+def test_replace_css_links():
+    """Test that only the given links are replaced."""
+    assert replace_css_links(
+        'a { background: url(a.png) } b { background: url("b.png") }',
+        {'b.png': 'files/b.png'},
+    ) == 'a { background: url(a.png) } b { background: url("files/b.png") }'
+
+
+def test_rewrite_compressed_stylesheet(tmp_path):
+    """Test that a gzipped stylesheet is rewritten and stays gzipped."""
+    file_path = tmp_path / 'style.css.gz'
+    file_path.write_bytes(gzip.compress(css.encode()))
+    references = scan_stylesheet(file_path, chunk_size=5)
+    assert [reference.link for reference in references] == css_links
+    rewrite_stylesheet(file_path, references, {'img/a.png': 'local-a.png'})
+    assert gzip.decompress(file_path.read_bytes()).decode() == css.replace(
+        'img/a.png', 'local-a.png',
+    )
+
+
+@pytest.mark.parametrize('rewrite', ['prettify', 'splice'])
+def test_download_stylesheet_files(tmp_path, requests_mock, rewrite):
+    """Test that files of stylesheets and style attributes are saved."""
+    requests_mock.get(
+        page_url,
+        text=(
+            '<link rel="stylesheet" href="/css/main.css">'
+            '<div style="background: url(\'/img/inline.png\')"></div>'
+        ),
+    )
+    requests_mock.get(
+        'https://sub1.example.com/css/main.css',
+        text='@import "print.css"; .a { background: url(../img/a.png) }',
+    )
+    requests_mock.get(
+        'https://sub1.example.com/css/print.css',
+        text=(
+            '@import url(main.css); '
+            '.b { background: url(/img/a.png), url(data:image/png,x) }'
+        ),
+    )
+    image_mock = requests_mock.get(
+        'https://sub1.example.com/img/a.png', content=b'a',
+    )
+    requests_mock.get(
+        'https://sub1.example.com/img/inline.png', content=b'inline',
+    )
+    page = download(page_url, tmp_path, workers=2, rewrite=rewrite)
+    files_dir = tmp_path / 'sub1-example-com-path-page_files'
+    assert image_mock.call_count == 1
+    assert (files_dir / 'sub1-example-com-img-a.png').read_bytes() == b'a'
+    assert (files_dir / 'sub1-example-com-css-main.css').read_text() == (
+        '@import "sub1-example-com-css-print.css"; '
+        '.a { background: url(sub1-example-com-img-a.png) }'
+    )
+    assert (files_dir / 'sub1-example-com-css-print.css').read_text() == (
+        '@import url(sub1-example-com-css-main.css); '
+        '.b { background: url(sub1-example-com-img-a.png), '
+        'url(data:image/png,x) }'
+    )
+    with open(page) as page_file:
+        assert (
+            "url('sub1-example-com-path-page_files/"
+            "sub1-example-com-img-inline.png')"
+        ) in page_file.read().replace('&quot;', "'")
@@ -0,0 +1,129 @@
+import pytest
+
+from page_loader import download
+from page_loader.assets import find_asset_links, parse_html
+from page_loader.extractors import (
+    EXTRACTORS,
+    AssetSelector,
+    Extractor,
+    register_extractor,
+    srcset_links,
+)
+from page_loader.splice import AssetScanner
+
+page_url = 'https://sub1.example.com/path/page.html'
+files_prefix = 'sub1-example-com-path-page_files/sub1-example-com-media-'
+page = (
+    '<picture>'
+    '<source srcset="/media/a.webp 1x, /media/a2.webp 2x" type="image/webp">'
+    '<img src="/media/a.png" srcset="/media/b.png 100w,/media/c.png 200w">'
+    '</picture>'
+    '<video src="/media/v.mp4" poster="/media/poster.jpg">'
+    '<source src="/media/v.webm"></video>'
+    '<audio><source src="/media/s.ogg"></audio>'
+    '<link rel="preload" href="/media/f.woff2" as="font">'
+    '<style>@import "/media/s.css"; p { background: url(/media/bg.png) }'
+    '</style>'
+)
+links = {
+    '/media/a.webp': 'image',
+    '/media/a2.webp': 'image',
+    '/media/a.png': 'image',
+    '/media/b.png': 'image',
+    '/media/c.png': 'image',
+    '/media/v.mp4': 'video',
+    '/media/poster.jpg': 'image',
+    '/media/v.webm': 'video',
+    '/media/s.ogg': 'audio',
+    '/media/f.woff2': 'font',
+    '/media/s.css': 'style',
+    '/media/bg.png': 'style',
+}
+
+
+@pytest.mark.parametrize('srcset, urls', [
+    ('a.png', ['a.png']),
+    (' a.png 1x ,b.png 2x', ['a.png', 'b.png']),
+    ('a.png 100w, data:image/png,xy 2x', ['a.png', 'data:image/png,xy']),
+    ('a.png,, b.png (max-width: 1px, 2px) 2x, c.png', [
+        'a.png', 'b.png', 'c.png',
+    ]),
+    ('', []),
+])
+def test_srcset_links(srcset, urls):
+    """Test that srcset is split into urls the way browsers do it."""
+    spans = srcset_links(srcset)
+    assert [srcset[start:end] for start, end in spans] == urls
+
+
+@pytest.mark.parametrize('asset_classes', [None, ('image', 'font')])
+def test_scanners_find_the_same_links(asset_classes):
+    """Test that soup and splice modes find the same links in one parse."""
+    expected = [
+        link for link, asset_class in links.items()
+        if asset_classes is None or asset_class in asset_classes
+    ]
+    soup_links = find_asset_links(parse_html(page), page_url, asset_classes)
+    splice_links = AssetScanner(page_url, asset_classes).scan(page)
+    assert [link for _, _, link in soup_links] == expected
+    assert [link for _, _, link in splice_links] == expected
+    for span, _, link in splice_links:
+        assert page[span.start:span.end] == link
+
+
+@pytest.mark.parametrize('rewrite', ['prettify', 'splice'])
+def test_download_skips_video(tmp_path, requests_mock, rewrite):
+    """Test that only the chosen classes are downloaded and rewritten."""
+    requests_mock.get(page_url, text=page)
+    for link in links:
+        requests_mock.get(f'https://sub1.example.com{link}', content=b'x')
+    asset_classes = ('image', 'audio', 'font', 'style', 'other')
+    path = download(
+        page_url, tmp_path, rewrite=rewrite, asset_classes=asset_classes,
+    )
+    with open(path) as page_file:
+        saved_page = page_file.read()
+    for link, asset_class in links.items():
+        assert (asset_class in asset_classes) == (link not in saved_page)
+    assert f'{files_prefix}a.webp 1x, {files_prefix}a2.webp 2x' in saved_page
+    assert f'url({files_prefix}bg.png)' in saved_page
+    assert not any(
+        'mp4' in request.url or 'webm' in request.url
+        for request in requests_mock.request_history
+    )
+
+
+def test_register_extractor(monkeypatch):
+    """Test that registered extractors are used by default."""
+    monkeypatch.setattr('page_loader.extractors.EXTRACTORS', list(EXTRACTORS))
+    register_extractor(Extractor('object', 'data', 'other'))
+    soup = parse_html('<object data="/a.swf"></object>')
+    assert [link for _, _, link in find_asset_links(soup, page_url)] == [
+        '/a.swf',
+    ]
+    assert AssetSelector(['image']).select(
+        'object', {'data': '/a.swf'},
+    ) == []
+
+
+@pytest.mark.parametrize('low_memory', [False, True])
+def test_links_of_a_tag_are_spliced_in_source_order(
+    tmp_path, requests_mock, low_memory,
+):
+    """Test that srcset before src is spliced in the order of the source."""
+    requests_mock.get(
+        page_url, text='<img srcset="/media/a.png 1x, /media/b.png 2x" '
+        'src="/media/c.png"><p>end</p>',
+    )
+    for name in ('a', 'b', 'c'):
+        requests_mock.get(
+            f'https://sub1.example.com/media/{name}.png', content=b'x',
+        )
+    path = download(
+        page_url, tmp_path, rewrite='splice', low_memory=low_memory,
+    )
+    with open(path) as page_file:
+        assert page_file.read() == (
+            f'<img srcset="{files_prefix}a.png 1x, {files_prefix}b.png 2x" '
+            f'src="{files_prefix}c.png"><p>end</p>'
+        )
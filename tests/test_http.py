@@ -0,0 +1,10 @@
+from page_loader.http import create_session
+
+
+def test_create_session():
+    """Test that the session pools connections and retries failures."""
+    session = create_session(pool_size=4, retries=2)
+    adapter = session.get_adapter('https://example.com')
+    assert adapter is session.get_adapter('http://example.com')
+    assert adapter._pool_maxsize == 4  # noqa: WPS437
+    assert adapter.max_retries.total == 2
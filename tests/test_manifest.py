@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+from pathlib import Path
+
+import pytest
+import requests
+
+from page_loader import download
+from page_loader.manifest import (
+    COMPLETE,
+    FAILED,
+    PARTIAL,
+    Manifest,
+    read_journal,
+)
+from page_loader.page_loader import download_file
+from page_loader.stats import Stats
+
+page_url = 'https://sub1.example.com/page'
+file_url = 'https://sub1.example.com/images/a.png'
+content = b'0123456789'
+
+
+def read_manifest(tmp_path):
+    """Return entries of the page manifest keyed by url."""
+    return read_journal(tmp_path / 'sub1-example-com-page_manifest.jsonl')
+
+
+def test_download_writes_manifest(tmp_path, requests_mock):
+    """Test that with resume every file is listed with its path and hash."""
+    requests_mock.get(file_url, content=content)
+    requests_mock.get(
+        'https://sub1.example.com/b.png', exc=requests.ConnectionError,
+    )
+    requests_mock.get(
+        page_url, text='<img src="/images/a.png"/><img src="/b.png"/>',
+    )
+    download(page_url, tmp_path)
+    assert not list(tmp_path.glob('*_manifest.jsonl'))
+    download(page_url, tmp_path, resume=True)
+    entries = read_manifest(tmp_path)
+    assert entries[file_url] == {
+        'url': file_url,
+        'status': COMPLETE,
+        'path': 'sub1-example-com-page_files/sub1-example-com-images-a.png',
+        'size': len(content),
+        'sha256': hashlib.sha256(content).hexdigest(),
+    }
+    assert entries['https://sub1.example.com/b.png']['status'] == FAILED
+
+
+def test_resume_skips_verified_files(tmp_path, requests_mock):
+    """Test that intact complete files aren't downloaded again."""
+    requests_mock.get(page_url, text='<img src="/images/a.png"/>')
+    file_mock = requests_mock.get(file_url, content=content)
+    download(page_url, tmp_path, resume=True)
+    download(page_url, tmp_path, resume=True)
+    assert file_mock.call_count == 1
+
+    (tmp_path / read_manifest(tmp_path)[file_url]['path']).write_bytes(b'x')
+    download(page_url, tmp_path, resume=True)
+    assert file_mock.call_count == 2
+
+
+def resume_file(tmp_path, part=None, validator=None, **kwargs):
+    """Download file_url with a manifest, after an earlier *part*.
+
+    Return tuple (file path, manifest).
+    """
+    manifest = Manifest(tmp_path / 'manifest.jsonl', page_url)
+    if part is not None:
+        (tmp_path / 'sub1-example-com-images-a.png.part').write_bytes(part)
+        manifest.record(file_url, PARTIAL, validator=validator)
+    file_path = download_file(
+        file_url, tmp_path, requests.Session(), manifest=manifest, **kwargs,
+    )
+    return Path(file_path), manifest
+
+
+def test_resume_continues_partial_file(tmp_path, requests_mock):
+    """Test that a partial file is continued with a Range request."""
+    file_mock = requests_mock.get(
+        file_url,
+        status_code=206,
+        content=content[4:],
+        headers={'ETag': '"v1"', 'Content-Range': 'bytes 4-9/10'},
+    )
+    file_path, manifest = resume_file(tmp_path, content[:4], '"v1"')
+    assert file_mock.last_request.headers['Range'] == 'bytes=4-'
+    assert file_mock.last_request.headers['If-Range'] == '"v1"'
+    assert file_path.read_bytes() == content
+    assert not list(tmp_path.glob('*.part'))
+    assert manifest.entries[file_url]['sha256'] == (
+        hashlib.sha256(content).hexdigest()
+    )
+
+
+def test_resume_restarts_changed_file(tmp_path, requests_mock):
+    """Test that a full response to If-Range replaces the part."""
+    requests_mock.get(file_url, content=content, headers={'ETag': '"v2"'})
+    file_path, _ = resume_file(tmp_path, b'stale', '"v1"')
+    assert file_path.read_bytes() == content
+
+
+def test_resume_restarts_on_wrong_range(tmp_path, requests_mock):
+    """Test that a part answered with another Content-Range isn't used."""
+    file_mock = requests_mock.get(file_url, [
+        {
+            'status_code': 206,
+            'content': content,
+            'headers': {'Content-Range': 'bytes 0-9/10'},
+        },
+        {'content': content},
+    ])
+    file_path, _ = resume_file(tmp_path, content[:4], '"v1"')
+    assert file_path.read_bytes() == content
+    assert file_mock.call_count == 2
+    assert 'Range' not in file_mock.last_request.headers
+
+
+def test_part_without_validator_is_restarted(tmp_path, requests_mock):
+    """Test that a part of unknown version isn't continued."""
+    file_mock = requests_mock.get(file_url, content=content)
+    file_path, _ = resume_file(tmp_path, content[:4])
+    assert 'Range' not in file_mock.last_request.headers
+    assert file_path.read_bytes() == content
+
+
+def test_resumed_file_is_compressed_and_recorded(tmp_path, requests_mock):
+    """Test that resumed downloads go through compression and stats."""
+    css_url = 'https://sub1.example.com/style.css'
+    requests_mock.get(css_url, text='body {}')
+    stats = Stats()
+    manifest = Manifest(tmp_path / 'manifest.jsonl', page_url)
+    file_path = download_file(
+        css_url,
+        tmp_path,
+        requests.Session(),
+        manifest=manifest,
+        compress=True,
+        stats=stats,
+    )
+    assert file_path.endswith('.css.gz')
+    assert gzip.decompress(Path(file_path).read_bytes()) == b'body {}'
+    assert [file['url'] for file in stats.report()['files']] == [css_url]
+    assert manifest.entries[css_url]['status'] == COMPLETE
+
+
+def test_interrupted_download_keeps_partial_file(tmp_path, requests_mock):
+    """Test that an interrupted resumable download is marked partial."""
+    requests_mock.get(file_url, exc=requests.ConnectionError)
+    with pytest.raises(requests.ConnectionError):
+        resume_file(tmp_path, content[:4], '"v1"')
+    manifest = Manifest(tmp_path / 'manifest.jsonl', page_url)
+    assert manifest.entries[file_url]['status'] == PARTIAL
+    assert manifest.validator(file_url) == '"v1"'
+    part = tmp_path / 'sub1-example-com-images-a.png.part'
+    assert part.read_bytes() == content[:4]
+
+
+def test_manifest_journal_is_compacted(tmp_path):
+    """Test that records are appended and compacted when reopened."""
+    manifest_file = tmp_path / 'manifest.jsonl'
+    manifest = Manifest(manifest_file, page_url)
+    manifest.record(file_url, FAILED)
+    manifest.record(file_url, PARTIAL)
+    with open(manifest_file, 'ab') as journal:
+        journal.write(b'{"url": "cut')
+    assert len(manifest_file.read_bytes().splitlines()) == 4
+    reopened = Manifest(manifest_file, page_url)
+    assert reopened.entries == {file_url: {'url': file_url, 'status': PARTIAL}}
+    assert manifest_file.read_text().splitlines() == [
+        f'{{"url": "{page_url}"}}',
+        f'{{"url": "{file_url}", "status": "{PARTIAL}"}}',
+    ]
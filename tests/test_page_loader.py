@@ -1,8 +1,11 @@
+import gzip
 from pathlib import Path
 
 import pytest
+import requests
 
 from page_loader import download
+from page_loader.page_loader import download_file, fetch_page
 
 fixtures_path = Path('tests/fixtures/')
 
@@ -179,3 +182,199 @@ def test_download_scripts(  # noqa: WPS218
     assert not file6.exists()
     assert not file7.exists()
     assert expected_file1.read_text() == 'text'
+
+
+def test_download_with_workers(
+    tmp_path, requests_mock, image_mocks, link_mocks, script_mocks,
+):
+    """Test download() with concurrent workers.
+
+    Check that the page is the same as with sequential downloading.
+    """
+    url = 'https://sub1.example.com/path/to/file.html'
+    input_html_file = fixtures_path / 'original_file.html'
+    requests_mock.get(url, text=input_html_file.read_text())
+    sequential_dir = tmp_path / 'sequential'
+    concurrent_dir = tmp_path / 'concurrent'
+    sequential_dir.mkdir()
+    concurrent_dir.mkdir()
+    sequential_path = Path(download(url, sequential_dir))
+    concurrent_path = Path(download(url, concurrent_dir, workers=8))
+    assert concurrent_path.read_text() == sequential_path.read_text()
+
+
+def test_download_keeps_link_of_failed_file(tmp_path, requests_mock):
+    """Test download().
+
+    Check that a file that failed to download doesn't break the page and
+    keeps its original link.
+    """
+    url = 'https://sub1.example.com/path/to/file.html'
+    requests_mock.get(
+        url, text='<img src="/bad.png"/><img src="/good.png"/>',
+    )
+    requests_mock.get('https://sub1.example.com/bad.png', status_code=404)
+    requests_mock.get('https://sub1.example.com/good.png', content=b'good')
+    file_path = Path(download(url, tmp_path, workers=2))
+    assert file_path.read_text() == (
+        '<img src="/bad.png"/>\n'
+        '<img src="sub1-example-com-path-to-file_files/'
+        'sub1-example-com-good.png"/>\n'
+    )
+
+
+class RecordingSession(requests.Session):
+    """Session that remembers requested urls."""
+
+    def __init__(self):
+        """Create session."""
+        super().__init__()
+        self.requested_urls = []
+
+    def get(self, url, **kwargs):
+        """Remember *url* and send GET request."""
+        self.requested_urls.append(url)
+        return super().get(url, **kwargs)
+
+
+def test_download_uses_injected_session(tmp_path, requests_mock):
+    """Test that the page and all its files are fetched with one session."""
+    url = 'https://sub1.example.com/path/to/file.html'
+    requests_mock.get(url, text='<img src="/a.png"/><script src="/b.js"/>')
+    requests_mock.get('https://sub1.example.com/a.png', content=b'a')
+    requests_mock.get('https://sub1.example.com/b.js', text='b')
+    session = RecordingSession()
+    download(url, tmp_path, client=session, workers=2)
+    assert sorted(session.requested_urls) == [
+        'https://sub1.example.com/a.png',
+        'https://sub1.example.com/b.js',
+        url,
+    ]
+
+
+def test_download_file_streams_in_chunks(tmp_path, requests_mock):
+    """Test that download_file() writes the response in chunks."""
+    url = 'https://sub1.example.com/video.mp4'
+    requests_mock.get(url, content=b'0123456789')
+    file_path = Path(download_file(url, tmp_path, chunk_size=3))
+    assert file_path.read_bytes() == b'0123456789'
+    assert requests_mock.last_request.stream
+
+
+def test_download_same_file_once(tmp_path, requests_mock):
+    """Test that differently spelled links to one url are downloaded once."""
+    url = 'https://sub1.example.com/path/to/file.html'
+    file_url = 'https://sub1.example.com/images/a.png'
+    requests_mock.get(
+        url,
+        text=(
+            '<img src="/images/a.png"/>'
+            '<img src="../../images/a.png"/>'
+            '<img src="https://SUB1.example.com:443/images/./a.png"/>'
+        ),
+    )
+    file_mock = requests_mock.get(file_url, content=b'a')
+    file_path = Path(download(url, tmp_path, workers=3))
+    assert file_mock.call_count == 1
+    local_link = (
+        'sub1-example-com-path-to-file_files/sub1-example-com-images-a.png'
+    )
+    assert file_path.read_text().count(local_link) == 3
+
+
+def test_download_to_content_addressed_store(tmp_path, requests_mock):
+    """Test that identical files from different urls are stored once."""
+    url = 'https://sub1.example.com/path/to/file.html'
+    requests_mock.get(url, text='<img src="/a.png"/><img src="/b.png"/>')
+    requests_mock.get('https://sub1.example.com/a.png', content=b'same')
+    requests_mock.get('https://sub1.example.com/b.png', content=b'same')
+    pages_dir = tmp_path / 'pages'
+    store_dir = tmp_path / 'store'
+    pages_dir.mkdir()
+    file_path = Path(download(url, pages_dir, store_dir=store_dir))
+    stored_files = list(store_dir.iterdir())
+    assert len(stored_files) == 1
+    assert stored_files[0].read_bytes() == b'same'
+    assert stored_files[0].suffix == '.png'
+    local_link = f'../store/{stored_files[0].name}'
+    assert file_path.read_text().count(local_link) == 2
+    assert not (pages_dir / 'sub1-example-com-path-to-file_files').exists()
+
+
+def test_download_with_cache(tmp_path, requests_mock):
+    """Test that a repeated download takes not modified files from cache."""
+    url = 'https://sub1.example.com/path/to/file.html'
+    requests_mock.get(url, text='<img src="/a.png"/>')
+    file_mock = requests_mock.get(
+        'https://sub1.example.com/a.png',
+        [
+            {'content': b'image', 'headers': {'ETag': '"v1"'}},
+            {'status_code': 304},
+        ],
+    )
+    cache_dir = tmp_path / 'cache'
+    for run in ('first', 'second'):
+        run_dir = tmp_path / run
+        run_dir.mkdir()
+        download(url, run_dir, cache_dir=cache_dir)
+    image_path = (
+        tmp_path
+        / 'second'
+        / 'sub1-example-com-path-to-file_files'
+        / 'sub1-example-com-a.png'
+    )
+    assert image_path.read_bytes() == b'image'
+    assert file_mock.call_count == 2
+
+
+def test_download_compressed(tmp_path, requests_mock):
+    """Test that text files are stored compressed and linked uncompressed."""
+    url = 'https://sub1.example.com/path/to/file.html'
+    style = b'body { color: red; }' * 10
+    compressed_style = gzip.compress(style)
+    requests_mock.get(
+        url,
+        text='<link href="/a.css"/><link href="/b.css"/><img src="/c.png"/>',
+    )
+    css_mock = requests_mock.get(
+        'https://sub1.example.com/a.css',
+        content=compressed_style,
+        headers={'Content-Encoding': 'gzip'},
+    )
+    requests_mock.get('https://sub1.example.com/b.css', content=style)
+    requests_mock.get('https://sub1.example.com/c.png', content=b'image')
+    file_path = Path(download(url, tmp_path, compress=True))
+    files_dir = tmp_path / 'sub1-example-com-path-to-file_files'
+    assert css_mock.last_request.headers['Accept-Encoding'] == 'gzip'
+    wire_file = files_dir / 'sub1-example-com-a.css.gz'
+    assert wire_file.read_bytes() == compressed_style
+    assert gzip.decompress(
+        (files_dir / 'sub1-example-com-b.css.gz').read_bytes(),
+    ) == style
+    assert (files_dir / 'sub1-example-com-c.png').read_bytes() == b'image'
+    page = file_path.read_text()
+    assert 'sub1-example-com-path-to-file_files/sub1-example-com-a.css"' in (
+        page
+    )
+    assert '.gz' not in page
+
+
+def test_fetch_page_submits_links_as_they_arrive(requests_mock):
+    """Test that links are submitted while the page is streamed."""
+    url = 'https://sub1.example.com/page.html'
+    page = '<p>{0}</p><img src="/a.png"><p>{0}</p><img src="/b.png">'.format(
+        'x' * 40000,
+    )
+    requests_mock.get(
+        url, text=page, headers={'Content-Type': 'text/html'},
+    )
+    submitted = []
+    content, encoding, asset_links = fetch_page(
+        url, requests, submitted.append,
+    )
+    assert content == page.encode()
+    assert encoding == 'ISO-8859-1'
+    assert submitted == ['/a.png', '/b.png']
+    assert [
+        page[span.start:span.end] for span, _, _ in asset_links
+    ] == submitted
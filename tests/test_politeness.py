@@ -0,0 +1,132 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from page_loader import download
+from page_loader.politeness import (
+    HostLimiter,
+    PoliteClient,
+    TokenBucket,
+    polite_session_scope,
+)
+
+file_url = 'https://sub1.example.com/images/a.png'
+
+
+def test_token_bucket_limits_rate():
+    """Test that requests after the burst are spread by the rate."""
+    bucket = TokenBucket(rate=50, burst=2)
+    start = time.monotonic()
+    waits = [bucket.acquire() for _ in range(5)]
+    assert waits[:2] == [0, 0]
+    assert time.monotonic() - start >= 0.055
+
+
+def test_retry_after_is_honoured(requests_mock):
+    """Test that throttled responses are retried after Retry-After."""
+    file_mock = requests_mock.get(
+        file_url,
+        [
+            {'status_code': 429, 'headers': {'Retry-After': '0'}},
+            {'status_code': 503},
+            {'content': b'image'},
+        ],
+    )
+    limiter = HostLimiter(backoff=0.01)
+    client = PoliteClient(requests.Session(), limiter)
+    with client.get(file_url, stream=True) as response:
+        assert response.content == b'image'
+    assert file_mock.call_count == 3
+    host_report = limiter.report()['sub1.example.com']
+    assert host_report['requests'] == 3
+    assert host_report['retries'] == 2
+    assert host_report['bytes'] == len(b'image')
+
+
+def test_retries_are_limited(requests_mock):
+    """Test that the last throttled response is returned to the caller."""
+    requests_mock.get(file_url, status_code=429)
+    limiter = HostLimiter(retries=1, backoff=0.01)
+    client = PoliteClient(requests.Session(), limiter)
+    response = client.get(file_url)
+    assert response.status_code == 429
+    assert requests_mock.call_count == 2
+
+
+def test_per_host_limits_open_responses():
+    """Test that a host gets no more than per_host requests at once."""
+    in_flight = []
+    peaks = []
+    lock = threading.Lock()
+
+    class Response(object):
+        status_code = 200
+
+        def close(self):
+            with lock:
+                in_flight.pop()
+
+    def send(url, **kwargs):
+        with lock:
+            in_flight.append(url)
+            peaks.append(len(in_flight))
+        return Response()
+
+    limiter = HostLimiter(per_host=2)
+
+    def fetch():
+        response = limiter.request(send, file_url, stream=True)
+        time.sleep(0.01)
+        response.close()
+
+    threads = [threading.Thread(target=fetch) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peaks) == 2
+    assert limiter.report()['sub1.example.com']['requests'] == 6
+
+
+def test_download_reports_hosts(tmp_path, requests_mock):
+    """Test that download() sends requests through the limiter."""
+    requests_mock.get(
+        'https://sub1.example.com/page', text='<img src="/images/a.png"/>',
+    )
+    requests_mock.get(file_url, content=b'image')
+    limiter = HostLimiter(rate=100, per_host=1)
+    download('https://sub1.example.com/page', tmp_path, limiter=limiter)
+    host_report = limiter.report()['sub1.example.com']
+    assert host_report['requests'] == 2
+    assert host_report['bytes_per_second'] > 0
+
+
+def test_throttled_responses_are_retried_once_per_attempt():
+    """Test that a real session leaves Retry-After to the limiter."""
+    requested_paths = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802
+            requested_paths.append(self.path)
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            """Keep the test output quiet."""
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    limiter = HostLimiter(retries=2, backoff=0.01)
+    url = 'http://127.0.0.1:{0}/a.png'.format(server.server_port)
+    try:
+        with polite_session_scope(retries=2, limiter=limiter) as client:
+            assert client.get(url).status_code == 429
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert len(requested_paths) == 3
+    assert limiter.report()['127.0.0.1']['requests'] == 3
@@ -0,0 +1,113 @@
+from pathlib import Path
+
+import pytest
+
+from page_loader import download
+from page_loader.splice import AssetScanner, splice_links
+
+fixtures_path = Path('tests/fixtures/')
+page_url = 'https://sub1.example.com/path/to/file.html'
+
+
+def test_scanner_finds_link_positions():
+    """Test that recorded positions point to the links in the source."""
+    source = (fixtures_path / 'original_file.html').read_text()
+    asset_links = AssetScanner(page_url).scan(source)
+    assert len(asset_links) == 17
+    for span, _, link in asset_links:
+        assert source[span.start:span.end] == link
+
+
+def test_splice_links(tmp_path):
+    """Test that only link values are replaced."""
+    source = (
+        '<IMG  SRC = "/a.png?x=1&amp;y=2" alt=\'"\'>\n'
+        "<img src='/b.png'>  <img src=/c.png>\n"
+        '<script src="/d.js"></script>'
+    )
+    asset_links = AssetScanner(page_url).scan(source)
+    local_paths = {
+        '/a.png?x=1&y=2': str(tmp_path / 'files' / 'a.png'),
+        '/c.png': str(tmp_path / 'files' / 'c.png'),
+    }
+    assert splice_links(source, asset_links, local_paths, tmp_path) == (
+        '<IMG  SRC = "files/a.png" alt=\'"\'>\n'
+        "<img src='/b.png'>  <img src=\"files/c.png\">\n"
+        '<script src="/d.js"></script>'
+    )
+
+
+def test_download_with_splice(
+    tmp_path, requests_mock, image_mocks, link_mocks, script_mocks,
+):
+    """Test that the saved page differs from the original by links only."""
+    original = (fixtures_path / 'original_file.html').read_text()
+    requests_mock.get(page_url, text=original)
+    file_path = Path(download(page_url, tmp_path, rewrite='splice'))
+    processed = (fixtures_path / 'processed_file.html').read_text()
+    assert file_path.read_text() == processed
+
+
+def test_download_with_splice_keeps_encoding(tmp_path, requests_mock):
+    """Test that the page is saved in its original encoding."""
+    source = '<p>Привет</p>\r\n<img src="/a.png">'
+    requests_mock.get(
+        page_url,
+        content=source.encode('cp1251'),
+        headers={'Content-Type': 'text/html; charset=windows-1251'},
+    )
+    requests_mock.get('https://sub1.example.com/a.png', content=b'a')
+    file_path = Path(download(page_url, tmp_path, rewrite='splice'))
+    assert file_path.read_bytes() == (
+        '<p>Привет</p>\r\n<img src="sub1-example-com-path-to-file_files/'
+        'sub1-example-com-a.png">'
+    ).encode('cp1251')
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+@pytest.mark.parametrize('rewrite', ['prettify', 'splice'])
+def test_download_with_unknown_charset(
+    tmp_path, requests_mock, rewrite, prefetch,
+):
+    """Test that a page in an unknown charset is read as UTF-8."""
+    requests_mock.get(
+        page_url,
+        content='<p>Привет</p><img src="/a.png">'.encode(),
+        headers={'Content-Type': 'text/html; charset=x-unknown'},
+    )
+    requests_mock.get('https://sub1.example.com/a.png', content=b'a')
+    file_path = Path(download(
+        page_url, tmp_path, rewrite=rewrite, prefetch=prefetch,
+    ))
+    saved_page = file_path.read_text()
+    assert 'Привет' in saved_page
+    assert 'sub1-example-com-path-to-file_files/sub1-example-com-a.png' in (
+        saved_page
+    )
+
+
+def test_prefetched_links_are_spliced(tmp_path, requests_mock, monkeypatch):
+    """Test that links found while the page arrived aren't scanned again."""
+    source = '<p>Привет</p>\r\n<img src="/a.png"><img src="/b.png">'.encode()
+    requests_mock.get(
+        page_url,
+        content=b'\xe2\x82' + source,
+        headers={'Content-Type': 'text/html; charset=utf-8'},
+    )
+    requests_mock.get('https://sub1.example.com/a.png', content=b'a')
+    requests_mock.get('https://sub1.example.com/b.png', content=b'b')
+    scans = []
+    monkeypatch.setattr(
+        AssetScanner, 'scan', lambda scanner, source: scans.append(source),
+    )
+    file_path = Path(download(
+        page_url, tmp_path, rewrite='splice', prefetch=True,
+    ))
+    assert not scans
+    assert file_path.read_bytes() == b'\xe2\x82' + (
+        '<p>Привет</p>\r\n'
+        '<img src="sub1-example-com-path-to-file_files/'
+        'sub1-example-com-a.png">'
+        '<img src="sub1-example-com-path-to-file_files/'
+        'sub1-example-com-b.png">'
+    ).encode()
@@ -0,0 +1,59 @@
+import subprocess  # noqa: S404
+import sys
+
+import pytest
+
+import page_loader
+
+HEAVY_MODULES = ('requests', 'bs4', 'urllib3', 'page_loader.page_loader')
+LAZY_IMPORT_CHECK = """
+import sys
+import page_loader
+assert 'page_loader.page_loader' not in sys.modules
+page_loader.download
+assert 'page_loader.page_loader' in sys.modules
+"""
+
+
+def imported_modules(*arguments: str) -> set:
+    """Return names of the modules imported by python run with *arguments*.
+
+    Python is run with -X importtime, which lists every import.
+    """
+    completed = subprocess.run(  # noqa: S603
+        [sys.executable, '-X', 'importtime', *arguments],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return {
+        line.split('|')[-1].strip()
+        for line in completed.stderr.splitlines()
+        if line.startswith('import time:') and 'cumulative' not in line
+    }
+
+
+@pytest.mark.parametrize('arguments', [
+    ['-c', 'import page_loader.scripts.page_loader'],
+    ['-m', 'page_loader.scripts.page_loader', '--help'],
+])
+def test_cli_starts_without_heavy_modules(arguments):
+    """Test that the CLI doesn't import heavy modules at startup.
+
+    Import times depend on the machine, so only the imported modules are
+    checked.
+    """
+    modules = imported_modules(*arguments)
+    assert 'page_loader' in modules
+    assert not set(HEAVY_MODULES) & modules
+
+
+def test_package_attributes_are_imported_lazily():
+    """Test that the public functions are imported on first access."""
+    subprocess.run(  # noqa: S603
+        [sys.executable, '-c', LAZY_IMPORT_CHECK], check=True,
+    )
+    assert page_loader.download.__module__ == 'page_loader.page_loader'
+    assert 'download_archive' in dir(page_loader)
+    with pytest.raises(AttributeError):
+        page_loader.upload  # noqa: B018, WPS428
@@ -0,0 +1,62 @@
+from page_loader import download
+from page_loader.stats import Stats
+
+page_url = 'https://sub1.example.com/path/to/file.html'
+
+
+def test_download_with_stats(tmp_path, requests_mock):
+    """Test that phases and files of download() are reported to hooks."""
+    requests_mock.get(page_url, text='<img src="/a.png"/>')
+    requests_mock.get('https://sub1.example.com/a.png', content=b'image')
+    events = []
+    stats = Stats(hooks=[lambda event, data: events.append((event, data))])
+    download(page_url, tmp_path, stats=stats)
+    report = stats.report()
+    assert list(report['phases']) == [
+        'fetch_page', 'parse', 'download_files', 'rewrite', 'serialize',
+        'write',
+    ]
+    assert report['bytes'] == len(b'image')
+    assert report['cache'] == {'hits': 0, 'misses': 0}
+    file_stats, = report['files']
+    assert file_stats['url'] == 'https://sub1.example.com/a.png'
+    assert file_stats['bytes'] == len(b'image')
+    assert file_stats['cached'] is None
+    assert [event for event, _ in events].count('phase') == 6
+    assert ('file', file_stats) in events
+
+
+def test_stats_count_cache_hits(tmp_path, requests_mock):
+    """Test that cache hits and misses are reported."""
+    requests_mock.get(page_url, text='<img src="/a.png"/>')
+    requests_mock.get(
+        'https://sub1.example.com/a.png',
+        content=b'image',
+        headers={'Cache-Control': 'max-age=600'},
+    )
+    cache_dir = tmp_path / 'cache'
+    reports = []
+    for _ in range(2):
+        stats = Stats()
+        download(page_url, tmp_path, cache_dir=cache_dir, stats=stats)
+        reports.append(stats.report()['cache'])
+    assert reports == [{'hits': 0, 'misses': 1}, {'hits': 1, 'misses': 0}]
+
+
+def test_timeline_shows_phases_and_files(tmp_path, requests_mock):
+    """Test that phases and files are put on the timeline."""
+    requests_mock.get(page_url, text='<img src="/a.png"/>')
+    requests_mock.get('https://sub1.example.com/a.png', content=b'image')
+    stats = Stats()
+    download(page_url, tmp_path, stats=stats)
+    timeline = stats.report()['timeline']
+    phases = [event for event in timeline if event['name'] != 'file']
+    assert [event['name'] for event in phases] == [
+        'fetch_page', 'parse', 'download_files', 'rewrite', 'serialize',
+        'write',
+    ]
+    for previous, event in zip(phases, phases[1:]):
+        assert previous['end'] <= event['start']
+    file_event, = (event for event in timeline if event['name'] == 'file')
+    assert file_event['url'] == 'https://sub1.example.com/a.png'
+    assert file_event['start'] <= file_event['end'] <= phases[2]['end']
@@ -0,0 +1,59 @@
+import gzip
+import stat
+
+import pytest
+
+from page_loader.storage import (
+    gzip_chunks,
+    write_chunks,
+    write_chunks_by_hash,
+)
+
+
+def test_write_chunks(tmp_path):
+    """Test that chunks are joined in the target file."""
+    file_path = tmp_path / 'file.bin'
+    write_chunks([b'ab', b'cd', b'e'], file_path)
+    assert file_path.read_bytes() == b'abcde'
+    assert list(tmp_path.iterdir()) == [file_path]
+
+
+def test_write_chunks_mode(tmp_path):
+    """Test that written files get the mode of files open() creates."""
+    file_path = tmp_path / 'file.bin'
+    write_chunks([b'ab'], file_path)
+    open_path = tmp_path / 'open.bin'
+    open_path.write_bytes(b'ab')
+    assert stat.S_IMODE(file_path.stat().st_mode) == stat.S_IMODE(
+        open_path.stat().st_mode,
+    )
+
+
+def test_write_chunks_failure_leaves_nothing(tmp_path):
+    """Test that an interrupted write doesn't leave partial files."""
+    file_path = tmp_path / 'file.bin'
+
+    def chunks():
+        yield b'ab'
+        raise ConnectionError('connection lost')
+
+    with pytest.raises(ConnectionError):
+        write_chunks(chunks(), file_path)
+    assert not list(tmp_path.iterdir())
+
+
+def test_write_chunks_by_hash(tmp_path):
+    """Test that identical content is stored in one file."""
+    first_path = write_chunks_by_hash([b'sa', b'me'], tmp_path, '.png')
+    second_path = write_chunks_by_hash([b'same'], tmp_path, '.png')
+    assert first_path == second_path
+    assert first_path.name == (
+        '0967115f2813a3541eaef77de9d9d5773f1c0c04314b0bbfe4ff3b3b1c55b5d5.png'
+    )
+    assert list(tmp_path.iterdir()) == [first_path]
+
+
+def test_gzip_chunks():
+    """Test that chunks are compressed into one gzip stream."""
+    chunks = [b'abc' * 100, b'', b'def' * 100]
+    assert gzip.decompress(b''.join(gzip_chunks(chunks))) == b''.join(chunks)
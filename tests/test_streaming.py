@@ -0,0 +1,145 @@
+import io
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+from page_loader import download
+from page_loader.batch import download_batch
+from page_loader.page_loader import collect_results
+from page_loader.politeness import HostLimiter
+from page_loader.streaming import PageStream
+
+DEADLOCK_TIMEOUT = 10
+fixtures_path = Path('tests/fixtures/')
+page_url = 'https://sub1.example.com/path/to/file.html'
+
+
+def done_future(file_path: str) -> Future:
+    """Return future finished with *file_path*."""
+    future = Future()
+    future.set_result(file_path)
+    return future
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_stream_matches_splice(
+    chunk_size, tmp_path, requests_mock, image_mocks, link_mocks, script_mocks,
+):
+    """Test that the streamed page is the page saved with splice."""
+    original = (fixtures_path / 'original_file.html').read_text()
+    requests_mock.get(page_url, text=original)
+    file_path = Path(download(
+        page_url, tmp_path, chunk_size=chunk_size, low_memory=True,
+    ))
+    processed = (fixtures_path / 'processed_file.html').read_text()
+    assert file_path.read_text() == processed
+
+
+def test_stream_writes_up_to_pending_link(tmp_path):
+    """Test that only the source before a pending link is written."""
+    pending = Future()
+    page_file = io.BytesIO()
+    page = PageStream(
+        page_file,
+        page_url,
+        'utf-8',
+        {'/a.png': pending}.get,
+        collect_results,
+        tmp_path,
+    )
+    page.feed(b'<p>start</p><img src="/a.png"><p>')
+    assert page_file.getvalue() == b'<p>start</p><img src="'
+    pending.set_result(str(tmp_path / 'a.png'))
+    page.feed(b'end</p><p')
+    assert page_file.getvalue() == b'<p>start</p><img src="a.png"><p>end</p>'
+    page.close()
+    assert page_file.getvalue().endswith(b'end</p><p')
+
+
+def test_stream_waits_for_links_over_window(tmp_path):
+    """Test that the oldest link is waited for once the window is full."""
+    pending = Future()
+    threading.Timer(0.05, pending.set_result, [str(tmp_path / 'a')]).start()
+    page_file = io.BytesIO()
+    page = PageStream(
+        page_file,
+        page_url,
+        'utf-8',
+        {'/a.png': pending}.get,
+        collect_results,
+        tmp_path,
+        window=10,
+    )
+    page.feed(b'<p>start</p><img src="/a.png"><p>')
+    assert pending.done()
+    assert page_file.getvalue() == b'<p>start</p><img src="a"><p>'
+
+
+def test_stream_keeps_link_of_failed_file(tmp_path):
+    """Test that a link whose download failed is written as it was."""
+    failed = Future()
+    failed.set_exception(OSError('disk full'))
+    files = {'/a.png': failed, '/b.png': done_future(str(tmp_path / 'b'))}
+    page_file = io.BytesIO()
+    page = PageStream(
+        page_file, page_url, 'utf-8', files.get, collect_results, tmp_path,
+    )
+    page.feed(b'<img src=/a.png><img src=/b.png>')
+    page.close()
+    assert page_file.getvalue() == b'<img src=/a.png><img src="b">'
+    assert list(page.file_paths) == ['/b.png']
+    assert list(page.errors) == ['/a.png']
+
+
+def test_batch_streams_pages(tmp_path, requests_mock):
+    """Test that batch pages are streamed with low_memory."""
+    requests_mock.get(page_url, text='<img src="/a.png">')
+    requests_mock.get('https://sub1.example.com/a.png', content=b'a')
+    page_result, = download_batch([page_url], tmp_path, low_memory=True)
+    assert page_result.bytes_downloaded == len('<img src="/a.png">') + 1
+    assert Path(page_result.path).read_text() == (
+        '<img src="sub1-example-com-path-to-file_files/'
+        'sub1-example-com-a.png">'
+    )
+
+
+def test_page_frees_host_slot_for_its_files(tmp_path, requests_mock):
+    """Test that a page over the window doesn't wait for its own slot."""
+    page = '<img src="/a.png">{0}'.format('x' * (2 * 1024 * 1024))
+    requests_mock.get(page_url, text=page)
+    requests_mock.get('https://sub1.example.com/a.png', content=b'a')
+    limiter = HostLimiter(per_host=1)
+    paths = []
+    thread = threading.Thread(
+        target=lambda: paths.append(download(
+            page_url, tmp_path, low_memory=True, limiter=limiter,
+        )),
+        daemon=True,
+    )
+    thread.start()
+    thread.join(DEADLOCK_TIMEOUT)
+    assert paths
+    assert Path(paths[0]).read_text().startswith(
+        '<img src="sub1-example-com-path-to-file_files/'
+        'sub1-example-com-a.png">xxx',
+    )
+    assert limiter.report()['sub1.example.com']['requests'] == 2
+
+
+def test_stream_with_unknown_charset(tmp_path):
+    """Test that a page in an unknown charset is streamed as UTF-8."""
+    page_file = io.BytesIO()
+    page = PageStream(
+        page_file,
+        page_url,
+        'x-unknown',
+        {'/a.png': done_future(str(tmp_path / 'a'))}.get,
+        collect_results,
+        tmp_path,
+    )
+    text = '<p>Привет</p>'.encode()
+    page.feed(b'%s\xff<img src="/a.png">' % text)
+    page.close()
+    assert page_file.getvalue() == b'%s\xff<img src="a">' % text
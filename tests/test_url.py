@@ -1,6 +1,8 @@
+import urllib
+
 import pytest
 
-from page_loader.url import relative_url_to_absolute, url_to_name
+from page_loader.url import UrlResolver, relative_url_to_absolute, url_to_name
 
 
 @pytest.mark.parametrize(
@@ -119,8 +121,62 @@ def test_url_to_name(url, extension, expected_name):
             'https://www.crummy.com/BeautifulSoup/bs4/doc.ru/bs4ru.html',
             'https://www.crummy.com/BeautifulSoup/bs4/doc.ru/_images/6.1.jpg',
         ),
+        (
+            './img/file.png?v=1',
+            'https://sub1.example.com/path/to',
+            'https://sub1.example.com/path/img/file.png?v=1',
+        ),
+        (
+            '?page=2',
+            'https://sub1.example.com/path/to/file.html',
+            'https://sub1.example.com/path/to/file.html?page=2',
+        ),
+        (
+            '//cdn.example.com/img/file.png',
+            'https://sub1.example.com/path/to/',
+            'https://cdn.example.com/img/file.png',
+        ),
     ],
 )
 def test_relative_url_to_absolute(url, parent_url, expected_url):
     """Test url_to_name."""
     assert relative_url_to_absolute(url, parent_url) == expected_url
+
+
+def test_url_resolver():
+    """Test that UrlResolver resolves, checks and names links."""
+    resolver = UrlResolver('https://sub1.example.com/path/to/file.html')
+    assert resolver.canonical('../img/./a.png#top') == (
+        'https://sub1.example.com/path/img/a.png'
+    )
+    assert resolver.is_same_domain('//sub2.sub1.example.com/a.png')
+    assert not resolver.is_same_domain('https://notsub1.example.com/a.png')
+    assert not resolver.is_same_domain('data:image/png;base64,AAAA')
+    assert resolver.name('img/a.png') == (
+        'sub1-example-com-path-to-img-a.png'
+    )
+
+
+def test_url_resolver_cache_is_bounded():
+    """Test that the memoized results are limited by cache size."""
+    resolver = UrlResolver('https://sub1.example.com/', cache_size=2)
+    for index in range(5):
+        resolver.canonical(f'/img/{index}.png')
+    assert resolver.canonical.cache_info().currsize == 2
+
+
+@pytest.mark.parametrize('base_url', [
+    'https://sub1.example.com/path/to/file.html?q=1#top',
+    'https://sub1.example.com/path/to/',
+    'https://sub1.example.com',
+])
+@pytest.mark.parametrize('link', [
+    'img/a.png', '/img/a.png', './img/a.png', '../../img/a.png', '..',
+    '//cdn.example.com/a.png', '?page=2', '#top', '', 'a.png?x=1#y',
+    'https://other.com/a.png', 'data:image/png;base64,AAAA', 'img/../a.png',
+])
+def test_url_resolver_matches_urljoin(base_url, link):
+    """Test that links are resolved the same way as urljoin() does."""
+    assert UrlResolver(base_url).absolute(link) == urllib.parse.urljoin(
+        base_url, link,
+    )